@@ -0,0 +1,115 @@
+#Benchmark de amplificación de lectura según el tamaño de página
+import os
+import random
+import string
+import tempfile
+import time
+import argparse
+
+from app.data.records.song import Song
+from app.engines.bplustree import BPlusTreeFile, DataPage
+from app.engines.bufferpool import BufferPool
+from app.engines.pagesize import OS_PAGE_SIZE, PAGE_SIZES, os_pages_touched
+
+# --- Constantes ---
+RECORDS = 50_000
+LOOKUPS = 2_000
+# Página de datos de antes de guardar la geometría en el header: 20 registros sin alinear
+LEGACY_PAGE_SIZE = DataPage.HEADER_SIZE + 20 * Song.RECORD_SIZE
+
+# --- Funciones Auxiliares ---
+
+class CountingPool(BufferPool):
+    """Buffer pool que anota cada lectura a disco (los fallos) y las páginas del SO que toca."""
+
+    def __init__(self, capacity_bytes: int):
+        super().__init__(capacity_bytes)
+        self.bytes_read = 0
+        self.os_pages = 0
+
+    def get(self, path: str, pos: int, size: int, decode, pin=False):
+        misses = self.misses
+        obj = super().get(path, pos, size, decode, pin)
+        if self.misses > misses:
+            self.bytes_read += size
+            self.os_pages += os_pages_touched(pos * size, size)
+        return obj
+
+
+def synthetic_songs(n, seed=7):
+    rnd = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits
+    songs = {}
+    while len(songs) < n:
+        tid = ''.join(rnd.choice(alphabet) for _ in range(22))
+        songs[tid] = Song(tid, f"name {tid}", "artist", rnd.randint(0, 100), "alb", "album",
+                          "2020-01-01", rnd.random(), rnd.random(), rnd.randint(1000, 400000))
+    return list(songs.values())
+
+
+def layout_os_pages(page_size, n_pages=1_000):
+    """Páginas del SO que cubre en promedio la lectura de una página del archivo."""
+    return sum(os_pages_touched(pos * page_size, page_size) for pos in range(n_pages)) / n_pages
+
+# --- Funciones de Prueba ---
+
+def bench_bplustree(page_size, songs, keys, tmp_dir):
+    """Búsquedas puntuales en frío (pool vaciado antes de cada una): bytes y páginas del SO leídos."""
+    datafile = os.path.join(tmp_dir, f"bench{page_size}.dat")
+    indexfile = os.path.join(tmp_dir, f"bench{page_size}.idx")
+    tree = BPlusTreeFile(datafile, indexfile, pool=BufferPool(), page_size=page_size)
+    tree.bulk_load(songs)
+    stats = tree.stats()
+    tree.close()
+
+    pool = CountingPool(64 * page_size)
+    tree = BPlusTreeFile(datafile, indexfile, pool=pool)
+    pool.bytes_read = pool.os_pages = 0
+    start = time.perf_counter()
+    for key in keys:
+        pool.discard(datafile)
+        assert tree.search(key) is not None, f"Error: La clave '{key}' no fue encontrada."
+    elapsed = time.perf_counter() - start
+    tree.close()
+
+    return {
+        "page_size": page_size,
+        "records_per_page": stats["records_per_page"],
+        "height": stats["height"],
+        "data_kib": pool.bytes_read / len(keys) / 1024,
+        "os_pages": pool.os_pages / len(keys),
+        # Bytes que llegan del disco por cada byte de registro útil
+        "amplification": pool.os_pages * OS_PAGE_SIZE / len(keys) / Song.RECORD_SIZE,
+        "us_per_lookup": elapsed / len(keys) * 1e6,
+    }
+
+
+def run_benchmark(records=RECORDS, lookups=LOOKUPS):
+    print(f"\n--- Amplificación de lectura: {records} registros, {lookups} búsquedas en frío ---")
+    print(f"Página del SO: {OS_PAGE_SIZE} bytes; registro Song: {Song.RECORD_SIZE} bytes")
+
+    print("\nLayout de páginas de datos (páginas del SO por lectura):")
+    for size in (LEGACY_PAGE_SIZE,) + PAGE_SIZES:
+        ideal = -(-size // OS_PAGE_SIZE)
+        print(f"  {size:>6} bytes: {layout_os_pages(size):.2f} (mínimo {ideal})"
+              f"{'  <- sin alinear (antes)' if size == LEGACY_PAGE_SIZE else ''}")
+
+    songs = synthetic_songs(records)
+    keys = [s.track_id for s in random.Random(3).sample(songs, min(lookups, len(songs)))]
+    print("\nB+ Tree, búsqueda puntual (el índice queda en el pool, la página de datos se lee de disco):")
+    print(f"  {'página':>6} {'reg/pág':>7} {'altura':>6} {'KiB/búsq':>8} {'págs SO':>7} {'amplif.':>7} {'µs':>7}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in PAGE_SIZES:
+            r = bench_bplustree(size, songs, keys, tmp_dir)
+            print(f"  {r['page_size']:>6} {r['records_per_page']:>7} {r['height']:>6} {r['data_kib']:>8.1f}"
+                  f" {r['os_pages']:>7.2f} {r['amplification']:>7.1f} {r['us_per_lookup']:>7.1f}")
+    print("--- BENCHMARK COMPLETADO ---")
+
+# --- Ejecución Principal ---
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Amplificación de lectura del B+ Tree con páginas de 4/8/16 KiB.")
+    parser.add_argument("--records", type=int, default=RECORDS)
+    parser.add_argument("--lookups", type=int, default=LOOKUPS)
+    args = parser.parse_args()
+    run_benchmark(args.records, args.lookups)
@@ -0,0 +1,77 @@
+import re
+import struct
+
+from app.data.records.song import _field_offsets
+
+
+class Airbnb:
+    FMT = "20s100s40sidd"
+    RECORD_SIZE = struct.calcsize(FMT)
+
+    # Columnas en el orden de FMT; coordinates ocupa los dos últimos campos (latitud, longitud)
+    FIELDS = ("id", "name", "neighbourhood", "price", "coordinates")
+    FIELD_FMTS = ("20s", "100s", "40s", "i", "d", "d")
+    FIELD_OFFSETS = _field_offsets(FIELD_FMTS)
+    KEY = "id"
+
+    def __init__(self, id: str, name: str, neighbourhood: str, price: int, coordinates):
+        self.id = str(id)
+        self.name = name
+        self.neighbourhood = neighbourhood
+        self.price = int(price)
+        self.coordinates = parse_coordinates(coordinates)
+
+    def pack(self):
+        id_bytes = self.id.encode('utf-8')[:20].ljust(20, b'\x00')
+        name_bytes = (self.name or '').encode('utf-8')[:100].ljust(100, b'\x00')
+        neighbourhood_bytes = (self.neighbourhood or '').encode('utf-8')[:40].ljust(40, b'\x00')
+
+        record = struct.pack(
+            self.FMT,
+            id_bytes,
+            name_bytes,
+            neighbourhood_bytes,
+            self.price,
+            self.coordinates[0],
+            self.coordinates[1]
+        )
+        return record
+
+    @staticmethod
+    def unpack(data):
+        if not data or len(data) < Airbnb.RECORD_SIZE:
+            return None
+
+        try:
+            id, name, neighbourhood, price, lat, lon = struct.unpack(Airbnb.FMT, data[:Airbnb.RECORD_SIZE])
+            return Airbnb(
+                id=id.decode('utf-8', errors='ignore').rstrip('\x00').strip(),
+                name=name.decode('utf-8', errors='ignore').rstrip('\x00').strip(),
+                neighbourhood=neighbourhood.decode('utf-8', errors='ignore').rstrip('\x00').strip(),
+                price=price,
+                coordinates=(lat, lon)
+            )
+        except Exception:
+            return None
+
+    @staticmethod
+    def from_csv_row(row: dict):
+        """Registro a partir de una fila de AB_NYC_2019.csv (latitude/longitude en columnas separadas)."""
+        return Airbnb(
+            id=row['id'].strip(),
+            name=(row.get('name') or '').strip(),
+            neighbourhood=(row.get('neighbourhood') or '').strip(),
+            price=int(float(row['price'])),
+            coordinates=(float(row['latitude']), float(row['longitude']))
+        )
+
+    def __repr__(self):
+        return f"Airbnb(id='{self.id}', name='{self.name[:30]}...', coordinates={self.coordinates})"
+
+
+def parse_coordinates(value):
+    """Acepta (lat, lon), [lat, lon] o el texto '(lat, lon)' / '[lat, lon]' que deja el parser de INSERT."""
+    if isinstance(value, str):
+        value = re.findall(r"[+-]?\d+(?:\.\d+)?", value)
+    lat, lon = value
+    return (float(lat), float(lon))
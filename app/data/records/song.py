@@ -1,10 +1,27 @@
 import struct
 
+from app.engines.keycodec import encode_key
+
+
+def _field_offsets(fmts):
+    """Offset de cada campo respetando la alineación nativa de struct."""
+    return tuple(struct.calcsize("".join(fmts[:i + 1])) - struct.calcsize(fmts[i]) for i in range(len(fmts)))
+
 
 class Song:
     FMT = "30s100s40si30s100s12sffi"
     RECORD_SIZE = struct.calcsize(FMT)
 
+    # Columnas en el orden de FMT, con su formato y su offset dentro del registro empaquetado
+    FIELDS = ("track_id", "track_name", "track_artist", "track_popularity", "track_album_id",
+              "track_album_name", "track_album_release_date", "acousticness", "instrumentalness", "duration_ms")
+    FIELD_FMTS = ("30s", "100s", "40s", "i", "30s", "100s", "12s", "f", "f", "i")
+    FIELD_OFFSETS = _field_offsets(FIELD_FMTS)
+    KEY = "track_id"
+    # La clave va primero en el registro empaquetado y ya es comparable byte a byte (ver keycodec)
+    KEY_TYPE = "varchar(30)"
+    KEY_SIZE = 30
+
     def __init__(self, track_id: str, track_name: str, track_artist: str, track_popularity: int,
                  track_album_id: str, track_album_name: str, track_album_release_date: str,
                  acousticness: float, instrumentalness: float, duration_ms: int):
@@ -69,5 +86,70 @@ class Song:
             # En caso de error, retornar None
             return None
 
+    def key_bytes(self) -> bytes:
+        return encode_key(self.track_id, Song.KEY_TYPE)
+
+    def __repr__(self):
+        return f"Song(track_id='{self.track_id[:20]}...', name='{self.track_name[:30]}...')"
+
+    @staticmethod
+    def lazy(data):
+        """Vista perezosa sobre el registro empaquetado: cada campo se decodifica al leerlo."""
+        if not data or len(data) < Song.RECORD_SIZE:
+            return None
+        return SongView(data)
+
+
+class SongView:
+    """
+    Registro Song sin decodificar. Los campos se leen del memoryview solo cuando se
+    acceden (y se cachean); pack() devuelve los bytes originales sin re-empaquetar.
+    """
+    FIELDS = Song.FIELDS
+    KEY = Song.KEY
+    _SPECS = {
+        name: (fmt, off)
+        for name, fmt, off in zip(Song.FIELDS, Song.FIELD_FMTS, Song.FIELD_OFFSETS)
+    }
+
+    def __init__(self, data):
+        object.__setattr__(self, "_buf", memoryview(data)[:Song.RECORD_SIZE])
+        object.__setattr__(self, "_values", {})
+        object.__setattr__(self, "_modified", False)
+
+    def __getattr__(self, name):
+        spec = SongView._SPECS.get(name)
+        if spec is None:
+            raise AttributeError(name)
+        values = self._values
+        if name not in values:
+            fmt, off = spec
+            if fmt.endswith("s"):
+                raw = self._buf[off:off + int(fmt[:-1])].tobytes()
+                values[name] = raw.decode('utf-8', errors='ignore').rstrip('\x00').strip()
+            else:
+                values[name] = struct.unpack_from(fmt, self._buf, off)[0]
+        return values[name]
+
+    def __setattr__(self, name, value):
+        if name not in SongView._SPECS:
+            raise AttributeError(name)
+        self._values[name] = value
+        object.__setattr__(self, "_modified", True)
+
+    def key_bytes(self) -> bytes:
+        """Clave codificada leída directo del buffer, sin decodificar el texto."""
+        if self._modified and "track_id" in self._values:
+            return encode_key(self._values["track_id"], Song.KEY_TYPE)
+        return self._buf[:Song.KEY_SIZE].tobytes()
+
+    def to_song(self) -> Song:
+        return Song(*(getattr(self, name) for name in Song.FIELDS))
+
+    def pack(self):
+        if self._modified:
+            return self.to_song().pack()
+        return self._buf.tobytes()
+
     def __repr__(self):
-        return f"Song(track_id='{self.track_id[:20]}...', name='{self.track_name[:30]}...')"
\ No newline at end of file
+        return f"Song(track_id='{self.track_id[:20]}...', name='{self.track_name[:30]}...')"
@@ -0,0 +1,161 @@
+import os
+import math
+import mmap
+import struct
+import hashlib
+
+# Con al menos DRIFT_MIN_SAMPLES consultas de claves ausentes, una tasa observada mayor que
+# DRIFT_FACTOR veces la pedida indica que conviene reconstruir los filtros
+DRIFT_FACTOR = 4
+DRIFT_MIN_SAMPLES = 1000
+
+
+class BloomFile:
+    """
+    Un filtro de Bloom de tamaño fijo por slot (p. ej. por cadena de buckets),
+    todos en un archivo lateral mapeado en memoria.
+
+    El tamaño se calcula para `capacity` claves por filtro con la tasa de falsos
+    positivos pedida. Los filtros no admiten borrados: tras un delete las claves
+    viejas quedan como falsos positivos hasta que el dueño haga reset() del slot.
+    drifted() avisa cuando la tasa observada se aleja de la pedida.
+    """
+
+    # Formato del Header: magic, bits por filtro, funciones de hash, limpio (1) / sucio (0)
+    MAGIC = b"BLM1"
+    HEADER_FMT = "4siii"
+    HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    CLEAN_OFFSET = 12
+    MIN_SLOTS = 64
+
+    def __init__(self, path: str, fp_rate: float, capacity: int):
+        self.path = path
+        self.fp_rate = fp_rate
+        self.capacity = capacity
+        # m = -n ln p / (ln 2)^2, redondeado a bytes; k = m/n ln 2
+        bits = math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+        self.m_bits = max(64, -(-bits // 8) * 8)
+        self.k = max(1, round(self.m_bits / capacity * math.log(2)))
+        self.filter_size = self.m_bits // 8
+
+        self.lookups = 0
+        self.negatives = 0
+        self.false_positives = 0
+        # Ventana desde la última reconstrucción: (consultas de claves ausentes, falsos positivos)
+        self.window_absent = 0
+        self.window_fp = 0
+
+        # Hay que reconstruir si el archivo no existe, se creó con otros parámetros
+        # o no se cerró limpio (pudo perder bits que no llegaron a disco)
+        self.needs_rebuild = True
+        if os.path.exists(path) and os.path.getsize(path) >= self.HEADER_SIZE:
+            with open(path, "rb") as f:
+                magic, m_bits, k, clean = struct.unpack(self.HEADER_FMT, f.read(self.HEADER_SIZE))
+            self.needs_rebuild = not (magic == self.MAGIC and m_bits == self.m_bits and k == self.k and clean)
+        if self.needs_rebuild:
+            with open(path, "wb") as f:
+                f.write(struct.pack(self.HEADER_FMT, self.MAGIC, self.m_bits, self.k, 1))
+                f.truncate(self.HEADER_SIZE + self.MIN_SLOTS * self.filter_size)
+
+        self.mm = None
+        self.clean = True
+        self._map()
+
+    # ========== API Pública ==========
+
+    def might_contain(self, slot: int, key: bytes) -> bool:
+        self.lookups += 1
+        if slot >= self.slots:
+            return True
+        base = self.HEADER_SIZE + slot * self.filter_size
+        for bit in self._bits(key):
+            if not self.mm[base + (bit >> 3)] & (1 << (bit & 7)):
+                self.negatives += 1
+                self.window_absent += 1
+                return False
+        return True
+
+    def add(self, slot: int, key: bytes):
+        self._ensure(slot)
+        base = self.HEADER_SIZE + slot * self.filter_size
+        for bit in self._bits(key):
+            self.mm[base + (bit >> 3)] |= 1 << (bit & 7)
+
+    def reset(self, slot: int, keys=()):
+        """Vacía el filtro del slot y lo vuelve a llenar con las claves dadas."""
+        self._ensure(slot)
+        base = self.HEADER_SIZE + slot * self.filter_size
+        self.mm[base:base + self.filter_size] = bytes(self.filter_size)
+        for key in keys:
+            self.add(slot, key)
+
+    def record_false_positive(self):
+        self.false_positives += 1
+        self.window_absent += 1
+        self.window_fp += 1
+
+    def drifted(self) -> bool:
+        return (self.window_absent >= DRIFT_MIN_SAMPLES
+                and self.window_fp > DRIFT_FACTOR * self.fp_rate * self.window_absent)
+
+    def reset_window(self):
+        self.window_absent = self.window_fp = 0
+
+    def flush(self):
+        if self.mm is not None and not self.clean:
+            self.mm.flush()
+            self._set_clean(True)
+
+    def close(self):
+        self.flush()
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def stats(self) -> dict:
+        # Consultas de claves que no estaban: las descartadas más los falsos positivos
+        absent = self.negatives + self.false_positives
+        return {
+            "target_fp_rate": self.fp_rate,
+            # Tasa teórica con el filtro lleno a capacidad: (1 - e^(-kn/m))^k
+            "expected_fp_rate": (1 - math.exp(-self.k * self.capacity / self.m_bits)) ** self.k,
+            "observed_fp_rate": self.false_positives / absent if absent else 0.0,
+            "bits_per_filter": self.m_bits,
+            "hash_functions": self.k,
+            "filters": self.slots,
+            "memory_bytes": self.slots * self.filter_size,
+            "lookups": self.lookups,
+            "negatives": self.negatives,
+            "false_positives": self.false_positives,
+        }
+
+    # ========== Métodos Internos ==========
+
+    def _bits(self, key: bytes):
+        # Doble hashing (Kirsch-Mitzenmacher) sobre un hash independiente del que elige el bucket
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        h1, h2 = struct.unpack("<II", digest)
+        h2 |= 1
+        return [(h1 + i * h2) % self.m_bits for i in range(self.k)]
+
+    def _map(self):
+        with open(self.path, "r+b") as f:
+            self.mm = mmap.mmap(f.fileno(), 0)
+        self.slots = (len(self.mm) - self.HEADER_SIZE) // self.filter_size
+
+    def _ensure(self, slot: int):
+        if self.clean:
+            self._set_clean(False)
+        if slot < self.slots:
+            return
+        new_slots = max(slot + 1, 2 * self.slots)
+        self.mm.close()
+        with open(self.path, "r+b") as f:
+            f.truncate(self.HEADER_SIZE + new_slots * self.filter_size)
+        self._map()
+
+    def _set_clean(self, clean: bool):
+        """Marca el archivo como sucio antes de la primera escritura y limpio tras un flush."""
+        self.mm[self.CLEAN_OFFSET:self.HEADER_SIZE] = struct.pack("i", int(clean))
+        self.mm.flush(0, min(mmap.PAGESIZE, len(self.mm)))
+        self.clean = clean
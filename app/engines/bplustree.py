@@ -1,15 +1,51 @@
 import struct
 import os
+import heapq
+import tempfile
+from bisect import bisect_right
 from app.data.records.song import Song
+from app.engines.keycodec import encode_key
+from app.engines.bufferpool import BUFFER_POOL, BufferPool
+from app.engines.pagesize import auto_page_size, check_page_size, records_per_page
 
-R = 40  # Hijos por nodo índice
-M = 20  # Registros por página datos
+ROOT = 1  # Posición de la raíz en el índice; la 0 es la página de metadatos
 KEY_LEN = 30
+FILL_FACTOR = 0.9  # Ocupación de páginas y nodos en la carga masiva
+MIN_FILL = 0.5  # Ocupación mínima de páginas y nodos (salvo la raíz) después de un borrado
+RUN_SIZE = 100_000  # Registros ordenados en memoria antes de volcar un run a disco
+
+
+def common_prefix(keys) -> bytes:
+    """Prefijo común más largo de una lista de claves codificadas."""
+    if not keys:
+        return b""
+    lo, hi = min(keys), max(keys)
+    n = 0
+    while n < len(lo) and lo[n] == hi[n]:
+        n += 1
+    return lo[:n]
+
+
+def shortest_separator(left: bytes, right: bytes) -> bytes:
+    """
+    Prefijo más corto de `right` que sigue siendo mayor que `left` (left < right):
+    separa las dos hojas igual que la clave completa, pero ocupa menos en el nodo.
+    """
+    n = 0
+    while n < len(left) and n < len(right) and left[n] == right[n]:
+        n += 1
+    return bytes(right[:n + 1])
 
 
 class Node:
-    FMT = "?i" + ("30s" * (R - 1)) + ("i" * R)
-    SIZE = struct.calcsize(FMT)
+    """
+    Nodo índice de tamaño fijo en disco (node_size del árbol) con una cantidad variable de
+    claves: el prefijo común se guarda una sola vez y cada separador solo con su sufijo.
+    En memoria las claves están completas (prefijo + sufijo) y se comparan como bytes.
+    """
+    MAGIC = b"BN"
+    HEADER_FMT = "<2s?HB"  # magic, is_leaf, count, largo del prefijo
+    HEADER_SIZE = struct.calcsize(HEADER_FMT)
 
     def __init__(self, is_leaf=True, count=0):
         self.is_leaf = is_leaf
@@ -17,11 +53,17 @@ class Node:
         self.keys = []
         self.children = []
 
+    def encoded_size(self) -> int:
+        keys = self.keys[:self.count]
+        prefix = len(common_prefix(keys))
+        # cabecera + prefijo + hijos (i) + largo de cada sufijo (B) + sufijos
+        return (Node.HEADER_SIZE + prefix + 4 * (self.count + 1)
+                + sum(1 + len(k) - prefix for k in keys))
+
 
 class DataPage:
     HEADER_FMT = "ii"
     HEADER_SIZE = struct.calcsize(HEADER_FMT)
-    SIZE = HEADER_SIZE + M * Song.RECORD_SIZE
 
     def __init__(self, count=0, next_page=-1):
         self.count = count
@@ -29,77 +71,164 @@ class DataPage:
         self.records = []
 
 
+class Meta:
+    # Página 0 del índice: magic, tamaño de página de datos, tamaño de nodo, registros por página
+    # y cabezas de las listas libres de páginas y de nodos. La posición 0 nunca se libera (es la
+    # primera hoja y la página de metadatos), así que 0 marca una lista vacía.
+    FMT = "<4siiiii"
+    SIZE = struct.calcsize(FMT)
+    MAGIC = b"BPT2"
+
+    def __init__(self, page_size: int, node_size: int, records: int, free_page: int = 0, free_node: int = 0):
+        self.page_size = page_size
+        self.node_size = node_size
+        self.records = records
+        self.free_page = free_page
+        self.free_node = free_node
+
+
 class BPlusTreeFile:
-    def __init__(self, datafile: str, indexfile: str):
+    def __init__(self, datafile: str, indexfile: str, pool: BufferPool = BUFFER_POOL,
+                 page_size: int | None = None):
+        """
+        page_size solo se usa al crear los archivos (por defecto, la página alineada al SO
+        más chica con lugar para ~20 registros); un árbol existente usa la de su header.
+        """
         self.datafile = datafile
         self.indexfile = indexfile
-        self._init_files()
+        self.pool = pool
+        self._init_files(page_size)
+        # La raíz se consulta en cada descenso: queda fijada en el pool
+        self.pool.get(self.indexfile, ROOT, self.node_size, self._decode_node, pin=True)
 
-    def _init_files(self):
+    def _init_files(self, page_size: int | None):
+        # Si el archivo no está en disco, cualquier página cacheada es de un archivo borrado
         if not os.path.exists(self.indexfile):
+            self.pool.discard(self.indexfile)
+            self._set_geometry(self._new_meta(page_size))
             root = Node(is_leaf=True, count=0)
             root.children = [0]
-            self._write_node(root, 0)
+            with open(self.indexfile, "wb") as f:
+                f.write(self._encode_meta(self.meta))
+                f.write(self._encode_node(root))
+        else:
+            self._set_geometry(self._read_meta())
         if not os.path.exists(self.datafile):
+            self.pool.discard(self.datafile)
             self._write_page(DataPage(), 0)
+            self.pool.flush(self.datafile)
 
     # ========== API Pública ==========
 
     def search(self, key: str):
         """Busca una clave específica"""
-        page_idx = self._find_leaf_page(key, 0)
+        kb = self._key_bytes(key)
+        page_idx = self._find_leaf_page(kb, ROOT)
         page = self._read_page(page_idx)
 
         for r in page.records[:page.count]:
-            if r.track_id == key:
+            if r.key_bytes() == kb:
                 return r
         return None
 
     def rangeSearch(self, begin: str, end: str):
         """Busca todas las claves en el rango [begin, end]"""
-        page_idx = self._find_leaf_page(begin, 0)
+        begin, end = self._key_bytes(begin), self._key_bytes(end)
+        page_idx = self._find_leaf_page(begin, ROOT)
         results = []
 
         while page_idx >= 0:
             page = self._read_page(page_idx)
             for r in page.records[:page.count]:
-                if begin <= r.track_id <= end:
+                kb = r.key_bytes()
+                if begin <= kb <= end:
                     results.append(r)
-                elif r.track_id > end:
+                elif kb > end:
                     return results
             page_idx = page.next_page
 
         return results
 
+    def scan(self, after: str = None):
+        """Recorre las hojas en orden de clave; con after, desde la primera clave > after."""
+        after = self._key_bytes(after) if after is not None else None
+        page_idx = self._find_leaf_page(after or b"", ROOT)
+
+        while page_idx >= 0:
+            page = self._read_page(page_idx)
+            for r in page.records[:page.count]:
+                if after is None or r.key_bytes() > after:
+                    yield r
+            page_idx = page.next_page
+
     def add(self, song: Song):
         if not song.track_id:
             return
+        # Empaquetar antes de tocar páginas: un registro inválido no deja un split a medias
+        song.pack()
 
         # Encontrar página destino
         node_path = []
-        page_idx = self._find_leaf_page(song.track_id, 0, node_path)
+        page_idx = self._find_leaf_page(song.key_bytes(), ROOT, node_path)
 
         # Insertar en página
         page = self._read_page(page_idx)
         self._insert_in_page(page, song)
 
-        # Verificar overflow
-        if page.count > M:
-            self._write_page(page, page_idx)
-            new_page_idx, sep_key = self._split_page(page_idx)
+        # Verificar overflow (la página desbordada se divide en memoria,
+        # escribirla antes truncaría el registro sobrante)
+        if page.count > self.m:
+            new_page_idx, sep_key = self._split_page(page_idx, page)
             self._insert_in_index(node_path, sep_key, new_page_idx)
         else:
             self._write_page(page, page_idx)
 
+    def add_many(self, songs):
+        """
+        Inserta un lote: lo ordena, agrupa los registros por hoja destino y escribe
+        cada página tocada una sola vez (dividiéndola en varias si hace falta).
+        """
+        keyed = sorted({s.key_bytes(): s for s in songs if s and s.track_id}.items())
+        batch = [s for _, s in keyed]
+        keys = [k for k, _ in keyed]
+        for song in batch:
+            song.pack()
+        i = 0
+        while i < len(batch):
+            node_path = []
+            page_idx = self._find_leaf_page(keys[i], ROOT, node_path)
+            upper = self._upper_bound(node_path)
+
+            group = []
+            while i < len(batch) and (upper is None or keys[i] < upper):
+                group.append(batch[i])
+                i += 1
+
+            page = self._read_page(page_idx)
+            page.records = self._merge_records(page.records[:page.count], group)
+            page.count = len(page.records)
+
+            if page.count <= self.m:
+                self._write_page(page, page_idx)
+            else:
+                self._split_page_many(page_idx, page)
+
     def remove(self, key: str):
-        page_idx = self._find_leaf_page(key, 0)
+        """
+        Borra el registro de su hoja. Si la hoja queda por debajo de MIN_FILL toma registros
+        de una hermana o se fusiona con ella; la fusión quita el separador del padre y el
+        rebalanceo sigue hacia la raíz. Las páginas y nodos liberados van a listas libres.
+        """
+        kb = self._key_bytes(key)
+        path = []
+        page_idx = self._find_leaf_page(kb, ROOT, path)
         page = self._read_page(page_idx)
 
         # Buscar y eliminar
         found = False
         new_records = []
         for r in page.records[:page.count]:
-            if r.track_id != key or found:
+            if r.key_bytes() != kb or found:
                 new_records.append(r)
             else:
                 found = True
@@ -109,22 +238,194 @@ class BPlusTreeFile:
 
         page.records = new_records
         page.count = len(new_records)
-        self._write_page(page, page_idx)
+        if page.count >= int(self.m * MIN_FILL):
+            self._write_page(page, page_idx)
+        else:
+            self._rebalance_page(path, page_idx, page)
         return True
 
+    def stats(self) -> dict:
+        root = self._read_node(ROOT)
+        height, node = 1, root
+        while not node.is_leaf:
+            node = self._read_node(node.children[0])
+            height += 1
+        return {
+            "height": height,
+            "root_children": root.count + 1,
+            "index_nodes": self.pool.file_size(self.indexfile) // self.node_size - ROOT,
+            "data_pages": self.pool.file_size(self.datafile) // self.page_size,
+            "page_size": self.page_size,
+            "node_size": self.node_size,
+            "records_per_page": self.m,
+            "free_pages": self._free_list_length(self.meta.free_page, lambda pos: self._read_page(pos).next_page),
+            "free_nodes": self._free_list_length(self.meta.free_node, lambda pos: self._read_node(pos).children[0]),
+        }
+
+    def is_empty(self):
+        root = self._read_node(ROOT)
+        return root.is_leaf and root.count == 0 and self._read_page(root.children[0]).count == 0
+
+    # ========== Carga Masiva ==========
+
+    def bulk_load(self, songs, fill_factor: float = FILL_FACTOR, run_size: int = RUN_SIZE):
+        """
+        Construye el árbol de abajo hacia arriba a partir de un iterable de canciones.
+        Reemplaza el contenido actual. Las claves repetidas conservan la última aparición.
+        """
+        leaf_fill = max(1, min(self.m, int(self.m * fill_factor)))
+        node_fill = int(self.node_size * fill_factor)
+        meta = Meta(self.page_size, self.node_size, self.m)
+
+        # Hojas e índice se arman en archivos aparte y reemplazan a los actuales recién
+        # cuando el árbol está completo: si la carga falla, el árbol anterior queda intacto
+        new_datafile, new_indexfile = self.datafile + ".tmp", self.indexfile + ".tmp"
+        try:
+            with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(self.datafile))) as tmp:
+                ordered = self._sorted_unique(self._external_sort(songs, run_size, tmp))
+                level = self._write_leaves(ordered, leaf_fill, new_datafile)
+            self._write_index_levels(level, node_fill, new_indexfile, meta)
+        except BaseException:
+            for path in (new_datafile, new_indexfile):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        self.pool.discard(self.datafile)
+        self.pool.discard(self.indexfile)
+        os.replace(new_datafile, self.datafile)
+        os.replace(new_indexfile, self.indexfile)
+        self.meta = meta
+        self.pool.get(self.indexfile, ROOT, self.node_size, self._decode_node, pin=True)
+
+    def _external_sort(self, songs, run_size: int, tmp_dir: str):
+        """Ordena por clave codificada; si no cabe en un run, vuelca runs ordenados y los fusiona."""
+        runs = []
+        buffer = []
+        for song in songs:
+            if not song or not song.track_id:
+                continue
+            buffer.append(song)
+            if len(buffer) >= run_size:
+                runs.append(self._spill_run(buffer, tmp_dir, len(runs)))
+                buffer = []
+        buffer.sort(key=lambda s: s.key_bytes())
+
+        if not runs:
+            yield from buffer
+            return
+        streams = [self._read_run(path) for path in runs] + [iter(buffer)]
+        yield from heapq.merge(*streams, key=lambda s: s.key_bytes())
+
+    def _spill_run(self, buffer: list, tmp_dir: str, n: int):
+        buffer.sort(key=lambda s: s.key_bytes())
+        path = os.path.join(tmp_dir, f"run{n}.tmp")
+        with open(path, "wb") as f:
+            for song in buffer:
+                f.write(song.pack())
+        return path
+
+    def _read_run(self, path: str):
+        with open(path, "rb") as f:
+            while data := f.read(Song.RECORD_SIZE):
+                yield Song.lazy(data)
+
+    def _sorted_unique(self, ordered):
+        prev = None
+        for song in ordered:
+            if prev is not None and song.key_bytes() != prev.key_bytes():
+                yield prev
+            prev = song
+        if prev is not None:
+            yield prev
+
+    def _write_leaves(self, ordered, leaf_fill: int, path: str):
+        """
+        Escribe las páginas de datos en `path` en una sola pasada secuencial. Devuelve [(separador, page)],
+        donde el separador es el más corto entre la última clave de la página anterior y la primera.
+        """
+        level = []
+        prev_last = None
+        with open(path, "wb") as f:
+            page = DataPage()
+            for song in ordered:
+                if page.count == leaf_fill:
+                    page.next_page = len(level) + 1
+                    f.write(self._encode_page(page))
+                    level.append((self._page_separator(prev_last, page), len(level)))
+                    prev_last = page.records[-1].key_bytes()
+                    page = DataPage()
+                page.records.append(song)
+                page.count += 1
+            f.write(self._encode_page(page))
+            level.append((self._page_separator(prev_last, page), len(level)))
+        return level
+
+    def _page_separator(self, prev_last, page: DataPage) -> bytes:
+        if prev_last is None or not page.records:
+            return b""
+        return shortest_separator(prev_last, page.records[0].key_bytes())
+
+    def _write_index_levels(self, level: list, node_fill: int, path: str, meta: Meta):
+        """Agrupa cada nivel en nodos hasta que queda uno solo, que se escribe como raíz en ROOT."""
+        with open(path, "wb") as f:
+            f.write(self._encode_meta(meta))
+            next_pos = ROOT + 1
+            is_leaf = True
+            while True:
+                nodes = []
+                for group in self._pack_level(level, node_fill):
+                    node = Node(is_leaf=is_leaf, count=len(group) - 1)
+                    node.keys = [k for k, _ in group[1:]]
+                    node.children = [c for _, c in group]
+                    nodes.append((group[0][0], node))
+
+                if len(nodes) == 1:
+                    f.seek(ROOT * self.node_size)
+                    f.write(self._encode_node(nodes[0][1]))
+                    return
+
+                level = []
+                f.seek(next_pos * self.node_size)
+                for min_key, node in nodes:
+                    f.write(self._encode_node(node))
+                    level.append((min_key, next_pos))
+                    next_pos += 1
+                is_leaf = False
+
+    def _pack_level(self, level: list, limit: int):
+        """
+        Agrupa [(separador, hijo)] en nodos de a lo sumo `limit` bytes codificados. El separador
+        del primer hijo de cada grupo sube al nivel siguiente y no ocupa espacio en el nodo.
+        """
+        groups = []
+        group, prefix, total = [level[0]], None, 0
+        for entry in level[1:]:
+            key = entry[0]
+            p = key if prefix is None else common_prefix([prefix, key])
+            n = len(group)  # claves del nodo si se agrega entry
+            size = Node.HEADER_SIZE + len(p) + 4 * (n + 1) + n + total + len(key) - n * len(p)
+            if size > limit and n >= 2:
+                groups.append(group)
+                group, prefix, total = [entry], None, 0
+            else:
+                group.append(entry)
+                prefix, total = p, total + len(key)
+        groups.append(group)
+
+        # Que ningún nodo quede con un solo hijo
+        if len(groups) > 1 and len(groups[-1]) < 2:
+            groups[-1].insert(0, groups[-2].pop())
+        return groups
+
     # ========== Métodos Internos ==========
 
-    def _find_leaf_page(self, key: str, node_pos: int, path=None):
-        """Encuentra la página hoja que debería contener la clave"""
+    def _find_leaf_page(self, key: bytes, node_pos: int, path=None):
+        """Encuentra la página hoja que debería contener la clave (ya codificada)"""
         node = self._read_node(node_pos)
 
-        # Encontrar posición correcta
-        pos = 0
-        for i in range(node.count):
-            if key >= node.keys[i]:
-                pos = i + 1
-            else:
-                break
+        # Encontrar posición correcta: primer separador > clave, comparando bytes
+        pos = bisect_right(node.keys, key, 0, node.count)
 
         # Asegurar que pos esté en rango válido
         pos = min(pos, len(node.children) - 1) if node.children else 0
@@ -153,20 +454,73 @@ class BPlusTreeFile:
 
     def _insert_in_page(self, page: DataPage, song: Song):
         """Inserta ordenado en página de datos"""
+        kb = song.key_bytes()
         pos = 0
         for i in range(page.count):
-            if page.records[i].track_id == song.track_id:
+            rk = page.records[i].key_bytes()
+            if rk == kb:
                 page.records[i] = song
                 return
-            if page.records[i].track_id < song.track_id:
+            if rk < kb:
                 pos = i + 1
 
         page.records.insert(pos, song)
         page.count += 1
 
-    def _split_page(self, page_idx: int):
+    def _key_bytes(self, key: str) -> bytes:
+        return encode_key(key, Song.KEY_TYPE)
+
+    def _upper_bound(self, path):
+        """Separador a la derecha de la hoja alcanzada por `path` (None si es la última)."""
+        for node_pos, child_pos in reversed(path):
+            node = self._read_node(node_pos)
+            if child_pos < node.count:
+                return node.keys[child_pos]
+        return None
+
+    def _merge_records(self, current: list, incoming: list):
+        """Fusiona dos listas ordenadas por clave; con claves iguales gana `incoming`."""
+        merged = []
+        a = b = 0
+        while a < len(current) and b < len(incoming):
+            ka, kb = current[a].key_bytes(), incoming[b].key_bytes()
+            if ka < kb:
+                merged.append(current[a])
+                a += 1
+            else:
+                if ka == kb:
+                    a += 1
+                merged.append(incoming[b])
+                b += 1
+        merged.extend(current[a:])
+        merged.extend(incoming[b:])
+        return merged
+
+    def _split_page_many(self, page_idx: int, page: DataPage):
+        """Reparte una página desbordada en las páginas necesarias y las indexa."""
+        n_pages = -(-page.count // self.m)
+        records = page.records
+        chunks = [records[j * len(records) // n_pages:(j + 1) * len(records) // n_pages] for j in range(n_pages)]
+
+        new_pages = [self._alloc_page() for _ in chunks[1:]]
+        positions = [page_idx] + new_pages
+        last_next = page.next_page
+        for j, chunk in enumerate(chunks):
+            p = page if j == 0 else DataPage()
+            p.records = chunk
+            p.count = len(chunk)
+            p.next_page = positions[j + 1] if j + 1 < len(positions) else last_next
+            self._write_page(p, positions[j])
+
+        # En orden creciente: cada separador desciende hasta la página anterior recién indexada
+        for prev, chunk, new_idx in zip(chunks, chunks[1:], new_pages):
+            node_path = []
+            self._find_leaf_page(chunk[0].key_bytes(), ROOT, node_path)
+            sep = shortest_separator(prev[-1].key_bytes(), chunk[0].key_bytes())
+            self._insert_in_index(node_path, sep, new_idx)
+
+    def _split_page(self, page_idx: int, left: DataPage):
         """Divide una página llena en dos"""
-        left = self._read_page(page_idx)
         mid = (left.count + 1) // 2
 
         right_idx = self._alloc_page()
@@ -180,41 +534,156 @@ class BPlusTreeFile:
         self._write_page(left, page_idx)
         self._write_page(right, right_idx)
 
-        return right_idx, right.records[0].track_id
+        return right_idx, shortest_separator(left.records[-1].key_bytes(), right.records[0].key_bytes())
 
-    def _insert_in_index(self, path, key: str, page_idx: int):
+    def _insert_in_index(self, path, key: bytes, page_idx: int):
         """Inserta clave en el índice, manejando splits si es necesario"""
         if not path:
-            old_root = self._read_node(0)
+            old_root = self._read_node(ROOT)
             new_root_idx = self._alloc_node()
             self._write_node(old_root, new_root_idx)
 
             new_root = Node(is_leaf=False, count=1)
             new_root.keys = [key]
             new_root.children = [new_root_idx, page_idx]
-            self._write_node(new_root, 0)
+            self._write_node(new_root, ROOT)
             return
 
         node_pos, child_pos = path.pop()
         node = self._read_node(node_pos)
 
-        insert_pos = 0
-        for i in range(node.count):
-            if key >= node.keys[i]:
-                insert_pos = i + 1
-            else:
-                break
+        insert_pos = bisect_right(node.keys, key, 0, node.count)
 
         node.keys.insert(insert_pos, key)
         node.children.insert(child_pos + 1, page_idx)
         node.count += 1
 
-        if node.count <= R - 1:
+        self._write_or_split(path, node, node_pos)
+
+    def _write_or_split(self, path, node: Node, node_pos: int):
+        """Escribe el nodo o, si ya no entra en node_size, lo divide y sube el separador por `path`."""
+        if node.encoded_size() <= self.node_size:
             self._write_node(node, node_pos)
         else:
             new_node_idx, up_key = self._split_node(node, node_pos)
             self._insert_in_index(path, up_key, new_node_idx)
 
+    # ========== Borrado: redistribución y fusión ==========
+
+    def _rebalance_page(self, path, page_idx: int, page: DataPage):
+        """Hoja con menos de MIN_FILL: redistribuye con una hermana del mismo padre o se fusiona con ella."""
+        node_pos, child_pos = path.pop()
+        node = self._read_node(node_pos)
+        if node.count == 0:
+            # Única hoja del árbol: puede quedar vacía
+            self._write_page(page, page_idx)
+            return
+
+        # Hermana izquierda si existe; las hojas hermanas son consecutivas en la cadena next_page
+        sep_idx = child_pos - 1 if child_pos > 0 else 0
+        left_idx, right_idx = node.children[sep_idx], node.children[sep_idx + 1]
+        left = self._read_page(left_idx) if left_idx != page_idx else page
+        right = self._read_page(right_idx) if right_idx != page_idx else page
+        records = left.records[:left.count] + right.records[:right.count]
+
+        if len(records) <= self.m:
+            # Fusión en la izquierda: la derecha sale de la cadena y va a la lista libre
+            left.records = records
+            left.count = len(records)
+            left.next_page = right.next_page
+            self._write_page(left, left_idx)
+            self._free_page(right_idx)
+            del node.keys[sep_idx]
+            del node.children[sep_idx + 1]
+            node.count -= 1
+            self._rebalance_node(path, node_pos, node)
+            return
+
+        # Redistribución: mitad y mitad, con el separador más corto entre ambas
+        mid = len(records) // 2
+        left.records, right.records = records[:mid], records[mid:]
+        left.count, right.count = len(left.records), len(right.records)
+        self._write_page(left, left_idx)
+        self._write_page(right, right_idx)
+        node.keys[sep_idx] = shortest_separator(left.records[-1].key_bytes(), right.records[0].key_bytes())
+        self._write_or_split(path, node, node_pos)
+
+    def _rebalance_node(self, path, node_pos: int, node: Node):
+        """Nodo que perdió un separador: baja la raíz un nivel si quedó con un hijo, o se fusiona o redistribuye."""
+        if node_pos == ROOT:
+            if node.count == 0 and not node.is_leaf:
+                # La raíz quedó con un solo hijo: el hijo pasa a ser la raíz y el árbol baja un nivel
+                child_pos = node.children[0]
+                self._write_node(self._read_node(child_pos), ROOT)
+                self._free_node(child_pos)
+            else:
+                self._write_node(node, ROOT)
+            return
+
+        half = int(self.node_size * MIN_FILL)
+        parent_pos, child_pos = path.pop()
+        parent = self._read_node(parent_pos)
+        if node.encoded_size() >= half or parent.count == 0:
+            self._write_node(node, node_pos)
+            return
+
+        sep_idx = child_pos - 1 if child_pos > 0 else 0
+        left_pos, right_pos = parent.children[sep_idx], parent.children[sep_idx + 1]
+        left = self._read_node(left_pos) if left_pos != node_pos else node
+        right = self._read_node(right_pos) if right_pos != node_pos else node
+
+        # El separador del padre baja entre las claves de los dos hermanos
+        merged = Node(is_leaf=node.is_leaf, count=left.count + 1 + right.count)
+        merged.keys = left.keys[:left.count] + [parent.keys[sep_idx]] + right.keys[:right.count]
+        merged.children = left.children[:left.count + 1] + right.children[:right.count + 1]
+        if merged.encoded_size() <= self.node_size:
+            self._write_node(merged, left_pos)
+            self._free_node(right_pos)
+            del parent.keys[sep_idx]
+            del parent.children[sep_idx + 1]
+            parent.count -= 1
+            self._rebalance_node(path, parent_pos, parent)
+            return
+
+        # No entran juntos: se rotan entradas por el padre hasta emparejar los tamaños
+        if node is right:
+            while node.encoded_size() < left.encoded_size() and left.count > 1:
+                right.keys.insert(0, parent.keys[sep_idx])
+                right.children.insert(0, left.children.pop())
+                parent.keys[sep_idx] = left.keys.pop()
+                left.count -= 1
+                right.count += 1
+        else:
+            while node.encoded_size() < right.encoded_size() and right.count > 1:
+                left.keys.append(parent.keys[sep_idx])
+                left.children.append(right.children.pop(0))
+                parent.keys[sep_idx] = right.keys.pop(0)
+                right.count -= 1
+                left.count += 1
+        self._write_node(left, left_pos)
+        self._write_node(right, right_pos)
+        # El separador nuevo puede ser más largo: el padre podría tener que dividirse
+        self._write_or_split(path, parent, parent_pos)
+
+    def _free_page(self, pos: int):
+        self._write_page(DataPage(count=0, next_page=self.meta.free_page), pos)
+        self.meta.free_page = pos
+        self._write_meta()
+
+    def _free_node(self, pos: int):
+        node = Node(is_leaf=False, count=0)
+        node.children = [self.meta.free_node]
+        self._write_node(node, pos)
+        self.meta.free_node = pos
+        self._write_meta()
+
+    def _free_list_length(self, head: int, next_of) -> int:
+        n = 0
+        while head:
+            n += 1
+            head = next_of(head)
+        return n
+
     def _split_node(self, node: Node, node_pos: int):
         """Divide un nodo índice lleno"""
         mid = node.count // 2
@@ -236,65 +705,116 @@ class BPlusTreeFile:
 
     # ========== I/O ==========
 
+    def flush(self):
+        """Checkpoint: baja a disco las páginas sucias de este árbol."""
+        self.pool.flush(self.indexfile)
+        self.pool.flush(self.datafile)
+
+    def close(self):
+        self.pool.unpin(self.indexfile, ROOT)
+        self.flush()
+
     def _read_node(self, pos: int):
-        with open(self.indexfile, "rb") as f:
-            f.seek(pos * Node.SIZE)
-            data = f.read(Node.SIZE)
+        return self.pool.get(self.indexfile, pos, self.node_size, self._decode_node)
 
-        if len(data) < Node.SIZE:
+    def _decode_node(self, data: bytes):
+        if len(data) < self.node_size or not any(data[:Node.HEADER_SIZE]):
             return Node()
 
-        unpacked = struct.unpack(Node.FMT, data)
-        is_leaf = bool(unpacked[0])
-        count = int(unpacked[1])
+        magic, is_leaf, count, prefix_len = struct.unpack_from(Node.HEADER_FMT, data)
+        if magic != Node.MAGIC:
+            raise ValueError(f"{self.indexfile} no es un índice B+ con nodos de longitud variable")
 
         node = Node(is_leaf, count)
-        node.keys = []
-        for i in range(count):
-            key = unpacked[2 + i].decode().rstrip('\x00').strip()
-            if key:
-                node.keys.append(key)
-
-        node.children = list(unpacked[2 + R - 1:2 + R - 1 + R])[:count + 1]
+        off = Node.HEADER_SIZE
+        prefix = bytes(data[off:off + prefix_len])
+        off += prefix_len
+        node.children = list(struct.unpack_from(f"<{count + 1}i", data, off))
+        off += 4 * (count + 1)
+        lengths = data[off:off + count]
+        off += count
+
+        # Las claves se rearman completas: se comparan como bytes sin decodificar
+        for n in lengths:
+            node.keys.append(prefix + bytes(data[off:off + n]))
+            off += n
         return node
 
     def _write_node(self, node: Node, pos: int):
-        keys = [b'\x00' * KEY_LEN] * (R - 1)
-        for i in range(min(node.count, R - 1)):
-            k = node.keys[i].encode()[:KEY_LEN]
-            keys[i] = k + b'\x00' * (KEY_LEN - len(k))
-
-        children = (node.children + [-1] * R)[:R]
-        packed = struct.pack(Node.FMT, node.is_leaf, node.count, *keys, *children)
-
-        with open(self.indexfile, "r+b" if os.path.exists(self.indexfile) else "wb") as f:
-            f.seek(pos * Node.SIZE)
-            f.write(packed)
+        self.pool.put(self.indexfile, pos, self.node_size, node, self._encode_node)
+
+    def _encode_node(self, node: Node):
+        keys = [k[:KEY_LEN] for k in node.keys[:node.count]]
+        prefix = common_prefix(keys)
+        children = (node.children + [-1] * (node.count + 1))[:node.count + 1]
+
+        data = (struct.pack(Node.HEADER_FMT, Node.MAGIC, node.is_leaf, node.count, len(prefix))
+                + prefix
+                + struct.pack(f"<{node.count + 1}i", *children)
+                + bytes(len(k) - len(prefix) for k in keys)
+                + b"".join(k[len(prefix):] for k in keys))
+        if len(data) > self.node_size:
+            raise ValueError(f"Nodo índice de {len(data)} bytes excede node_size ({self.node_size})")
+        return data.ljust(self.node_size, b"\x00")
 
     def _alloc_node(self):
-        size = os.path.getsize(self.indexfile) if os.path.exists(self.indexfile) else 0
-        return size // Node.SIZE
+        """Reutiliza un nodo de la lista libre o agrega uno al final del índice."""
+        if self.meta.free_node:
+            pos = self.meta.free_node
+            self.meta.free_node = self._read_node(pos).children[0]
+            self._write_meta()
+            return pos
+        return self.pool.file_size(self.indexfile) // self.node_size
+
+    def _new_meta(self, page_size: int | None) -> Meta:
+        header, record = DataPage.HEADER_SIZE, Song.RECORD_SIZE
+        page_size = check_page_size(page_size, header, record) if page_size else auto_page_size(header, record)
+        # Los nodos usan el mismo tamaño de página que las hojas
+        return Meta(page_size, page_size, records_per_page(page_size, header, record))
+
+    def _read_meta(self) -> Meta:
+        # La página 0 puede estar sucia en el pool si otra instancia usó el archivo
+        self.pool.flush(self.indexfile)
+        with open(self.indexfile, "rb") as f:
+            data = f.read(Meta.SIZE)
+        if len(data) < Meta.SIZE or data[:4] != Meta.MAGIC:
+            raise ValueError(f"{self.indexfile} no es un índice B+ con header de geometría")
+        _, page_size, node_size, records, free_page, free_node = struct.unpack(Meta.FMT, data)
+        return Meta(page_size, node_size, records, free_page, free_node)
+
+    def _set_geometry(self, meta: Meta):
+        self.meta = meta
+        self.page_size = meta.page_size
+        self.node_size = meta.node_size
+        self.m = meta.records
+
+    def _write_meta(self):
+        self.pool.put(self.indexfile, 0, self.node_size, self.meta, self._encode_meta)
+
+    def _encode_meta(self, meta: Meta) -> bytes:
+        data = struct.pack(Meta.FMT, Meta.MAGIC, meta.page_size, meta.node_size, meta.records,
+                           meta.free_page, meta.free_node)
+        return data.ljust(self.node_size, b"\x00")
 
     def _read_page(self, pos: int):
-        with open(self.datafile, "rb") as f:
-            f.seek(pos * DataPage.SIZE)
-            header = f.read(DataPage.HEADER_SIZE)
+        return self.pool.get(self.datafile, pos, self.page_size, self._decode_page)
 
-            if len(header) < DataPage.HEADER_SIZE:
-                return DataPage()
+    def _decode_page(self, data: bytes):
+        if len(data) < DataPage.HEADER_SIZE:
+            return DataPage()
 
-            count, next_page = struct.unpack(DataPage.HEADER_FMT, header)
-            raw = f.read(M * Song.RECORD_SIZE)
+        count, next_page = struct.unpack(DataPage.HEADER_FMT, data[:DataPage.HEADER_SIZE])
+        raw = memoryview(data)[DataPage.HEADER_SIZE:]
 
         page = DataPage(count, next_page)
-        for i in range(min(count, M)):
+        for i in range(min(count, self.m)):
             start = i * Song.RECORD_SIZE
             end = start + Song.RECORD_SIZE
             chunk = raw[start:end]
 
             if len(chunk) == Song.RECORD_SIZE:
                 try:
-                    song = Song.unpack(chunk)
+                    song = Song.lazy(chunk)
                     if song:
                         page.records.append(song)
                 except Exception:
@@ -304,21 +824,25 @@ class BPlusTreeFile:
         return page
 
     def _write_page(self, page: DataPage, pos: int):
-        page.count = min(page.count, M, len(page.records))
+        page.count = min(page.count, self.m, len(page.records))
+        self.pool.put(self.datafile, pos, self.page_size, page, self._encode_page)
+
+    def _encode_page(self, page: DataPage):
         header = struct.pack(DataPage.HEADER_FMT, page.count, page.next_page)
 
-        body = bytearray(M * Song.RECORD_SIZE)
+        body = bytearray(self.page_size - DataPage.HEADER_SIZE)
         for i in range(page.count):
             chunk = page.records[i].pack()
             body[i * Song.RECORD_SIZE:(i + 1) * Song.RECORD_SIZE] = chunk
-
-        with open(self.datafile, "r+b" if os.path.exists(self.datafile) else "wb") as f:
-            f.seek(pos * DataPage.SIZE)
-            f.write(header)
-            f.write(body)
+        return header + bytes(body)
 
     def _alloc_page(self):
-        size = os.path.getsize(self.datafile) if os.path.exists(self.datafile) else 0
-        pos = size // DataPage.SIZE
+        """Reutiliza una página de la lista libre o agrega una al final del archivo de datos."""
+        if self.meta.free_page:
+            pos = self.meta.free_page
+            self.meta.free_page = self._read_page(pos).next_page
+            self._write_meta()
+        else:
+            pos = self.pool.file_size(self.datafile) // self.page_size
         self._write_page(DataPage(), pos)
         return pos
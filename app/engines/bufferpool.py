@@ -0,0 +1,197 @@
+import os
+import atexit
+import threading
+from collections import OrderedDict
+
+from app.settings import BUFFER_POOL_BYTES
+
+
+class Frame:
+    """Página cacheada: objeto decodificado + los bytes que se escriben al bajarla a disco."""
+
+    def __init__(self, obj, size: int, data: bytes = None, dirty=False):
+        self.obj = obj
+        self.size = size
+        self.data = data
+        self.dirty = dirty
+        self.pins = 0
+
+
+class BufferPool:
+    """
+    Buffer pool compartido a nivel de página con reemplazo LRU.
+
+    Las páginas se identifican por (archivo, posición) y se guardan ya
+    decodificadas, así un acierto no paga ni el open() ni el unpack.
+    Las escrituras se codifican en put() (un registro inválido falla en la
+    operación que lo escribe) y solo marcan el frame como sucio; se bajan a
+    disco al ser desalojado o en un checkpoint (flush).
+    """
+
+    def __init__(self, capacity_bytes: int = BUFFER_POOL_BYTES):
+        self.capacity_bytes = capacity_bytes
+        self.used_bytes = 0
+        self.frames = OrderedDict()
+        self.handles = {}
+        self.extents = {}
+        self.lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    # ========== API Pública ==========
+
+    def get(self, path: str, pos: int, size: int, decode, pin=False):
+        """Devuelve la página (path, pos) leyéndola de disco solo si no está cacheada."""
+        key = (os.path.abspath(path), pos)
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is not None:
+                self.hits += 1
+                self.frames.move_to_end(key)
+            else:
+                self.misses += 1
+                f = self._handle(key[0])
+                f.seek(pos * size)
+                frame = Frame(decode(f.read(size)), size)
+                self._insert(key, frame)
+            if pin:
+                frame.pins += 1
+            return frame.obj
+
+    def put(self, path: str, pos: int, size: int, obj, encode):
+        """Registra una escritura de página; se persiste más tarde (write-back)."""
+        key = (os.path.abspath(path), pos)
+        with self.lock:
+            frame = self.frames.get(key)
+            try:
+                data = encode(obj)
+            except Exception:
+                # El objeto cacheado pudo quedar modificado a medias: se baja la última imagen
+                # válida y se descarta el frame para que la próxima lectura venga de disco
+                if frame is not None:
+                    if frame.dirty:
+                        self._write_back(key, frame)
+                    del self.frames[key]
+                    self.used_bytes -= frame.size
+                raise
+            if frame is not None:
+                frame.obj = obj
+                frame.data = data
+                frame.dirty = True
+                self.frames.move_to_end(key)
+            else:
+                frame = Frame(obj, size, data, dirty=True)
+                self._insert(key, frame)
+            end = (pos + 1) * size
+            if end > self.extents.get(key[0], 0):
+                self.extents[key[0]] = end
+
+    def pin(self, path: str, pos: int):
+        with self.lock:
+            frame = self.frames.get((os.path.abspath(path), pos))
+            if frame is not None:
+                frame.pins += 1
+
+    def unpin(self, path: str, pos: int):
+        with self.lock:
+            frame = self.frames.get((os.path.abspath(path), pos))
+            if frame is not None and frame.pins > 0:
+                frame.pins -= 1
+            self._evict()
+
+    def file_size(self, path: str) -> int:
+        """Tamaño lógico del archivo, contando páginas sucias aún no escritas."""
+        path = os.path.abspath(path)
+        with self.lock:
+            on_disk = os.path.getsize(path) if os.path.exists(path) else 0
+            return max(on_disk, self.extents.get(path, 0))
+
+    def flush(self, path: str = None):
+        """Checkpoint: escribe todas las páginas sucias (de un archivo o de todos)."""
+        target = os.path.abspath(path) if path else None
+        with self.lock:
+            for key, frame in self.frames.items():
+                if frame.dirty and (target is None or key[0] == target):
+                    self._write_back(key, frame)
+            for p, f in self.handles.items():
+                if target is None or p == target:
+                    f.flush()
+
+    def discard(self, path: str):
+        """Olvida todas las páginas de un archivo sin escribirlas (p. ej. si fue borrado)."""
+        path = os.path.abspath(path)
+        with self.lock:
+            for key in [k for k in self.frames if k[0] == path]:
+                self.used_bytes -= self.frames.pop(key).size
+            self.extents.pop(path, None)
+            f = self.handles.pop(path, None)
+            if f is not None:
+                f.close()
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            for f in self.handles.values():
+                f.close()
+            self.handles.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "capacity_bytes": self.capacity_bytes,
+                "used_bytes": self.used_bytes,
+                "frames": len(self.frames),
+                "dirty": sum(1 for fr in self.frames.values() if fr.dirty),
+                "pinned": sum(1 for fr in self.frames.values() if fr.pins),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "writebacks": self.writebacks,
+            }
+
+    # ========== Métodos Internos ==========
+
+    def _handle(self, path: str):
+        f = self.handles.get(path)
+        if f is None:
+            f = open(path, "r+b" if os.path.exists(path) else "w+b")
+            self.handles[path] = f
+        return f
+
+    def _insert(self, key, frame: Frame):
+        self.frames[key] = frame
+        self.used_bytes += frame.size
+        self._evict()
+
+    def _evict(self):
+        """Desaloja frames LRU no fijados hasta volver al presupuesto."""
+        if self.used_bytes <= self.capacity_bytes:
+            return
+        for key in list(self.frames):
+            if self.used_bytes <= self.capacity_bytes:
+                break
+            frame = self.frames[key]
+            if frame.pins:
+                continue
+            if frame.dirty:
+                self._write_back(key, frame)
+            del self.frames[key]
+            self.used_bytes -= frame.size
+            self.evictions += 1
+
+    def _write_back(self, key, frame: Frame):
+        f = self._handle(key[0])
+        f.seek(key[1] * frame.size)
+        f.write(frame.data)
+        frame.dirty = False
+        self.writebacks += 1
+
+
+# Instancia compartida por todos los motores del proceso
+BUFFER_POOL = BufferPool()
+atexit.register(BUFFER_POOL.close)
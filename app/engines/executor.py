@@ -0,0 +1,136 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.settings import ENGINE_WORKERS
+
+
+class RWLock:
+    """Lock lector/escritor: varios lectores en paralelo, escritores exclusivos y con prioridad."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        with self.cond:
+            while self.writer or self.waiting_writers:
+                self.cond.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.cond:
+            self.readers -= 1
+            if self.readers == 0:
+                self.cond.notify_all()
+
+    def acquire_write(self):
+        with self.cond:
+            self.waiting_writers += 1
+            while self.writer or self.readers:
+                self.cond.wait()
+            self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        with self.cond:
+            self.writer = False
+            self.cond.notify_all()
+
+
+class EngineExecutor:
+    """
+    Ejecuta las llamadas (bloqueantes) a los motores en un pool de hilos acotado,
+    fuera del event loop, bajo el lock lector/escritor de la tabla.
+    """
+
+    def __init__(self, max_workers: int = ENGINE_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="engine")
+        self.max_workers = max_workers
+        self.table_locks: dict[str, RWLock] = {}
+        self.lock = threading.Lock()
+
+        self.queued = 0
+        self.max_queued = 0
+        self.active = 0
+        self.completed = 0
+        self.lock_waits = {
+            "read": {"count": 0, "total_s": 0.0, "max_s": 0.0},
+            "write": {"count": 0, "total_s": 0.0, "max_s": 0.0},
+        }
+
+    # ========== API Pública ==========
+
+    async def read(self, table: str, fn, *args):
+        return await self._submit(table, "read", fn, args)
+
+    async def write(self, table: str, fn, *args):
+        return await self._submit(table, "write", fn, args)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self.lock:
+            waits = {}
+            for mode, w in self.lock_waits.items():
+                waits[mode] = dict(w, avg_s=w["total_s"] / w["count"] if w["count"] else 0.0)
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self.queued,
+                "max_queue_depth": self.max_queued,
+                "active": self.active,
+                "completed": self.completed,
+                "lock_wait": waits,
+            }
+
+    # ========== Métodos Internos ==========
+
+    def _table_lock(self, table: str) -> RWLock:
+        with self.lock:
+            lock = self.table_locks.get(table.lower())
+            if lock is None:
+                lock = self.table_locks[table.lower()] = RWLock()
+            return lock
+
+    async def _submit(self, table: str, mode: str, fn, args):
+        with self.lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, self._run, table, mode, fn, args)
+
+    def _run(self, table: str, mode: str, fn, args):
+        with self.lock:
+            self.queued -= 1
+            self.active += 1
+        lock = self._table_lock(table)
+        start = time.perf_counter()
+        if mode == "write":
+            lock.acquire_write()
+        else:
+            lock.acquire_read()
+        self._record_wait(mode, time.perf_counter() - start)
+        try:
+            return fn(*args)
+        finally:
+            if mode == "write":
+                lock.release_write()
+            else:
+                lock.release_read()
+            with self.lock:
+                self.active -= 1
+                self.completed += 1
+
+    def _record_wait(self, mode: str, waited: float):
+        with self.lock:
+            w = self.lock_waits[mode]
+            w["count"] += 1
+            w["total_s"] += waited
+            w["max_s"] = max(w["max_s"], waited)
+
+
+ENGINE_EXECUTOR = EngineExecutor()
@@ -1,15 +1,65 @@
 import struct
 import os
+import mmap
+import zlib
+import argparse
+from itertools import islice
+import numpy as np
 from app.data.records.song import Song
+from app.engines.bloom import BloomFile
+from app.engines.pagesize import auto_page_size, check_page_size, records_per_page
+from app.settings import BLOOM_FP_RATE
 
-# M es el Factor de Bloque 
-M = 20
+# Factor de bloque de los archivos sin geometría en el header (buckets de 20 registros, sin alinear)
+LEGACY_RECORDS = 20
+KEY_SIZE = 30
+# Entradas del journal del directorio antes de hacer checkpoint
+JOURNAL_MAX_ENTRIES = 4096
+# Dos buckets hermanos se fusionan si juntos ocupan como mucho esta fracción de la capacidad
+MERGE_THRESHOLD = 0.5
+MIN_GLOBAL_DEPTH = 2
+# local_depth de un bucket liberado (los buckets en uso tienen local_depth >= 1)
+FREE_DEPTH = 0
+
+# Funciones de hash persistidas en el header del directorio
+HASH_LEGACY = 0  # hash() de Python: aleatorio por proceso, solo para leer archivos antiguos
+HASH_CRC32 = 1   # CRC-32 de la clave rellenada a KEY_SIZE bytes: estable entre procesos
+
+
+def _key_bytes(key: str) -> bytes:
+    return key.encode('utf-8')[:KEY_SIZE].ljust(KEY_SIZE, b'\x00')
+
+
+def stable_hash(key: str) -> int:
+    return zlib.crc32(_key_bytes(key))
+
+
+def _crc32_table():
+    table = np.zeros(256, dtype=np.uint32)
+    for i in range(256):
+        c = i
+        for _ in range(8):
+            c = (c >> 1) ^ 0xEDB88320 if c & 1 else c >> 1
+        table[i] = c
+    return table
+
+
+_CRC32_TABLE = _crc32_table()
+
+
+def stable_hash_batch(keys) -> np.ndarray:
+    """Misma función que stable_hash, vectorizada: un paso por byte de clave para todo el lote."""
+    buf = np.frombuffer(b"".join(_key_bytes(k) for k in keys), dtype=np.uint8).reshape(-1, KEY_SIZE)
+    crc = np.full(len(buf), 0xFFFFFFFF, dtype=np.uint32)
+    for j in range(KEY_SIZE):
+        crc = _CRC32_TABLE[(crc ^ buf[:, j]) & 0xFF] ^ (crc >> 8)
+    return crc ^ np.uint32(0xFFFFFFFF)
 
 class Bucket:
     # Formato del Header: count, local_depth, next_overflow_bucket
     HEADER_FMT = "iii"
     HEADER_SIZE = struct.calcsize(HEADER_FMT)
-    BUCKET_SIZE = HEADER_SIZE + M * Song.RECORD_SIZE
+    LEGACY_SIZE = HEADER_SIZE + LEGACY_RECORDS * Song.RECORD_SIZE
 
     def __init__(self, count=0, local_depth=1, next_overflow=-1):
         self.count = count
@@ -18,28 +68,59 @@ class Bucket:
         self.records = []
 
 class Directory:
-    # Formato del Header: global_depth
-    HEADER_FMT = "i"
+    # Formato del Header: magic, función de hash, tamaño de bucket, registros por bucket y
+    # global_depth (siempre al final del header); luego 2^global_depth punteros int32
+    MAGIC = b"EHD2"
+    HEADER_FMT = "4siiii"
     HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    # Directorios EHD1: sin geometría, buckets de LEGACY_RECORDS registros
+    V1_MAGIC = b"EHD1"
+    V1_HEADER_FMT = "4sii"
+    V1_HEADER_SIZE = struct.calcsize(V1_HEADER_FMT)
+    # Archivos antiguos: solo global_depth
+    LEGACY_HEADER_FMT = "i"
+    LEGACY_HEADER_SIZE = struct.calcsize(LEGACY_HEADER_FMT)
+    # Journal (<dirfile>.log): residuo, profundidad, bucket. Todo índice i con
+    # i mod 2^profundidad == residuo apunta al bucket.
+    JOURNAL_FMT = "iii"
+    JOURNAL_SIZE = struct.calcsize(JOURNAL_FMT)
 
-    def __init__(self, global_depth=2, pointers=None):
+    def __init__(self, global_depth=2, pointers=None, hash_fn=HASH_CRC32, header_size=HEADER_SIZE,
+                 bucket_size=Bucket.LEGACY_SIZE, capacity=LEGACY_RECORDS):
         self.global_depth = global_depth
+        self.hash_fn = hash_fn
+        self.header_size = header_size
+        self.bucket_size = bucket_size
+        self.capacity = capacity
         if pointers is None:
-            self.pointers = [0, 1, 0, 1]
+            self.pointers = np.array([0, 1, 0, 1], dtype=np.int32)
         else:
             self.pointers = pointers
 
 class ExtendibleHashingFile:
-    def __init__(self, datafile: str, dirfile: str):
+    def __init__(self, datafile: str, dirfile: str, bloom_fp_rate: float = BLOOM_FP_RATE,
+                 page_size: int | None = None):
+        """
+        page_size (tamaño de bucket) solo se usa al crear el directorio; uno existente
+        conserva la geometría de su header.
+        """
         self.datafile = datafile
         self.dirfile = dirfile
-        self._init_files()
+        self.journalfile = dirfile + ".log"
+        self.dir_mmap = None
+        self.journal_entries = 0
+        self.free_buckets = None
+        self.page_size = page_size
         self.directory = self._read_directory()
+        self.bucket_size = self.directory.bucket_size
+        self.m = self.directory.capacity
+        self._init_files()
+        # Un filtro por cadena, indexado por la posición del bucket cabeza
+        self.bloom = BloomFile(datafile + ".bloom", bloom_fp_rate, self.m)
+        if self.bloom.needs_rebuild:
+            self._rebuild_bloom()
 
     def _init_files(self):
-        if not os.path.exists(self.dirfile):
-            directory = Directory()
-            self._write_directory(directory)
         if not os.path.exists(self.datafile):
             bucket0 = Bucket(local_depth=1)
             bucket1 = Bucket(local_depth=1)
@@ -51,6 +132,8 @@ class ExtendibleHashingFile:
     def search(self, key: str):
         """Busca un registro por su clave usando el directorio en memoria."""
         bucket_pos = self._get_bucket_pos(key, self.directory)
+        if not self.bloom.might_contain(bucket_pos, _key_bytes(key)):
+            return None
 
         while bucket_pos != -1:
             bucket = self._read_bucket(bucket_pos)
@@ -59,70 +142,197 @@ class ExtendibleHashingFile:
                     return record
             bucket_pos = bucket.next_overflow
             
+        self._false_positive()
         return None
 
+    def scan(self, after: str = None):
+        """
+        Recorre todos los buckets en orden de posición en el archivo. Con after, continúa
+        justo después de esa clave (o desde el inicio de su cadena si ya no existe).
+        """
+        start_pos, skip = 0, 0
+        if after is not None:
+            start_pos, skip = self._get_bucket_pos(after, self.directory), 0
+            current_pos = start_pos
+            while current_pos != -1:
+                bucket = self._read_bucket(current_pos)
+                idx = next((i for i, r in enumerate(bucket.records) if r.track_id == after), None)
+                if idx is not None:
+                    start_pos, skip = current_pos, idx + 1
+                    break
+                current_pos = bucket.next_overflow
+
+        n_buckets = os.path.getsize(self.datafile) // self.bucket_size
+        for pos in range(start_pos, n_buckets):
+            bucket = self._read_bucket(pos)
+            yield from bucket.records[skip if pos == start_pos else 0:]
+
     def add(self, song: Song):
         """Agrega un nuevo registro de canción."""
         if not song.track_id:
             return
+        # Empaquetar antes de tocar buckets: un registro inválido no deja un split a medias
+        song.pack()
 
         # Usa el directorio en memoria para encontrar la posición.
         bucket_pos = self._get_bucket_pos(song.track_id, self.directory)
         self._add_to_bucket_chain(song, bucket_pos)
 
+    def add_many(self, songs):
+        """
+        Inserta un lote agrupando los registros por bucket destino: cada cadena se lee
+        una vez y cada bucket tocado se escribe una vez. Lo que no cabe pasa por add(),
+        que se encarga de los splits.
+        """
+        songs = [s for s in songs if s and s.track_id]
+        if not songs:
+            return
+        for song in songs:
+            song.pack()
+        if self.directory.hash_fn == HASH_LEGACY:
+            heads = [self._get_bucket_pos(s.track_id, self.directory) for s in songs]
+        else:
+            mask = (1 << self.directory.global_depth) - 1
+            heads = np.asarray(self.directory.pointers)[stable_hash_batch([s.track_id for s in songs]) & mask].tolist()
+
+        groups = {}
+        for song, head_pos in zip(songs, heads):
+            groups.setdefault(head_pos, {})[song.track_id] = song
+
+        pending = []
+        for head_pos, group in groups.items():
+            chain = self._read_chain(head_pos)
+
+            touched = set()
+            if any(self.bloom.might_contain(head_pos, _key_bytes(k)) for k in group):
+                for pos, bucket in chain:
+                    for i, record in enumerate(bucket.records):
+                        if record.track_id in group:
+                            bucket.records[i] = group.pop(record.track_id)
+                            touched.add(pos)
+            for pos, bucket in chain:
+                while group and bucket.count < self.m:
+                    song = group.pop(next(iter(group)))
+                    bucket.records.append(song)
+                    bucket.count += 1
+                    self.bloom.add(head_pos, _key_bytes(song.track_id))
+                    touched.add(pos)
+
+            for pos, bucket in chain:
+                if pos in touched:
+                    self._write_bucket(bucket, pos)
+            pending.extend(group.values())
+
+        for song in pending:
+            self.add(song)
+
     def remove(self, key: str):
-        """Elimina un registro por su clave."""
+        """
+        Elimina un registro por su clave. Después compacta la cadena de overflow,
+        fusiona el bucket con su hermano si quedan casi vacíos y, si se puede,
+        reduce el directorio a la mitad.
+        """
         bucket_pos = self._get_bucket_pos(key, self.directory)
-        
-        current_pos = bucket_pos
-        while current_pos != -1:
-            bucket = self._read_bucket(current_pos)
-            
+        if not self.bloom.might_contain(bucket_pos, _key_bytes(key)):
+            return False
+        chain = self._read_chain(bucket_pos)
+
+        for current_pos, bucket in chain:
             record_to_remove = next((r for r in bucket.records if r.track_id == key), None)
             
             if record_to_remove:
                 bucket.records.remove(record_to_remove)
                 bucket.count -= 1
-                self._write_bucket(bucket, current_pos)
+                # La cadena ya está en memoria: rehacer su filtro saca la clave borrada
+                self.bloom.reset(bucket_pos, [_key_bytes(r.track_id) for _, b in chain for r in b.records])
+                self._compact_chain(chain, current_pos)
+                if self._merge_buddies(key):
+                    self._shrink_directory()
                 return True
-                
-            current_pos = bucket.next_overflow
             
+        self._false_positive()
         return False
 
+    def occupancy(self) -> dict:
+        """Ocupación de los buckets alcanzables desde el directorio y largo de sus cadenas."""
+        heads = set(self.directory.pointers.tolist())
+        records = buckets = max_chain = 0
+        for head_pos in heads:
+            chain = 0
+            current_pos = head_pos
+            while current_pos != -1:
+                bucket = self._read_bucket(current_pos)
+                records += bucket.count
+                buckets += 1
+                chain += 1
+                current_pos = bucket.next_overflow
+            max_chain = max(max_chain, chain)
+        return {
+            "hash_fn": self.directory.hash_fn,
+            "global_depth": self.directory.global_depth,
+            "records": records,
+            "buckets": buckets,
+            "fill": records / (buckets * self.m) if buckets else 0.0,
+            "max_chain": max_chain,
+        }
+
+    def stats(self) -> dict:
+        return {"bucket_size": self.bucket_size, "records_per_bucket": self.m, "bloom": self.bloom.stats()}
+
+    def flush(self):
+        """Checkpoint del directorio y de los filtros de Bloom."""
+        self.bloom.flush()
+        self._checkpoint_directory()
+
+    def close(self):
+        self.flush()
+        self.bloom.close()
+        self._unmap_directory()
+
     # ========== Métodos Internos ==========
     
     def _hash(self, key: str) -> int:
-        return hash(key)
+        if self.directory.hash_fn == HASH_LEGACY:
+            return hash(key)
+        return stable_hash(key)
 
     def _get_bucket_pos(self, key: str, directory: Directory):
         h = self._hash(key)
         dir_idx = h & ((1 << directory.global_depth) - 1)
-        return directory.pointers[dir_idx]
+        return int(directory.pointers[dir_idx])
 
     def _add_to_bucket_chain(self, song: Song, bucket_pos: int):
         current_pos = bucket_pos
         last_bucket_pos = -1
+        key = _key_bytes(song.track_id)
+        # Si el filtro descarta la clave no hace falta buscar duplicados
+        maybe_present = self.bloom.might_contain(bucket_pos, key)
         
         while current_pos != -1:
             bucket = self._read_bucket(current_pos)
             
             # Revisa si la canción ya existe para actualizarla
-            for i, record in enumerate(bucket.records):
-                if record.track_id == song.track_id:
-                    bucket.records[i] = song 
-                    self._write_bucket(bucket, current_pos)
-                    return
+            if maybe_present:
+                for i, record in enumerate(bucket.records):
+                    if record.track_id == song.track_id:
+                        bucket.records[i] = song 
+                        self._write_bucket(bucket, current_pos)
+                        return
             
-            if bucket.count < M:
+            if bucket.count < self.m:
                 bucket.records.append(song)
                 bucket.count += 1
                 self._write_bucket(bucket, current_pos)
+                self.bloom.add(bucket_pos, key)
+                if maybe_present:
+                    self._false_positive()
                 return
 
             last_bucket_pos = current_pos
             current_pos = bucket.next_overflow
-            
+
+        if maybe_present:
+            self._false_positive()
         # Si llegamos aquí, toda la cadena está llena.
         tail_bucket = self._read_bucket(last_bucket_pos)
         self._handle_overflow(tail_bucket, last_bucket_pos, bucket_pos, song)
@@ -145,17 +355,19 @@ class ExtendibleHashingFile:
                 
                 tail_bucket.next_overflow = new_overflow_pos
                 self._write_bucket(tail_bucket, tail_bucket_pos)
+                self.bloom.add(head_bucket_pos, _key_bytes(song.track_id))
 
 
     def _split_bucket(self, old_bucket_pos: int, new_song: Song):
         all_records_to_distribute = [new_song]
-        current_pos = old_bucket_pos
-        while current_pos != -1:
-            b = self._read_bucket(current_pos)
+        chain = self._read_chain(old_bucket_pos)
+        for _, b in chain:
             all_records_to_distribute.extend(b.records)
-            current_pos = b.next_overflow
+        # Los registros ya están en memoria: los buckets de overflow vuelven a la free list
+        for pos, _ in chain[1:]:
+            self._free_bucket(pos)
 
-        old_bucket = self._read_bucket(old_bucket_pos)
+        old_bucket = chain[0][1]
         new_bucket_pos = self._alloc_bucket()
         new_bucket = Bucket(local_depth=old_bucket.local_depth + 1)
         
@@ -164,17 +376,12 @@ class ExtendibleHashingFile:
         old_bucket.count = 0
         old_bucket.next_overflow = -1
         
-        # Actualizar punteros del directorio en memoria
+        # Actualizar punteros del directorio: el bucket viejo cubría los índices con
+        # i mod 2^(d-1) == residuo; los que además tienen el bit d-1 pasan al nuevo.
         d = old_bucket.local_depth
         split_pattern = 1 << (d - 1)
-        
-        for i, ptr in enumerate(self.directory.pointers):
-            if ptr == old_bucket_pos:
-                if (i & split_pattern) != 0:
-                    self.directory.pointers[i] = new_bucket_pos
-        
-        # Escribir el directorio actualizado al disco
-        self._write_directory(self.directory)
+        residue = (self._hash(new_song.track_id) & (split_pattern - 1)) | split_pattern
+        self._update_directory_range(residue, d, new_bucket_pos)
         
         # Redistribución de todos los registros
         for record in all_records_to_distribute:
@@ -191,71 +398,292 @@ class ExtendibleHashingFile:
         
         self._write_bucket(old_bucket, old_bucket_pos)
         self._write_bucket(new_bucket, new_bucket_pos)
+        self.bloom.reset(old_bucket_pos, [_key_bytes(r.track_id) for r in old_bucket.records])
+        self.bloom.reset(new_bucket_pos, [_key_bytes(r.track_id) for r in new_bucket.records])
+
+    def _read_chain(self, head_pos: int) -> list:
+        chain = []
+        current_pos = head_pos
+        while current_pos != -1:
+            bucket = self._read_bucket(current_pos)
+            chain.append((current_pos, bucket))
+            current_pos = bucket.next_overflow
+        return chain
+
+    def _compact_chain(self, chain: list, changed_pos: int):
+        """Reempaqueta la cadena en el mínimo de buckets y libera los que sobran."""
+        records = [r for _, b in chain for r in b.records]
+        needed = max(1, -(-len(records) // self.m))
+        if needed == len(chain):
+            self._write_bucket(dict(chain)[changed_pos], changed_pos)
+            return
+
+        for i in range(needed):
+            pos, bucket = chain[i]
+            bucket.records = records[i * self.m:(i + 1) * self.m]
+            bucket.count = len(bucket.records)
+            bucket.next_overflow = chain[i + 1][0] if i + 1 < needed else -1
+            self._write_bucket(bucket, pos)
+        for pos, _ in chain[needed:]:
+            self._free_bucket(pos)
+
+    def _merge_buddies(self, key: str) -> bool:
+        """
+        Fusiona el bucket de la clave con su hermano (mismo local_depth, índices que
+        difieren en el bit d-1) mientras ambos quepan bajo MERGE_THRESHOLD.
+        """
+        merged = False
+        h = self._hash(key)
+        while True:
+            pos = self._get_bucket_pos(key, self.directory)
+            bucket = self._read_bucket(pos)
+            d = bucket.local_depth
+            if d <= 1 or bucket.next_overflow != -1:
+                break
+
+            residue = h & ((1 << d) - 1)
+            buddy_bit = 1 << (d - 1)
+            buddy_pos = int(self.directory.pointers[residue ^ buddy_bit])
+            buddy = self._read_bucket(buddy_pos)
+            if (buddy.local_depth != d or buddy.next_overflow != -1
+                    or bucket.count + buddy.count > MERGE_THRESHOLD * self.m):
+                break
+
+            # Se conserva el bucket cuyos índices tienen el bit d-1 en cero
+            keep_pos, free_pos = (pos, buddy_pos) if not residue & buddy_bit else (buddy_pos, pos)
+            keep = Bucket(local_depth=d - 1)
+            keep.records = bucket.records + buddy.records
+            keep.count = len(keep.records)
+            self._write_bucket(keep, keep_pos)
+            self.bloom.reset(keep_pos, [_key_bytes(r.track_id) for r in keep.records])
+            self._update_directory_range(residue & (buddy_bit - 1), d - 1, keep_pos)
+            self._free_bucket(free_pos)
+            merged = True
+        return merged
+
+    def _shrink_directory(self):
+        """Reduce el directorio a la mitad mientras ambas mitades sean iguales (todo local_depth < global_depth)."""
+        pointers = self.directory.pointers
+        depth = self.directory.global_depth
+        while depth > MIN_GLOBAL_DEPTH:
+            half = 1 << (depth - 1)
+            if not np.array_equal(pointers[:half], pointers[half:2 * half]):
+                break
+            depth -= 1
+        del pointers
+        if depth == self.directory.global_depth:
+            return
+
+        # Checkpoint antes de recortar: el journal no debe referirse a slots que desaparecen
+        self._checkpoint_directory()
+        self._unmap_directory()
+        with open(self.dirfile, "r+b") as f:
+            # Primero el header y luego el truncate: si se corta en medio, solo sobra cola
+            f.seek(self.directory.header_size - Directory.LEGACY_HEADER_SIZE)
+            f.write(struct.pack("i", depth))
+            f.flush()
+            f.truncate(self.directory.header_size + (1 << depth) * 4)
+        self.directory.global_depth = depth
+        self._map_directory(self.directory)
+
+    def _rebuild_bloom(self):
+        """Recalcula los filtros de todas las cadenas a partir de los buckets."""
+        for head_pos in set(self.directory.pointers.tolist()):
+            keys = [_key_bytes(r.track_id) for _, b in self._read_chain(head_pos) for r in b.records]
+            self.bloom.reset(head_pos, keys)
+        self.bloom.flush()
+        self.bloom.reset_window()
+
+    def _false_positive(self):
+        """Anota un falso positivo; si la tasa observada se disparó, reconstruye los filtros."""
+        self.bloom.record_false_positive()
+        if self.bloom.drifted():
+            self._rebuild_bloom()
 
     def _double_directory(self):
-        """Duplica el tamaño del directorio en memoria y lo escribe en disco."""
+        """Duplica el directorio con un único append de la mitad nueva (copia de la actual)."""
+        data = self.directory.pointers.tobytes()
+        self._unmap_directory()
+        with open(self.dirfile, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            f.write(data)
+            # El header se actualiza después del append: si se corta antes, sobra cola
+            f.seek(self.directory.header_size - Directory.LEGACY_HEADER_SIZE)
+            f.write(struct.pack("i", self.directory.global_depth + 1))
         self.directory.global_depth += 1
-        self.directory.pointers.extend(self.directory.pointers)
-        self._write_directory(self.directory)
+        self._map_directory(self.directory)
 
     # ========== I/O ==========
 
     def _read_directory(self) -> Directory:
+        """Mapea el directorio sin copiarlo y reaplica el journal pendiente, si lo hay."""
         if not os.path.exists(self.dirfile) or os.path.getsize(self.dirfile) == 0:
-            return Directory()
+            self._write_directory(self._new_directory())
             
         with open(self.dirfile, "rb") as f:
             header_data = f.read(Directory.HEADER_SIZE)
-            global_depth = struct.unpack(Directory.HEADER_FMT, header_data)[0]
-            num_pointers = 1 << global_depth
-            pointers_fmt = "i" * num_pointers
-            pointers_data = f.read(struct.calcsize(pointers_fmt))
-            pointers = list(struct.unpack(pointers_fmt, pointers_data))
-            
-            return Directory(global_depth, pointers)
+        if header_data[:4] == Directory.MAGIC:
+            _, hash_fn, bucket_size, capacity, global_depth = struct.unpack(Directory.HEADER_FMT, header_data)
+            directory = Directory(global_depth, None, hash_fn, Directory.HEADER_SIZE, bucket_size, capacity)
+        elif header_data[:4] == Directory.V1_MAGIC:
+            _, hash_fn, global_depth = struct.unpack_from(Directory.V1_HEADER_FMT, header_data)
+            directory = Directory(global_depth, None, hash_fn, Directory.V1_HEADER_SIZE)
+        else:
+            # Directorio sin header: escrito con hash() de Python (ver rehash())
+            global_depth = struct.unpack_from(Directory.LEGACY_HEADER_FMT, header_data)[0]
+            directory = Directory(global_depth, None, HASH_LEGACY, Directory.LEGACY_HEADER_SIZE)
+        self._map_directory(directory)
+
+        if os.path.exists(self.journalfile):
+            with open(self.journalfile, "rb") as f:
+                journal = f.read()
+            usable = len(journal) - len(journal) % Directory.JOURNAL_SIZE
+            for residue, depth, pos in struct.iter_unpack(Directory.JOURNAL_FMT, journal[:usable]):
+                directory.pointers[residue::1 << depth] = pos
+            self.journal_entries = usable // Directory.JOURNAL_SIZE
+            self._checkpoint_directory()
+        return directory
+
+    def _map_directory(self, directory: Directory):
+        with open(self.dirfile, "r+b") as f:
+            self.dir_mmap = mmap.mmap(f.fileno(), 0)
+        directory.pointers = np.frombuffer(
+            self.dir_mmap, dtype=np.int32, count=1 << directory.global_depth, offset=directory.header_size
+        )
+
+    def _checkpoint_directory(self):
+        """Baja el mmap del directorio a disco y vacía el journal."""
+        if self.dir_mmap is not None:
+            self.dir_mmap.flush()
+        if self.journal_entries:
+            with open(self.journalfile, "wb"):
+                pass
+            self.journal_entries = 0
+
+    def _unmap_directory(self):
+        if self.dir_mmap is not None:
+            # El array de numpy exporta el buffer: hay que soltarlo antes de cerrar el mmap
+            if hasattr(self, "directory"):
+                self.directory.pointers = None
+            self.dir_mmap.close()
+            self.dir_mmap = None
+
+    def _update_directory_range(self, residue: int, depth: int, pos: int):
+        """Registra el cambio en el journal y actualiza solo los slots afectados en el mmap."""
+        with open(self.journalfile, "ab") as f:
+            f.write(struct.pack(Directory.JOURNAL_FMT, residue, depth, pos))
+        self.journal_entries += 1
+        self.directory.pointers[residue::1 << depth] = pos
+        if self.journal_entries >= JOURNAL_MAX_ENTRIES:
+            self._checkpoint_directory()
+
+    def _new_directory(self) -> Directory:
+        """Directorio vacío con la geometría pedida (o la alineada por defecto)."""
+        header, record = Bucket.HEADER_SIZE, Song.RECORD_SIZE
+        size = check_page_size(self.page_size, header, record) if self.page_size else auto_page_size(header, record)
+        return Directory(bucket_size=size, capacity=records_per_page(size, header, record))
 
     def _write_directory(self, directory: Directory):
         with open(self.dirfile, "wb") as f:
-            header = struct.pack(Directory.HEADER_FMT, directory.global_depth)
+            header = struct.pack(Directory.HEADER_FMT, Directory.MAGIC, directory.hash_fn,
+                                 directory.bucket_size, directory.capacity, directory.global_depth)
             f.write(header)
             
-            pointers_fmt = "i" * len(directory.pointers)
-            pointers_data = struct.pack(pointers_fmt, *directory.pointers)
-            f.write(pointers_data)
+            f.write(np.asarray(directory.pointers, dtype=np.int32).tobytes())
 
     def _read_bucket(self, pos: int) -> Bucket:
         with open(self.datafile, "rb") as f:
-            f.seek(pos * Bucket.BUCKET_SIZE)
+            f.seek(pos * self.bucket_size)
             header_data = f.read(Bucket.HEADER_SIZE)
             if len(header_data) < Bucket.HEADER_SIZE: return Bucket()
 
             count, local_depth, next_overflow = struct.unpack(Bucket.HEADER_FMT, header_data)
             bucket = Bucket(count, local_depth, next_overflow)
             
-            raw_records = f.read(M * Song.RECORD_SIZE)
+            raw_records = memoryview(f.read(self.m * Song.RECORD_SIZE))
             for i in range(count):
                 start = i * Song.RECORD_SIZE
                 end = start + Song.RECORD_SIZE
-                song = Song.unpack(raw_records[start:end])
+                song = Song.lazy(raw_records[start:end])
                 if song:
                     bucket.records.append(song)
             
             return bucket
 
     def _write_bucket(self, bucket: Bucket, pos: int):
+        # Se empaqueta todo antes de abrir el archivo: un error no deja el header sin su cuerpo
+        header = struct.pack(Bucket.HEADER_FMT, bucket.count, bucket.local_depth, bucket.next_overflow)
+        body = bytearray(self.bucket_size - Bucket.HEADER_SIZE)
+        for i in range(bucket.count):
+            chunk = bucket.records[i].pack()
+            body[i * Song.RECORD_SIZE:(i + 1) * Song.RECORD_SIZE] = chunk
         with open(self.datafile, "r+b" if os.path.exists(self.datafile) else "wb") as f:
-            f.seek(pos * Bucket.BUCKET_SIZE)
-            header = struct.pack(Bucket.HEADER_FMT, bucket.count, bucket.local_depth, bucket.next_overflow)
-            f.write(header)
-            
-            body = bytearray(M * Song.RECORD_SIZE)
-            for i in range(bucket.count):
-                chunk = bucket.records[i].pack()
-                body[i * Song.RECORD_SIZE:(i + 1) * Song.RECORD_SIZE] = chunk
-            f.write(body)
+            f.seek(pos * self.bucket_size)
+            f.write(header + body)
 
     def _alloc_bucket(self) -> int:
-        size = os.path.getsize(self.datafile) if os.path.exists(self.datafile) else 0
-        pos = size // Bucket.BUCKET_SIZE
+        free = self._free_list()
+        if free:
+            pos = free.pop()
+        else:
+            size = os.path.getsize(self.datafile) if os.path.exists(self.datafile) else 0
+            pos = size // self.bucket_size
         self._write_bucket(Bucket(), pos)
-        return pos
\ No newline at end of file
+        return pos
+
+    def _free_bucket(self, pos: int):
+        self._write_bucket(Bucket(local_depth=FREE_DEPTH), pos)
+        self.bloom.reset(pos)
+        self._free_list().append(pos)
+
+    def _free_list(self) -> list:
+        """Posiciones libres; se reconstruye una vez por instancia leyendo solo los headers."""
+        if self.free_buckets is None:
+            self.free_buckets = []
+            n_buckets = os.path.getsize(self.datafile) // self.bucket_size if os.path.exists(self.datafile) else 0
+            if n_buckets:
+                layout = np.dtype([("header", np.int32, 3), ("body", np.void, self.bucket_size - Bucket.HEADER_SIZE)])
+                buckets = np.memmap(self.datafile, dtype=layout, mode="r", shape=(n_buckets,))
+                self.free_buckets = np.nonzero(buckets["header"][:, 1] == FREE_DEPTH)[0].tolist()
+                del buckets
+        return self.free_buckets
+
+
+def rehash(datafile: str, dirfile: str, batch: int = 1000, page_size: int | None = None) -> dict:
+    """
+    Migración offline: redistribuye todos los registros de un par .dat/.dir con la
+    función de hash estable (p. ej. archivos escritos con hash() de Python) y
+    reemplaza los archivos originales. Los buckets nuevos usan page_size (por
+    defecto, el tamaño alineado a páginas del SO).
+    """
+    tmp_data, tmp_dir = datafile + ".rehash", dirfile + ".rehash"
+    for p in (tmp_data, tmp_dir):
+        if os.path.exists(p):
+            os.remove(p)
+
+    old = ExtendibleHashingFile(datafile, dirfile)
+    new = ExtendibleHashingFile(tmp_data, tmp_dir, page_size=page_size)
+    records = old.scan()
+    while chunk := list(islice(records, batch)):
+        new.add_many(chunk)
+    old.close()
+    new.close()
+
+    os.replace(tmp_data, datafile)
+    os.replace(tmp_dir, dirfile)
+    os.replace(new.bloom.path, old.bloom.path)
+    if os.path.exists(new.journalfile):
+        os.remove(new.journalfile)
+    migrated = ExtendibleHashingFile(datafile, dirfile)
+    stats = migrated.occupancy()
+    migrated.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rehash de un índice de hashing extensible con la función de hash estable.")
+    parser.add_argument("datafile")
+    parser.add_argument("dirfile")
+    parser.add_argument("--page-size", type=int, default=None, help="bytes por bucket (múltiplo de la página del SO)")
+    args = parser.parse_args()
+    print(rehash(args.datafile, args.dirfile, page_size=args.page_size))
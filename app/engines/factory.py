@@ -1,8 +1,13 @@
+import json
+import threading
 from typing import Any
-from app.settings import BPLUSTREE_DIR, EXTHASH_DIR, SEQFILE_DIR
+from app.settings import TABLES_ROOT, BPLUSTREE_DIR, EXTHASH_DIR, SEQFILE_DIR, RTREE_DIR, ISAM_DIR, SECONDARY_DIR
 
+# PAGE_SIZE pedido en CREATE TABLE, por tabla, para los motores paginados que se creen después
+TABLE_PAGE_SIZES = TABLES_ROOT / "page_sizes.json"
 
-def build_bplustree(table: str):
+
+def build_bplustree(table: str, page_size: int | None = None):
     from app.engines.bplustree import BPlusTreeFile
 
     datafile  = (BPLUSTREE_DIR / f"{table.lower()}.dat").as_posix()
@@ -10,17 +15,34 @@ def build_bplustree(table: str):
 
     return BPlusTreeFile(
         datafile=datafile,
-        indexfile=indexfile
+        indexfile=indexfile,
+        page_size=page_size
     )
 
-# Stubs para otros motores (cuando los tengas, impleméntalos aquí):
-def build_isam(table: str):
-    raise NotImplementedError("ISAM no implementado aún")
+def build_isam(table: str, page_size: int | None = None):
+    from app.engines.isam import ISAMFile
+
+    datafile = (ISAM_DIR / f"{table.lower()}.dat").as_posix()
+    indexfile = (ISAM_DIR / f"{table.lower()}.idx").as_posix()
+
+    return ISAMFile(
+        datafile=datafile,
+        indexfile=indexfile,
+        page_size=page_size
+    )
 
 def build_rtree(table: str):
-    raise NotImplementedError("RTree no implementado aún")
+    from app.engines.rtreefile import RTreeFile
+
+    datafile = (RTREE_DIR / f"{table.lower()}.dat").as_posix()
+    indexfile = (RTREE_DIR / f"{table.lower()}.idx").as_posix()
+
+    return RTreeFile(
+        datafile=datafile,
+        indexfile=indexfile
+    )
 
-def build_exthashing(table: str):
+def build_exthashing(table: str, page_size: int | None = None):
     from app.engines.extendiblehashing import ExtendibleHashingFile
 
     datafile = (EXTHASH_DIR / f"{table.lower()}.dat").as_posix()
@@ -28,20 +50,53 @@ def build_exthashing(table: str):
 
     return ExtendibleHashingFile(
         datafile=datafile,
-        dirfile=dirfile
+        dirfile=dirfile,
+        page_size=page_size
     )
 
 def build_seqfile(table: str):
     from app.engines.seqfile import SequentialFile
 
-    mainfile = (SEQFILE_DIR / f"main.dat").as_posix()
-    auxfile = (SEQFILE_DIR / f"aux.dat").as_posix()
+    mainfile = (SEQFILE_DIR / f"{table.lower()}.dat").as_posix()
+    auxfile = (SEQFILE_DIR / f"{table.lower()}.aux").as_posix()
 
     return SequentialFile(
         main_path=mainfile,
         aux_path=auxfile
     )
 
+def secondary_index_path(table: str, engine_type: str, column: str) -> str:
+    return (SECONDARY_DIR / f"{table.lower()}.{engine_type}.{column}.idx").as_posix()
+
+def open_secondary_indexes(table: str, engine_type: str) -> dict:
+    """Índices secundarios existentes de la tabla, por columna (el nombre del archivo lleva la columna)."""
+    from app.engines.secondary import SecondaryIndex
+
+    prefix = f"{table.lower()}.{engine_type}."
+    return {
+        path.name[len(prefix):-len(".idx")]: SecondaryIndex(path.as_posix())
+        for path in sorted(SECONDARY_DIR.glob(f"{prefix}*.idx"))
+    }
+
+# Motores con páginas de registros: aceptan page_size al crear sus archivos
+PAGED_ENGINES = {"bplustree", "isam", "exthashing"}
+PAGED_DIRS = {"bplustree": BPLUSTREE_DIR, "isam": ISAM_DIR, "exthashing": EXTHASH_DIR}
+
+def page_size_of(engine) -> int | None:
+    """Tamaño de página con el que quedaron los archivos del motor (el bucket en el hashing)."""
+    return getattr(engine, "bucket_size", None) or getattr(engine, "page_size", None)
+
+def check_table_page_size(page_size: int) -> int:
+    """Valida un PAGE_SIZE de tabla contra la página de datos de todos los motores paginados."""
+    from app.data.records.song import Song
+    from app.engines.bplustree import DataPage as BPlusPage
+    from app.engines.extendiblehashing import Bucket
+    from app.engines.isam import DataPage as ISAMPage
+    from app.engines.pagesize import check_page_size
+
+    header = max(BPlusPage.HEADER_SIZE, ISAMPage.HEADER_SIZE, Bucket.HEADER_SIZE)
+    return check_page_size(page_size, header, Song.RECORD_SIZE)
+
 ENGINE_BUILDERS = {
     "bplustree": build_bplustree,
     "isam": build_isam,
@@ -49,3 +104,91 @@ ENGINE_BUILDERS = {
     "exthashing": build_exthashing,
     "seqfile": build_seqfile
 }
+
+
+class EngineRegistry:
+    """
+    Motores abiertos del proceso, uno por (tabla, motor). Se construyen la primera
+    vez que se piden y conservan su estado (cachés, directorio, handles) hasta close().
+    """
+
+    def __init__(self, builders: dict = ENGINE_BUILDERS):
+        self.builders = builders
+        self.engines: dict[tuple[str, str], Any] = {}
+        self.lock = threading.Lock()
+
+    def open(self, table: str, engine_type: str | None = None, page_size: int | None = None):
+        """
+        page_size (o el de CREATE TABLE) solo cuenta si la tabla todavía no tiene archivos:
+        una tabla existente conserva la geometría de su header, y pedir otra es un error.
+        """
+        key = (table.lower(), engine_type or "bplustree")
+        with self.lock:
+            engine = self.engines.get(key)
+            if engine is None:
+                size = page_size or (self._table_page_sizes().get(key[0]) if key[1] in PAGED_ENGINES else None)
+                options = {"page_size": size} if size else {}
+                engine = self.builders[key[1]](key[0], **options)
+                indexes = open_secondary_indexes(*key)
+                if indexes:
+                    from app.engines.secondary import IndexedTable
+                    engine = IndexedTable(engine, indexes)
+                self.engines[key] = engine
+        if page_size and key[1] in PAGED_ENGINES and page_size_of(engine) != page_size:
+            raise ValueError(f"Table {key[0]} already exists with PAGE_SIZE {page_size_of(engine)}")
+        return engine
+
+    def set_page_size(self, table: str, page_size: int):
+        """PAGE_SIZE de CREATE TABLE: se usa cuando cada motor paginado crea los archivos de la tabla."""
+        check_table_page_size(page_size)
+        table = table.lower()
+        with self.lock:
+            existing = sorted(e for e in PAGED_ENGINES
+                              if (table, e) in self.engines or (PAGED_DIRS[e] / f"{table}.dat").exists())
+            if existing:
+                raise ValueError(f"Table {table} already has {', '.join(existing)} files with their own PAGE_SIZE")
+            sizes = self._table_page_sizes()
+            sizes[table] = page_size
+            TABLE_PAGE_SIZES.write_text(json.dumps(sizes, indent=2), encoding="utf-8")
+
+    def create_index(self, table: str, engine_type: str, column: str, value_type: int):
+        """Construye un índice secundario sobre `column` y deja la tabla abierta con él."""
+        from app.engines.secondary import IndexedTable, SecondaryIndex
+
+        engine = self.open(table, engine_type)
+        key = (table.lower(), engine_type)
+        with self.lock:
+            if not isinstance(engine, IndexedTable):
+                engine = IndexedTable(engine, {})
+                self.engines[key] = engine
+        if column in engine.indexes:
+            raise ValueError(f"Index on {column} already exists")
+        engine.build_index(column, SecondaryIndex(secondary_index_path(table, engine_type, column), value_type))
+        return engine
+
+    def close(self, table: str, engine_type: str | None = None):
+        with self.lock:
+            engine = self.engines.pop((table.lower(), engine_type or "bplustree"), None)
+        if engine is not None and hasattr(engine, "close"):
+            engine.close()
+
+    def close_all(self):
+        with self.lock:
+            engines, self.engines = list(self.engines.values()), {}
+        for engine in engines:
+            if hasattr(engine, "close"):
+                engine.close()
+
+    def stats(self) -> dict:
+        with self.lock:
+            engines = list(self.engines.items())
+        return {f"{table}:{engine_type}": engine.stats()
+                for (table, engine_type), engine in engines if hasattr(engine, "stats")}
+
+    def _table_page_sizes(self) -> dict:
+        if not TABLE_PAGE_SIZES.exists():
+            return {}
+        return json.loads(TABLE_PAGE_SIZES.read_text(encoding="utf-8"))
+
+
+ENGINES = EngineRegistry()
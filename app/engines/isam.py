@@ -0,0 +1,376 @@
+import os
+import mmap
+import struct
+from app.data.records.song import Song
+from app.engines.keycodec import encode_key
+from app.engines.bufferpool import BUFFER_POOL, BufferPool
+from app.engines.pagesize import auto_page_size, check_page_size, records_per_page
+
+# Registros por página de los índices ISM1, que no guardan la geometría (páginas sin alinear)
+LEGACY_RECORDS = 20
+KEY_SIZE = 30  # Bytes de la clave (track_id) al inicio de cada registro empaquetado
+FILL_FACTOR = 0.8  # Ocupación de las páginas primarias en la construcción: el resto absorbe inserciones
+# Claves por bloque del nivel 1: un bloque ocupa una página del SO, así cada búsqueda toca una sola
+L1_BLOCK = mmap.PAGESIZE // KEY_SIZE
+
+
+class DataPage:
+    # count, siguiente página de la cadena de overflow (-1 si no hay)
+    HEADER_FMT = "ii"
+    HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    LEGACY_SIZE = HEADER_SIZE + LEGACY_RECORDS * Song.RECORD_SIZE
+
+    def __init__(self, count=0, next_page=-1):
+        self.count = count
+        self.next_page = next_page
+        self.records = []
+
+
+class ISAMFile:
+    """
+    ISAM estático de dos niveles.
+
+    El archivo de datos tiene primero las páginas primarias, ordenadas por clave,
+    y detrás las páginas de overflow encadenadas desde cada primaria. El índice
+    es disperso y no cambia después de construirse:
+
+      - Nivel 1: la clave mínima de cada página primaria, en bloques de L1_BLOCK
+        claves; cada bloque se rellena hasta ocupar exactamente una página del SO.
+      - Nivel 2: la primera clave de cada bloque del nivel 1.
+
+    Ambos niveles se mapean en memoria y se recorren con búsqueda binaria sobre
+    bytes crudos: ubicar una clave no hace syscalls ni decodifica registros.
+    """
+
+    # Formato del Header: magic, páginas primarias, claves del nivel 2, claves por bloque,
+    # cabeza de la lista de páginas libres, registros vivos, tamaño de página, registros por página
+    MAGIC = b"ISM3"
+    HEADER_FMT = "4siiiiiii"
+    HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    # Índices ISM2: el mismo header, con los bloques del nivel 1 contiguos (sin relleno)
+    V2_MAGIC = b"ISM2"
+    # Índices ISM1: el mismo header sin la geometría
+    V1_MAGIC = b"ISM1"
+    V1_HEADER_FMT = "4siiiii"
+    V1_HEADER_SIZE = struct.calcsize(V1_HEADER_FMT)
+
+    def __init__(self, datafile: str, indexfile: str, pool: BufferPool = BUFFER_POOL,
+                 page_size: int | None = None):
+        """page_size solo se usa al crear la tabla; una existente conserva la geometría de su header."""
+        self.datafile = datafile
+        self.indexfile = indexfile
+        self.pool = pool
+        self.index_mmap = None
+
+        # Sin alguno de los dos archivos el otro no sirve: se parte de una tabla vacía
+        if not (os.path.exists(self.datafile) and os.path.exists(self.indexfile)):
+            header, record = DataPage.HEADER_SIZE, Song.RECORD_SIZE
+            self.page_size = check_page_size(page_size, header, record) if page_size else auto_page_size(header, record)
+            self.m = records_per_page(self.page_size, header, record)
+            self._build([])
+        else:
+            self._map_index()
+
+    # ========== API Pública ==========
+
+    def search(self, key: str):
+        """Busca una clave: dos búsquedas binarias en el índice y la cadena de una página primaria."""
+        kb = self._key_bytes(key)
+        for _, page in self._chain(self._find_page(kb)):
+            for r in page.records[:page.count]:
+                if r.key_bytes() == kb:
+                    return r
+        return None
+
+    def rangeSearch(self, begin: str, end: str):
+        """Busca todas las claves en el rango [begin, end]"""
+        results = []
+        begin_kb, end_kb = self._key_bytes(begin), self._key_bytes(end)
+        for page_idx in range(self._find_page(begin_kb), self.primary_pages):
+            if page_idx > 0 and self._l1_key(page_idx) > end_kb:
+                break
+            results.extend(r for r in self._bucket(page_idx) if begin_kb <= r.key_bytes() <= end_kb)
+        return results
+
+    def scan(self, after: str = None):
+        """Recorre la tabla en orden de clave; con after, desde la primera clave > after."""
+        after = self._key_bytes(after) if after is not None else None
+        first = self._find_page(after) if after is not None else 0
+        for page_idx in range(first, self.primary_pages):
+            for r in self._bucket(page_idx):
+                if after is None or r.key_bytes() > after:
+                    yield r
+
+    def add(self, song: Song):
+        """
+        Inserta en la página primaria que le toca según el índice; si está llena,
+        en su cadena de overflow. Una clave repetida reemplaza al registro anterior.
+        """
+        if not song.track_id:
+            return
+
+        kb = song.key_bytes()
+        chain = list(self._chain(self._find_page(kb)))
+        for page_idx, page in chain:
+            for i, r in enumerate(page.records[:page.count]):
+                if r.key_bytes() == kb:
+                    page.records[i] = song
+                    self._write_page(page, page_idx)
+                    return
+
+        for page_idx, page in chain:
+            if page.count < self.m:
+                self._insert_in_page(page, song)
+                self._write_page(page, page_idx)
+                self._set_header(count=self.count + 1)
+                return
+
+        # Toda la cadena está llena: se engancha una página de overflow al final
+        last_idx, last = chain[-1]
+        new_idx = self._alloc_page()
+        overflow = DataPage(count=1)
+        overflow.records = [song]
+        self._write_page(overflow, new_idx)
+        last.next_page = new_idx
+        self._write_page(last, last_idx)
+        self._set_header(count=self.count + 1)
+
+    def add_many(self, songs):
+        for song in songs:
+            if song:
+                self.add(song)
+
+    def remove(self, key: str):
+        """Borrado físico en la página; una página de overflow que queda vacía pasa a la lista libre."""
+        kb = self._key_bytes(key)
+        prev = None
+        for page_idx, page in self._chain(self._find_page(kb)):
+            for i, r in enumerate(page.records[:page.count]):
+                if r.key_bytes() != kb:
+                    continue
+                del page.records[i]
+                page.count -= 1
+                if page.count == 0 and prev is not None:
+                    prev_idx, prev_page = prev
+                    prev_page.next_page = page.next_page
+                    self._write_page(prev_page, prev_idx)
+                    page.next_page = self.free_head
+                    self._write_page(page, page_idx)
+                    self._set_header(free_head=page_idx, count=self.count - 1)
+                else:
+                    self._write_page(page, page_idx)
+                    self._set_header(count=self.count - 1)
+                return True
+            prev = (page_idx, page)
+        return False
+
+    def is_empty(self):
+        return self.count == 0
+
+    def stats(self) -> dict:
+        total_pages = self.pool.file_size(self.datafile) // self.page_size
+        return {
+            "records": self.count,
+            "primary_pages": self.primary_pages,
+            "overflow_pages": total_pages - self.primary_pages,
+            "l2_keys": self.l2_count,
+            "index_bytes": len(self.index_mmap),
+            "page_size": self.page_size,
+            "records_per_page": self.m,
+        }
+
+    # ========== Carga Masiva ==========
+
+    def bulk_load(self, songs, fill_factor: float = FILL_FACTOR):
+        """
+        Construye las páginas primarias y los dos niveles del índice a partir de un
+        iterable de canciones. Reemplaza el contenido actual; las claves repetidas
+        conservan la última aparición.
+        """
+        ordered = [s for _, s in sorted({s.key_bytes(): s for s in songs if s and s.track_id}.items())]
+        self._build(ordered, max(1, min(self.m, int(self.m * fill_factor))))
+
+    def reorganize(self):
+        """Vuelve a construir el archivo vaciando las cadenas de overflow en páginas primarias."""
+        self.bulk_load(list(self.scan()))
+
+    def _build(self, ordered: list, page_fill: int | None = None):
+        """
+        Escribe las páginas primarias de forma secuencial y luego el índice (siempre con el
+        header actual) en archivos aparte, que reemplazan a los de la tabla recién cuando
+        los dos están completos: si la carga falla, la tabla anterior queda intacta.
+        """
+        page_fill = page_fill or self.m
+        new_datafile, new_indexfile = self.datafile + ".tmp", self.indexfile + ".tmp"
+        try:
+            l1 = []
+            with open(new_datafile, "wb") as f:
+                for start in range(0, max(len(ordered), 1), page_fill):
+                    page = DataPage()
+                    page.records = ordered[start:start + page_fill]
+                    page.count = len(page.records)
+                    f.write(self._encode_page(page))
+                    # La primera página cubre también las claves menores que todas
+                    l1.append(page.records[0].key_bytes() if l1 else bytes(KEY_SIZE))
+
+            l2 = l1[::L1_BLOCK]
+            with open(new_indexfile, "wb") as f:
+                f.write(struct.pack(self.HEADER_FMT, self.MAGIC, len(l1), len(l2), L1_BLOCK, -1, len(ordered),
+                                    self.page_size, self.m))
+                f.write(b"".join(l2))
+                f.seek(self._l1_offset(len(l2), self.HEADER_SIZE))
+                for start in range(0, len(l1), L1_BLOCK):
+                    f.write(b"".join(l1[start:start + L1_BLOCK]).ljust(mmap.PAGESIZE, b"\x00"))
+        except BaseException:
+            for path in (new_datafile, new_indexfile):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+        self._close_index()
+        self.pool.discard(self.datafile)
+        self.pool.discard(self.indexfile)
+        os.replace(new_datafile, self.datafile)
+        os.replace(new_indexfile, self.indexfile)
+        self._map_index()
+
+    # ========== Métodos Internos ==========
+
+    def _find_page(self, kb: bytes):
+        """Página primaria de la clave: última del nivel 1 con clave <= kb, acotada por el nivel 2."""
+        block = self._last_le(self.header_size, 0, self.l2_count, kb)
+        first = block * self.block
+        base = self.l1_offset + block * self.l1_stride
+        return first + self._last_le(base, 0, min(self.block, self.primary_pages - first), kb)
+
+    def _last_le(self, base: int, low: int, high: int, kb: bytes):
+        """Búsqueda binaria en un arreglo de claves del mmap; devuelve max(0, última posición con clave <= kb)."""
+        first = low
+        mm = self.index_mmap
+        while low < high:
+            mid = (low + high) // 2
+            offset = base + mid * KEY_SIZE
+            if mm[offset:offset + KEY_SIZE] <= kb:
+                low = mid + 1
+            else:
+                high = mid
+        return max(first, low - 1)
+
+    def _l1_key(self, page_idx: int):
+        block, i = divmod(page_idx, self.block)
+        offset = self.l1_offset + block * self.l1_stride + i * KEY_SIZE
+        return self.index_mmap[offset:offset + KEY_SIZE]
+
+    def _l1_offset(self, l2_count: int, header_size: int):
+        # El nivel 1 empieza en un límite de página del SO para que cada bloque ocupe una sola
+        end = header_size + l2_count * KEY_SIZE
+        return -(-end // mmap.PAGESIZE) * mmap.PAGESIZE
+
+    def _chain(self, page_idx: int):
+        """Recorre (posición, página) desde una primaria por su cadena de overflow."""
+        while page_idx >= 0:
+            page = self._read_page(page_idx)
+            yield page_idx, page
+            page_idx = page.next_page
+
+    def _bucket(self, page_idx: int):
+        """Registros de una primaria y su overflow, en orden de clave (las cadenas no están ordenadas entre sí)."""
+        records = [r for _, page in self._chain(page_idx) for r in page.records[:page.count]]
+        records.sort(key=lambda r: r.key_bytes())
+        return records
+
+    def _insert_in_page(self, page: DataPage, song: Song):
+        """Inserta ordenado en página de datos"""
+        kb = song.key_bytes()
+        pos = 0
+        for i in range(page.count):
+            if page.records[i].key_bytes() < kb:
+                pos = i + 1
+        page.records.insert(pos, song)
+        page.count += 1
+
+    def _key_bytes(self, key: str):
+        """Clave con el mismo relleno que Song.pack, comparable byte a byte con el índice."""
+        return encode_key(key, Song.KEY_TYPE)
+
+    # ========== I/O ==========
+
+    def flush(self):
+        """Checkpoint: baja a disco las páginas sucias y el header del índice."""
+        self.pool.flush(self.datafile)
+        if self.index_mmap is not None:
+            self.index_mmap.flush()
+
+    def close(self):
+        self.flush()
+        self._close_index()
+
+    def _map_index(self):
+        with open(self.indexfile, "r+b") as f:
+            self.index_mmap = mmap.mmap(f.fileno(), 0)
+        magic = self.index_mmap[:4]
+        if magic in (self.MAGIC, self.V2_MAGIC):
+            (_, self.primary_pages, self.l2_count, self.block, self.free_head, self.count,
+             self.page_size, self.m) = struct.unpack(self.HEADER_FMT, self.index_mmap[:self.HEADER_SIZE])
+            self.header_size = self.HEADER_SIZE
+        elif magic == self.V1_MAGIC:
+            _, self.primary_pages, self.l2_count, self.block, self.free_head, self.count = \
+                struct.unpack(self.V1_HEADER_FMT, self.index_mmap[:self.V1_HEADER_SIZE])
+            self.page_size, self.m = DataPage.LEGACY_SIZE, LEGACY_RECORDS
+            self.header_size = self.V1_HEADER_SIZE
+        else:
+            raise ValueError(f"{self.indexfile} no es un índice ISAM")
+        self.magic = magic
+        self.l1_offset = self._l1_offset(self.l2_count, self.header_size)
+        # Distancia entre bloques del nivel 1: una página del SO, o los bloques pegados en ISM1/ISM2
+        self.l1_stride = mmap.PAGESIZE if magic == self.MAGIC else self.block * KEY_SIZE
+
+    def _close_index(self):
+        if self.index_mmap is not None:
+            self.index_mmap.close()
+            self.index_mmap = None
+
+    def _set_header(self, free_head: int = None, count: int = None):
+        """Actualiza los campos mutables del header (el resto del índice es de solo lectura)."""
+        if free_head is not None:
+            self.free_head = free_head
+        if count is not None:
+            self.count = count
+        fields = (self.primary_pages, self.l2_count, self.block, self.free_head, self.count)
+        if self.header_size == self.V1_HEADER_SIZE:
+            self.index_mmap[:self.header_size] = struct.pack(self.V1_HEADER_FMT, self.V1_MAGIC, *fields)
+        else:
+            self.index_mmap[:self.header_size] = struct.pack(
+                self.HEADER_FMT, self.magic, *fields, self.page_size, self.m
+            )
+
+    def _read_page(self, pos: int):
+        return self.pool.get(self.datafile, pos, self.page_size, self._decode_page)
+
+    def _decode_page(self, data: bytes):
+        if len(data) < DataPage.HEADER_SIZE:
+            return DataPage()
+
+        count, next_page = struct.unpack(DataPage.HEADER_FMT, data[:DataPage.HEADER_SIZE])
+        raw = memoryview(data)[DataPage.HEADER_SIZE:]
+
+        page = DataPage(count, next_page)
+        page.records = [Song.lazy(raw[i * Song.RECORD_SIZE:(i + 1) * Song.RECORD_SIZE]) for i in range(min(count, self.m))]
+        page.count = len(page.records)
+        return page
+
+    def _write_page(self, page: DataPage, pos: int):
+        self.pool.put(self.datafile, pos, self.page_size, page, self._encode_page)
+
+    def _encode_page(self, page: DataPage):
+        header = struct.pack(DataPage.HEADER_FMT, page.count, page.next_page)
+        body = b"".join(r.pack() for r in page.records[:page.count])
+        return header + body.ljust(self.page_size - DataPage.HEADER_SIZE, b'\x00')
+
+    def _alloc_page(self):
+        """Reutiliza una página de overflow liberada o agrega una al final del archivo."""
+        if self.free_head >= 0:
+            pos = self.free_head
+            self._set_header(free_head=self._read_page(pos).next_page)
+            return pos
+        return self.pool.file_size(self.datafile) // self.page_size
@@ -0,0 +1,95 @@
+import re
+import struct
+
+# Codificaciones de claves que conservan el orden al comparar bytes (memcmp / bisect):
+# a < b  <=>  encode(a) < encode(b). Así los motores comparan claves sin decodificarlas.
+
+INT_SIZE = 8
+FLOAT_SIZE = 8
+DATE_SIZE = 4
+
+_SIGN = 1 << 63
+_MASK = (1 << 64) - 1
+
+
+def encode_int(value) -> bytes:
+    """Entero de 64 bits big-endian con el bit de signo invertido: los negativos quedan antes."""
+    return ((int(value) + _SIGN) & _MASK).to_bytes(INT_SIZE, "big")
+
+
+def decode_int(data: bytes) -> int:
+    return int.from_bytes(data[:INT_SIZE], "big") - _SIGN
+
+
+def encode_float(value) -> bytes:
+    """IEEE 754 doble big-endian: los positivos con el signo encendido, los negativos con todos los bits invertidos."""
+    bits = struct.unpack(">Q", struct.pack(">d", float(value)))[0]
+    bits = bits ^ _MASK if bits & _SIGN else bits | _SIGN
+    return bits.to_bytes(FLOAT_SIZE, "big")
+
+
+def decode_float(data: bytes) -> float:
+    bits = int.from_bytes(data[:FLOAT_SIZE], "big")
+    bits = bits ^ _SIGN if bits & _SIGN else bits ^ _MASK
+    return struct.unpack(">d", bits.to_bytes(FLOAT_SIZE, "big"))[0]
+
+
+def encode_date(value) -> bytes:
+    """
+    'YYYY', 'YYYY-MM' o 'YYYY-MM-DD' (como vienen en el dataset) como año, mes y día
+    big-endian; las partes que faltan valen 0, así '2019' queda antes de '2019-01-01'.
+    """
+    parts = [int(p) for p in re.findall(r"\d+", str(value))[:3]]
+    year, month, day = (parts + [0, 0, 0])[:3]
+    return struct.pack(">HBB", year, month, day)
+
+
+def decode_date(data: bytes) -> str:
+    year, month, day = struct.unpack(">HBB", data[:DATE_SIZE])
+    return "-".join([f"{year:04d}"] + [f"{p:02d}" for p in (month, day) if p])
+
+
+def encode_varchar(value, size: int) -> bytes:
+    """UTF-8 truncado y rellenado con NUL: el mismo formato que usan los registros empaquetados."""
+    return (value or "").encode("utf-8")[:size].ljust(size, b"\x00")
+
+
+def decode_varchar(data: bytes) -> str:
+    return bytes(data).decode("utf-8", errors="ignore").rstrip("\x00")
+
+
+def key_size(ctype: str) -> int:
+    """Bytes de la clave codificada para un tipo normalizado ('int', 'float', 'date', 'varchar(n)')."""
+    ct = ctype.lower()
+    if ct == "int":
+        return INT_SIZE
+    if ct == "float":
+        return FLOAT_SIZE
+    if ct == "date":
+        return DATE_SIZE
+    m = re.fullmatch(r"varchar\((\d+)\)", ct)
+    if m:
+        return int(m.group(1))
+    raise ValueError(f"Tipo de clave no soportado: {ctype}")
+
+
+def encode_key(value, ctype: str) -> bytes:
+    ct = ctype.lower()
+    if ct == "int":
+        return encode_int(value)
+    if ct == "float":
+        return encode_float(value)
+    if ct == "date":
+        return encode_date(value)
+    return encode_varchar(value, key_size(ct))
+
+
+def decode_key(data: bytes, ctype: str):
+    ct = ctype.lower()
+    if ct == "int":
+        return decode_int(data)
+    if ct == "float":
+        return decode_float(data)
+    if ct == "date":
+        return decode_date(data)
+    return decode_varchar(data)
@@ -0,0 +1,36 @@
+import mmap
+
+# Geometría de página de los motores con páginas de registros Song. Se elige al crear los
+# archivos (CREATE / IMPORT) y queda guardada en el header de cada archivo.
+
+OS_PAGE_SIZE = mmap.PAGESIZE
+# Tamaños candidatos: 1, 2 y 4 páginas del sistema operativo (4/8/16 KiB con páginas de 4 KiB)
+PAGE_SIZES = tuple(OS_PAGE_SIZE * k for k in (1, 2, 4))
+# Registros por página que se buscan por defecto (el factor de bloque histórico)
+TARGET_RECORDS = 20
+
+
+def records_per_page(page_size: int, header_size: int, record_size: int) -> int:
+    return (page_size - header_size) // record_size
+
+
+def auto_page_size(header_size: int, record_size: int, target: int = TARGET_RECORDS) -> int:
+    """La página más chica de PAGE_SIZES donde caben `target` registros (si ninguna alcanza, la más grande)."""
+    for size in PAGE_SIZES:
+        if records_per_page(size, header_size, record_size) >= target:
+            return size
+    return PAGE_SIZES[-1]
+
+
+def check_page_size(page_size: int, header_size: int, record_size: int) -> int:
+    """Valida un tamaño pedido: múltiplo de la página del SO y con lugar para al menos dos registros."""
+    if page_size <= 0 or page_size % OS_PAGE_SIZE:
+        raise ValueError(f"PAGE_SIZE debe ser múltiplo de {OS_PAGE_SIZE} bytes (recibido {page_size})")
+    if records_per_page(page_size, header_size, record_size) < 2:
+        raise ValueError(f"PAGE_SIZE {page_size} no alcanza para dos registros de {record_size} bytes")
+    return page_size
+
+
+def os_pages_touched(offset: int, size: int) -> int:
+    """Páginas del SO que cubre una lectura de `size` bytes desde `offset`."""
+    return (offset + size - 1) // OS_PAGE_SIZE - offset // OS_PAGE_SIZE + 1
@@ -1,41 +1,73 @@
 import csv
 from rtree import index
+import itertools
 import math
+import time
+import numpy as np
+from app.engines.rtreefile import EARTH_RADIUS_M, haversine_many
 
 CSV_FILE = 'app/data/datasets/AB_NYC_2019.csv'
+INITIAL_CAPACITY = 1024  # Filas reservadas en las columnas; se duplica al llenarse
+TEXT_FIELDS = ('id', 'name', 'neighbourhood')  # Campos guardados, en este orden, en el blob
+
+
+def bounding_box(lat, lon, radius):
+    """
+    Caja lat/lon que contiene el círculo de `radius` metros: el alto es el radio angular
+    y el ancho se ensancha con 1/cos(lat). Si el círculo toca un polo, cubre todas las longitudes.
+    """
+    angular = radius / EARTH_RADIUS_M
+    dlat = math.degrees(angular)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90 or angular >= math.pi / 2:
+        return (max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0)
+    dlon = math.degrees(math.asin(min(1.0, math.sin(angular) / math.cos(math.radians(lat)))))
+    return (min_lat, lon - dlon, max_lat, lon + dlon)
 
 class AirbnbRTreeManager:
     """
     Gestiona un índice R-Tree para el dataset de Airbnb.
     """
     def __init__(self):
-        # Configura un índice para 2D (latitud, longitud)
-        p = index.Property()
-        p.dimension = 2
-        self.idx = index.Index(properties=p)
+        self.idx = index.Index(properties=self._properties())
         
-        self.data_map = {}
         self.airbnb_id_to_rtree_id = {}
         self.next_rtree_id = 0
+        # Registros en columnas indexadas por rtree_id: coordenadas contiguas para refinar
+        # candidatos en bloque y textos (id, name, neighbourhood) seguidos en un blob común,
+        # de modo que solo se crean dicts/str para las filas que se devuelven
+        self.lats = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self.lons = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self.prices = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        self.text_offsets = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self.text_lengths = np.empty((INITIAL_CAPACITY, 3), dtype=np.int32)
+        self.blob = bytearray()
 
     def load_from_csv(self, file_path):
+        """
+        Carga el CSV construyendo el índice de una sola vez: las filas se guardan en las
+        columnas mientras se leen y el R-tree se arma con la carga masiva (bulk stream) de
+        la librería, que empaqueta las hojas en vez de insertar entrada por entrada.
+        """
         print(f"Cargando datos desde '{file_path}'...")
+        start = time.perf_counter()
+        loaded = 0
         try:
             with open(file_path, mode='r', encoding='utf-8') as file:
                 reader = csv.DictReader(file)
-                for row in reader:
-                    try:
-                        record = {
-                            'id': row['id'],
-                            'name': row['name'],
-                            'neighbourhood': row['neighbourhood'],
-                            'price': int(row['price']),
-                            'coordinates': (float(row['latitude']), float(row['longitude']))
-                        }
-                        self.add(record) 
-                    except (ValueError, KeyError):
-                        pass
-            print(f"¡Carga completa! Se indexaron {self.next_rtree_id} registros.")
+                rows = self._parse_rows(reader)
+                # Los registros que ya estaban en el índice se reinsertan en la misma pasada
+                existing = ((rtree_id, self._box(rtree_id), None) for rtree_id in self.airbnb_id_to_rtree_id.values())
+                new_ids = []
+                entries = itertools.chain(list(existing), self._stream_rows(rows, new_ids))
+                # libspatialindex arma el árbol con STR y rechaza un stream vacío
+                first = next(entries, None)
+                if first is not None:
+                    self.idx = index.Index(itertools.chain([first], entries), properties=self._properties())
+                loaded = len(new_ids)
+            elapsed = time.perf_counter() - start
+            rate = loaded / elapsed if elapsed > 0 else float('inf')
+            print(f"¡Carga completa! Se indexaron {loaded} registros en {elapsed:.2f} s ({rate:,.0f} filas/s).")
         except FileNotFoundError:
             print(f"Error: El archivo '{file_path}' no fue encontrado.")
             exit()
@@ -51,15 +83,8 @@ class AirbnbRTreeManager:
             print(f"Advertencia: El Airbnb con ID '{airbnb_id}' ya existe. No se agregó.")
             return False
 
-        rtree_id = self.next_rtree_id
-        coordinates = record['coordinates']
-        bounding_box = (*coordinates, *coordinates)
-
-        self.idx.insert(rtree_id, bounding_box)
-        self.data_map[rtree_id] = record
-        self.airbnb_id_to_rtree_id[airbnb_id] = rtree_id
-        
-        self.next_rtree_id += 1
+        rtree_id = self._append(record)
+        self.idx.insert(rtree_id, self._box(rtree_id))
         return True
 
     def search(self, airbnb_id):
@@ -68,7 +93,7 @@ class AirbnbRTreeManager:
         """
         rtree_id = self.airbnb_id_to_rtree_id.get(airbnb_id)
         if rtree_id is not None:
-            return self.data_map.get(rtree_id)
+            return self._record(rtree_id)
         return None
 
     def remove(self, airbnb_id):
@@ -81,14 +106,9 @@ class AirbnbRTreeManager:
             return False
 
         # Para eliminar del R-tree, necesitamos el ID interno y sus coordenadas
-        record = self.data_map[rtree_id]
-        coordinates = record['coordinates']
-        bounding_box = (*coordinates, *coordinates)
+        self.idx.delete(rtree_id, self._box(rtree_id))
         
-        self.idx.delete(rtree_id, bounding_box)
-        
-        # Limpiamos los diccionarios
-        del self.data_map[rtree_id]
+        # La fila queda huérfana en las columnas: ya no es alcanzable por ID ni por el índice
         del self.airbnb_id_to_rtree_id[airbnb_id]
         
         print(f"Éxito: Se eliminó el Airbnb con ID '{airbnb_id}'.")
@@ -98,48 +118,101 @@ class AirbnbRTreeManager:
 
     def range_search(self, point, radius):
         """
-        Busca en un radio en metros usando la distancia euclideana como aproximación.
+        Busca en un radio en metros: filtra con la caja lat/lon que contiene el círculo
+        y refina todos los candidatos de una vez con la distancia haversine.
         """
         lat, lon = point
+        search_box = bounding_box(lat, lon, radius)
 
-        # --- Convertir el radio de metros a grados ---
-        m_per_deg_lat = 111132  # Metros por grado de latitud 
-        m_per_deg_lon = 111320 * math.cos(math.radians(lat)) # Metros por grado de longitud 
-        
-        # Usamos el promedio para tener un radio circular aproximado en grados
-        avg_m_per_deg = (m_per_deg_lat + m_per_deg_lon) / 2
-        radius_in_degrees = radius / avg_m_per_deg
-        
-        # --- Distancia euclideana ---
-        
-        # Creamos la caja de búsqueda con el radio en grados.
-        search_box = (
-            lat - radius_in_degrees, 
-            lon - radius_in_degrees, 
-            lat + radius_in_degrees, 
-            lon + radius_in_degrees
-        )
-        
-        candidate_ids = list(self.idx.intersection(search_box))
-        
-        results = []
-        for rtree_id in candidate_ids:
-            record = self.data_map[rtree_id]
-            record_coords = record['coordinates']
-            
-            # Calculamos la distancia euclidiana
-            distance_in_degrees = math.sqrt((record_coords[0] - point[0])**2 + (record_coords[1] - point[1])**2)
-            
-            # Comparamos la distancia con nuestro radio.
-            if distance_in_degrees <= radius_in_degrees:
-                results.append(record)
-        
-        return results
+        candidate_ids = np.fromiter(self.idx.intersection(search_box), dtype=np.int64)
+        if not len(candidate_ids):
+            return []
+
+        distances = haversine_many(lat, lon, self.lats[candidate_ids], self.lons[candidate_ids])
+        return [self._record(rtree_id) for rtree_id in candidate_ids[distances <= radius].tolist()]
 
     def knn_search(self, point, k):
         # Lógica de búsqueda k-NN 
         nearest_ids = list(self.idx.nearest(point, k))
-        return [self.data_map[rtree_id] for rtree_id in nearest_ids]
+        return [self._record(rtree_id) for rtree_id in nearest_ids]
+
+    def memory_bytes(self):
+        """Bytes ocupados por las columnas y el blob de textos (sin contar el índice)."""
+        columns = (self.lats, self.lons, self.prices, self.text_offsets, self.text_lengths)
+        return sum(column.nbytes for column in columns) + len(self.blob)
+
+    # --- CARGA MASIVA ---
+
+    @staticmethod
+    def _properties():
+        # Configura un índice para 2D (latitud, longitud)
+        p = index.Property()
+        p.dimension = 2
+        return p
+
+    @staticmethod
+    def _parse_rows(reader):
+        for row in reader:
+            try:
+                yield {
+                    'id': row['id'],
+                    'name': row['name'],
+                    'neighbourhood': row['neighbourhood'],
+                    'price': int(row['price']),
+                    'coordinates': (float(row['latitude']), float(row['longitude']))
+                }
+            except (ValueError, KeyError):
+                pass
+
+    def _stream_rows(self, records, new_ids):
+        """Guarda cada registro en las columnas y entrega la entrada (id, caja, None) para el bulk stream."""
+        for record in records:
+            if record['id'] in self.airbnb_id_to_rtree_id:
+                continue
+            rtree_id = self._append(record)
+            new_ids.append(rtree_id)
+            yield (rtree_id, self._box(rtree_id), None)
+
+    # --- ALMACENAMIENTO EN COLUMNAS ---
+
+    def _append(self, record):
+        rtree_id = self.next_rtree_id
+        self._store(rtree_id, record)
+        self.airbnb_id_to_rtree_id[record['id']] = rtree_id
+        self.next_rtree_id += 1
+        return rtree_id
+
+    def _box(self, rtree_id):
+        lat, lon = float(self.lats[rtree_id]), float(self.lons[rtree_id])
+        return (lat, lon, lat, lon)
+
+    def _store(self, rtree_id, record):
+        if rtree_id >= len(self.lats):
+            self._grow(max(rtree_id + 1, 2 * len(self.lats)))
+        texts = [str(record[field] or '').encode('utf-8') for field in TEXT_FIELDS]
+        self.lats[rtree_id], self.lons[rtree_id] = record['coordinates']
+        self.prices[rtree_id] = record['price']
+        self.text_offsets[rtree_id] = len(self.blob)
+        self.text_lengths[rtree_id] = [len(text) for text in texts]
+        self.blob += b''.join(texts)
+
+    def _grow(self, size):
+        self.lats = np.resize(self.lats, size)
+        self.lons = np.resize(self.lons, size)
+        self.prices = np.resize(self.prices, size)
+        self.text_offsets = np.resize(self.text_offsets, size)
+        self.text_lengths = np.resize(self.text_lengths, (size, 3))
+
+    def _record(self, rtree_id):
+        """Materializa el dict de una fila a partir de las columnas."""
+        record = {}
+        start = int(self.text_offsets[rtree_id])
+        for field, length in zip(TEXT_FIELDS, self.text_lengths[rtree_id].tolist()):
+            record[field] = self.blob[start:start + length].decode('utf-8')
+            start += length
+        record['price'] = int(self.prices[rtree_id])
+        record['coordinates'] = (float(self.lats[rtree_id]), float(self.lons[rtree_id]))
+        return record
 
 
 if __name__ == "__main__":
@@ -191,7 +264,7 @@ if __name__ == "__main__":
     print("\n[PRUEBA 4: Búsqueda por Radio en Williamsburg]")
     williamsburg_center = (40.715, -73.955)
     radius = 550
-    print(f"Buscando listings en un radio de {radius}° alrededor del centro de Williamsburg...")
+    print(f"Buscando listings en un radio de {radius} m alrededor del centro de Williamsburg...")
     listings_in_williamsburg = airbnb_db.range_search(williamsburg_center, radius)
     print(f"Resultados encontrados: {len(listings_in_williamsburg)}")
     print("Mostrando los primeros 5:")
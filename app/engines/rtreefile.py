@@ -0,0 +1,500 @@
+import os
+import math
+import heapq
+import struct
+import numpy as np
+from app.data.records.airbnb import Airbnb
+from app.engines.bufferpool import BUFFER_POOL, BufferPool
+
+R = 100  # Entradas por nodo
+R_MIN = 40  # Mínimo de entradas en cada mitad de un split
+P = 32  # Registros por página de datos
+FILL_FACTOR = 0.9  # Ocupación de los nodos en la carga masiva (STR)
+EARTH_RADIUS_M = 6_371_008.8  # Radio medio de la Tierra
+
+
+class Node:
+    # Little-endian sin padding: is_leaf, count y luego las entradas
+    HEADER_FMT = "<ii"
+    HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    # min_x, min_y, max_x, max_y, hijo (nodo interno) o rid (hoja)
+    ENTRY_FMT = "<ddddi"
+    ENTRY_SIZE = struct.calcsize(ENTRY_FMT)
+    SIZE = HEADER_SIZE + R * ENTRY_SIZE
+
+    def __init__(self, is_leaf=True):
+        self.is_leaf = is_leaf
+        self.entries = []
+
+
+class Meta:
+    # Nodo 0 del índice: magic, raíz, altura, registros vivos, siguiente rid
+    FMT = "<4siiii"
+    MAGIC = b"RTR1"
+
+    def __init__(self, root=1, height=1, count=0, next_rid=0):
+        self.root = root
+        self.height = height
+        self.count = count
+        self.next_rid = next_rid
+
+
+class RTreeFile:
+    """
+    R-tree en disco sobre (latitud, longitud). Los registros Airbnb viven en páginas
+    de ancho fijo del archivo de datos (rid = posición del slot) y las hojas del
+    índice guardan el punto y el rid. Nodos y páginas pasan por el buffer pool.
+    """
+
+    SLOT_SIZE = 1 + Airbnb.RECORD_SIZE  # flag de vivo + registro
+    PAGE_SIZE = P * SLOT_SIZE
+
+    def __init__(self, datafile: str, indexfile: str, pool: BufferPool = BUFFER_POOL):
+        self.datafile = datafile
+        self.indexfile = indexfile
+        self.pool = pool
+        self._init_files()
+        self.meta = self.pool.get(self.indexfile, 0, Node.SIZE, self._decode_meta)
+        # id -> rid; se arma desde el archivo de datos en el primer acceso por clave
+        self.id_map = None
+
+    def _init_files(self):
+        # Sin índice los datos no sirven: se crean ambos archivos de cero
+        if not os.path.exists(self.indexfile):
+            self._reset_files()
+
+    # ========== API Pública ==========
+
+    def search(self, key: str):
+        rid = self._ids().get(str(key))
+        return self._read_record(rid) if rid is not None else None
+
+    def box_search(self, min_x: float, min_y: float, max_x: float, max_y: float):
+        """Registros cuyo punto cae dentro de la caja (bordes incluidos)."""
+        stack = [self.meta.root]
+        while stack:
+            node = self._read_node(stack.pop())
+            inside = [e[4] for e in node.entries
+                      if e[0] <= max_x and e[2] >= min_x and e[1] <= max_y and e[3] >= min_y]
+            if node.is_leaf:
+                # En orden de rid para leer cada página de datos una sola vez
+                for rid in sorted(inside):
+                    record = self._read_record(rid)
+                    if record:
+                        yield record
+            else:
+                stack.extend(inside)
+
+    def nearest(self, point, max_distance: float = None, after: tuple = None):
+        """
+        Best-first sobre el árbol: genera (distancia en metros, rid, registro) en orden
+        creciente de (distancia, rid), sin materializar el resultado. Cada nodo entra a
+        la cola con la distancia mínima de su MBR al punto (cota inferior) y cada hoja
+        con la distancia exacta (haversine). Con max_distance se detiene en el radio;
+        con after (distancia, rid) continúa después de esa posición.
+        """
+        lat, lon = point
+        # A igual distancia los nodos (0) se expanden antes de devolver registros (1)
+        heap = [(0.0, 0, self.meta.root)]
+        while heap:
+            dist, is_record, ptr = heapq.heappop(heap)
+            if max_distance is not None and dist > max_distance:
+                return
+            if is_record:
+                if after is not None and (dist, ptr) <= after:
+                    continue
+                record = self._read_record(ptr)
+                if record:
+                    yield dist, ptr, record
+                continue
+
+            node = self._read_node(ptr)
+            for e in node.entries:
+                if node.is_leaf:
+                    d = haversine(lat, lon, e[0], e[1])
+                else:
+                    d = _box_distance(lat, lon, e)
+                if max_distance is None or d <= max_distance:
+                    heapq.heappush(heap, (d, int(node.is_leaf), e[4]))
+
+    def scan(self, after: str = None):
+        """Recorre los registros en orden de rid; con after, continúa después de esa clave."""
+        start = 0
+        if after is not None:
+            rid = self._ids().get(after)
+            start = rid + 1 if rid is not None else 0
+        for rid in range(start, self.meta.next_rid):
+            record = self._read_record(rid)
+            if record:
+                yield record
+
+    def add(self, record: Airbnb):
+        if not record.id:
+            return
+        if record.id in self._ids():
+            self.remove(record.id)
+
+        rid = self.meta.next_rid
+        self._write_slot(rid, record)
+        self.id_map[record.id] = rid
+        lat, lon = record.coordinates
+        self._insert((lat, lon, lat, lon, rid))
+        self.meta.count += 1
+        self.meta.next_rid += 1
+        self._write_meta()
+
+    def add_many(self, records):
+        for record in records:
+            self.add(record)
+
+    def remove(self, key: str):
+        rid = self._ids().pop(str(key), None)
+        if rid is None:
+            return False
+
+        record = self._read_record(rid)
+        lat, lon = record.coordinates
+        self._delete((lat, lon, lat, lon), rid)
+        self._clear_slot(rid)
+        self.meta.count -= 1
+        self._write_meta()
+        return True
+
+    def is_empty(self):
+        return self.meta.count == 0
+
+    def bulk_load(self, records, fill_factor: float = FILL_FACTOR):
+        """
+        Carga masiva Sort-Tile-Recursive sobre una tabla vacía: los registros se escriben
+        en orden de llegada y el árbol se arma de abajo hacia arriba, nivel por nivel.
+        """
+        self._reset_files()
+        self.id_map = {}
+
+        points, rids = [], []
+        page, page_pos = bytearray(self.PAGE_SIZE), 0
+        for record in records:
+            if not record or not record.id or record.id in self.id_map:
+                continue
+            rid = self.meta.next_rid
+            off = (rid % P) * self.SLOT_SIZE
+            page[off] = 1
+            page[off + 1:off + self.SLOT_SIZE] = record.pack()
+            if rid % P == P - 1:
+                self.pool.put(self.datafile, page_pos, self.PAGE_SIZE, page, bytes)
+                page, page_pos = bytearray(self.PAGE_SIZE), page_pos + 1
+            self.id_map[record.id] = rid
+            points.append(record.coordinates)
+            rids.append(rid)
+            self.meta.next_rid += 1
+        if self.meta.next_rid % P:
+            self.pool.put(self.datafile, page_pos, self.PAGE_SIZE, page, bytes)
+
+        self.meta.count = len(rids)
+        if rids:
+            pts = np.asarray(points, dtype=np.float64)
+            boxes = np.column_stack([pts, pts])
+            self._write_levels(boxes, np.asarray(rids, dtype=np.int64), max(2, int(R * fill_factor)))
+        self._write_meta()
+        self.flush()
+
+    def flush(self):
+        self._write_meta()
+        self.pool.flush(self.datafile)
+        self.pool.flush(self.indexfile)
+
+    def close(self):
+        self.flush()
+
+    # ========== Carga masiva ==========
+
+    def _str_groups(self, boxes: np.ndarray, cap: int) -> list:
+        """Agrupa las cajas en nodos: S franjas verticales por centro x, cada una ordenada por centro y."""
+        n = len(boxes)
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2
+        slices = math.ceil(math.sqrt(math.ceil(n / cap)))
+        slice_size = slices * cap
+
+        groups = []
+        order = np.argsort(cx, kind="stable")
+        for s in range(0, n, slice_size):
+            part = order[s:s + slice_size]
+            part = part[np.argsort(cy[part], kind="stable")]
+            groups.extend(part[i:i + cap] for i in range(0, len(part), cap))
+        return groups
+
+    def _write_levels(self, boxes: np.ndarray, ptrs: np.ndarray, cap: int):
+        pos, height, is_leaf = 1, 0, True
+        while True:
+            groups = self._str_groups(boxes, cap)
+            level_boxes, level_ptrs = [], []
+            for group in groups:
+                node = Node(is_leaf)
+                node.entries = [(*map(float, boxes[i]), int(ptrs[i])) for i in group]
+                self._write_node(node, pos)
+                level_boxes.append(_mbr(node.entries))
+                level_ptrs.append(pos)
+                pos += 1
+            height += 1
+            if len(groups) == 1:
+                break
+            boxes = np.asarray(level_boxes, dtype=np.float64)
+            ptrs = np.asarray(level_ptrs, dtype=np.int64)
+            is_leaf = False
+
+        self.meta.root = level_ptrs[0]
+        self.meta.height = height
+
+    # ========== Inserción y borrado ==========
+
+    def _insert(self, entry: tuple):
+        path = []
+        pos = self.meta.root
+        node = self._read_node(pos)
+        while not node.is_leaf:
+            i = _choose_subtree(node, entry)
+            path.append((pos, node, i))
+            pos = node.entries[i][4]
+            node = self._read_node(pos)
+
+        node.entries.append(entry)
+        sibling = self._split(node) if len(node.entries) > R else None
+        self._write_node(node, pos)
+
+        # Ajuste de MBRs hacia la raíz, propagando splits
+        for parent_pos, parent, i in reversed(path):
+            parent.entries[i] = (*_mbr(node.entries), pos)
+            if sibling:
+                parent.entries.append((*_mbr(sibling[1].entries), sibling[0]))
+            sibling = self._split(parent) if len(parent.entries) > R else None
+            self._write_node(parent, parent_pos)
+            pos, node = parent_pos, parent
+
+        if sibling:
+            root = Node(is_leaf=False)
+            root.entries = [(*_mbr(node.entries), pos), (*_mbr(sibling[1].entries), sibling[0])]
+            self.meta.root = self._alloc_node()
+            self.meta.height += 1
+            self._write_node(root, self.meta.root)
+
+    def _split(self, node: Node):
+        """
+        Split del R*-tree: eje con menor suma de perímetros y, en ese eje, la
+        distribución con menor solapamiento (y luego menor área).
+        """
+        best = None
+        for axis in (0, 1):
+            ordered = sorted(node.entries, key=lambda e: e[axis] + e[axis + 2])
+            margin, candidates = 0.0, []
+            for k in range(R_MIN, len(ordered) - R_MIN + 1):
+                a, b = _mbr(ordered[:k]), _mbr(ordered[k:])
+                margin += _margin(a) + _margin(b)
+                candidates.append((_overlap(a, b), _area(a) + _area(b), k))
+            if best is None or margin < best[0]:
+                best = (margin, ordered, min(candidates))
+
+        _, ordered, (_, _, k) = best
+        sibling = Node(node.is_leaf)
+        node.entries, sibling.entries = ordered[:k], ordered[k:]
+        sibling_pos = self._alloc_node()
+        self._write_node(sibling, sibling_pos)
+        return sibling_pos, sibling
+
+    def _delete(self, box: tuple, rid: int):
+        path = self._find_leaf(self.meta.root, box, rid, [])
+        if path is None:
+            return
+        leaf_pos, leaf, idx = path.pop()
+        del leaf.entries[idx]
+        self._write_node(leaf, leaf_pos)
+
+        # Condensación simple: los nodos vacíos salen del padre y el resto ajusta su MBR.
+        # Los nodos con menos de R_MIN entradas se conservan (no se reinsertan).
+        pos, node = leaf_pos, leaf
+        for parent_pos, parent, i in reversed(path):
+            if node.entries:
+                parent.entries[i] = (*_mbr(node.entries), pos)
+            else:
+                del parent.entries[i]
+            self._write_node(parent, parent_pos)
+            pos, node = parent_pos, parent
+
+        root = self._read_node(self.meta.root)
+        while not root.is_leaf and len(root.entries) == 1:
+            self.meta.root = root.entries[0][4]
+            self.meta.height -= 1
+            root = self._read_node(self.meta.root)
+        if not root.is_leaf and not root.entries:
+            self._write_node(Node(is_leaf=True), self.meta.root)
+            self.meta.height = 1
+
+    def _find_leaf(self, pos: int, box: tuple, rid: int, path: list):
+        """Camino (pos, nodo, índice de la entrada) hasta la hoja que guarda el rid."""
+        node = self._read_node(pos)
+        for i, e in enumerate(node.entries):
+            if node.is_leaf:
+                if e[4] == rid:
+                    return path + [(pos, node, i)]
+            elif e[0] <= box[0] and e[1] <= box[1] and e[2] >= box[2] and e[3] >= box[3]:
+                found = self._find_leaf(e[4], box, rid, path + [(pos, node, i)])
+                if found:
+                    return found
+        return None
+
+    # ========== I/O ==========
+
+    def _reset_files(self):
+        self.pool.discard(self.indexfile)
+        self.pool.discard(self.datafile)
+        with open(self.indexfile, "wb"), open(self.datafile, "wb"):
+            pass
+        self.meta = Meta()
+        self._write_meta()
+        self._write_node(Node(is_leaf=True), self.meta.root)
+        self.pool.flush(self.indexfile)
+
+    def _ids(self) -> dict:
+        if self.id_map is None:
+            self.id_map = {}
+            if self.meta.next_rid:
+                # Solo el flag y la clave de cada slot, sin decodificar registros
+                self.pool.flush(self.datafile)
+                layout = np.dtype({
+                    "names": ["live", "id"],
+                    "formats": ["?", "S20"],
+                    "offsets": [0, 1 + Airbnb.FIELD_OFFSETS[0]],
+                    "itemsize": self.SLOT_SIZE,
+                })
+                slots = np.fromfile(self.datafile, dtype=layout, count=self.meta.next_rid)
+                live = np.nonzero(slots["live"])[0]
+                ids = [k.decode("utf-8", errors="ignore").strip() for k in slots["id"][live].tolist()]
+                self.id_map = dict(zip(ids, live.tolist()))
+        return self.id_map
+
+    def _read_record(self, rid: int):
+        page = self._read_page(rid // P)
+        off = (rid % P) * self.SLOT_SIZE
+        if not page[off]:
+            return None
+        return Airbnb.unpack(bytes(page[off + 1:off + self.SLOT_SIZE]))
+
+    def _write_slot(self, rid: int, record: Airbnb):
+        page = self._read_page(rid // P)
+        off = (rid % P) * self.SLOT_SIZE
+        page[off] = 1
+        page[off + 1:off + self.SLOT_SIZE] = record.pack()
+        self.pool.put(self.datafile, rid // P, self.PAGE_SIZE, page, bytes)
+
+    def _clear_slot(self, rid: int):
+        page = self._read_page(rid // P)
+        page[(rid % P) * self.SLOT_SIZE] = 0
+        self.pool.put(self.datafile, rid // P, self.PAGE_SIZE, page, bytes)
+
+    def _read_page(self, pos: int) -> bytearray:
+        return self.pool.get(self.datafile, pos, self.PAGE_SIZE, self._decode_page)
+
+    def _decode_page(self, data: bytes) -> bytearray:
+        # Una página más allá del final del archivo se lee vacía
+        return bytearray(data.ljust(self.PAGE_SIZE, b"\x00"))
+
+    def _read_node(self, pos: int) -> Node:
+        return self.pool.get(self.indexfile, pos, Node.SIZE, self._decode_node)
+
+    def _decode_node(self, data: bytes) -> Node:
+        is_leaf, count = struct.unpack_from(Node.HEADER_FMT, data)
+        node = Node(bool(is_leaf))
+        body = data[Node.HEADER_SIZE:Node.HEADER_SIZE + count * Node.ENTRY_SIZE]
+        node.entries = list(struct.iter_unpack(Node.ENTRY_FMT, body))
+        return node
+
+    def _write_node(self, node: Node, pos: int):
+        self.pool.put(self.indexfile, pos, Node.SIZE, node, self._encode_node)
+
+    def _encode_node(self, node: Node) -> bytes:
+        data = struct.pack(Node.HEADER_FMT, int(node.is_leaf), len(node.entries))
+        data += b"".join(struct.pack(Node.ENTRY_FMT, *e) for e in node.entries)
+        return data.ljust(Node.SIZE, b"\x00")
+
+    def _alloc_node(self) -> int:
+        return self.pool.file_size(self.indexfile) // Node.SIZE
+
+    def _decode_meta(self, data: bytes) -> Meta:
+        magic, root, height, count, next_rid = struct.unpack_from(Meta.FMT, data)
+        if magic != Meta.MAGIC:
+            raise ValueError(f"{self.indexfile} no es un índice R-tree")
+        return Meta(root, height, count, next_rid)
+
+    def _write_meta(self):
+        self.pool.put(self.indexfile, 0, Node.SIZE, self.meta, self._encode_meta)
+
+    def _encode_meta(self, meta: Meta) -> bytes:
+        data = struct.pack(Meta.FMT, Meta.MAGIC, meta.root, meta.height, meta.count, meta.next_rid)
+        return data.ljust(Node.SIZE, b"\x00")
+
+
+# ========== Geometría de cajas (min_x, min_y, max_x, max_y, ...) ==========
+
+def _mbr(entries) -> tuple:
+    return (min(e[0] for e in entries), min(e[1] for e in entries),
+            max(e[2] for e in entries), max(e[3] for e in entries))
+
+
+def _area(b) -> float:
+    return (b[2] - b[0]) * (b[3] - b[1])
+
+
+def _margin(b) -> float:
+    return (b[2] - b[0]) + (b[3] - b[1])
+
+
+def _overlap(a, b) -> float:
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    return w * h if w > 0 and h > 0 else 0.0
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia de círculo máximo en metros."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_many(lat, lon, lats, lons):
+    """Distancia de círculo máximo en metros desde (lat, lon) a cada punto de los arrays."""
+    p1, p2 = np.radians(lat), np.radians(lats)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _box_distance(lat: float, lon: float, b) -> float:
+    """
+    Distancia mínima en metros del punto a la caja lat/lon b. Si la longitud cae dentro
+    de la caja, el punto más cercano está sobre el mismo meridiano; si no, está en el
+    meridiano borde más cercano: en una de sus esquinas o donde ese meridiano pasa más
+    cerca del punto.
+    """
+    if b[1] <= lon <= b[3]:
+        return haversine(lat, lon, min(max(lat, b[0]), b[2]), lon)
+    edge = b[1] if abs(_wrap(lon - b[1])) < abs(_wrap(lon - b[3])) else b[3]
+    phi = math.radians(lat)
+    peak = math.degrees(math.atan2(math.sin(phi), math.cos(phi) * math.cos(math.radians(edge - lon))))
+    candidates = [b[0], b[2]] + ([peak] if b[0] < peak < b[2] else [])
+    return min(haversine(lat, lon, c, edge) for c in candidates)
+
+
+def _wrap(dlon: float) -> float:
+    """Diferencia de longitudes llevada a [-180, 180)."""
+    return (dlon + 180.0) % 360.0 - 180.0
+
+
+def _choose_subtree(node: Node, box) -> int:
+    """Hijo cuyo MBR crece menos al incluir la caja (desempate por menor área)."""
+    best_i, best = 0, None
+    for i, e in enumerate(node.entries):
+        area = _area(e)
+        grown = (max(e[2], box[2]) - min(e[0], box[0])) * (max(e[3], box[3]) - min(e[1], box[1]))
+        if best is None or (grown - area, area) < best:
+            best_i, best = i, (grown - area, area)
+    return best_i
@@ -0,0 +1,373 @@
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from app.engines.bufferpool import BUFFER_POOL, BufferPool
+from app.engines.keycodec import encode_int, encode_float, encode_varchar, decode_varchar
+
+PAGE_SIZE = 4096  # Un nodo por página del SO
+KEY_SIZE = 30  # Bytes de la clave primaria, con el mismo relleno que Song.pack
+VALUE_SIZE = 8  # Bytes del valor de la columna codificado
+ENTRY_SIZE = VALUE_SIZE + KEY_SIZE
+FILL_FACTOR = 0.9  # Ocupación de hojas y nodos en la construcción
+
+# Tipos de columna indexables
+VALUE_INT = 0
+VALUE_FLOAT = 1
+
+
+def encode_value(value, value_type: int) -> bytes:
+    """Valor de la columna en 8 bytes comparables (ver keycodec)."""
+    return encode_int(value) if value_type == VALUE_INT else encode_float(value)
+
+
+def value_type_for(fmt: str):
+    """Tipo de valor para un formato de struct del registro; None si la columna no es indexable."""
+    if fmt in ("i", "q", "h"):
+        return VALUE_INT
+    if fmt in ("f", "d"):
+        return VALUE_FLOAT
+    return None
+
+
+class IndexNode:
+    # is_leaf, count, siguiente hoja (-1 si no hay)
+    HEADER_FMT = "<?ii"
+    HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    LEAF_CAPACITY = (PAGE_SIZE - HEADER_SIZE) // ENTRY_SIZE
+    # Un nodo interno guarda count claves y count + 1 hijos
+    INTERNAL_CAPACITY = (PAGE_SIZE - HEADER_SIZE - 4) // (ENTRY_SIZE + 4)
+
+    def __init__(self, is_leaf=True, next_leaf=-1):
+        self.is_leaf = is_leaf
+        self.next_leaf = next_leaf
+        self.keys = []
+        self.children = []
+
+
+class IndexMeta:
+    # Formato de la página 0: magic, raíz, altura, entradas, tipo de valor
+    MAGIC = b"SIX1"
+    FMT = "<4siiii"
+
+    def __init__(self, root=1, height=1, count=0, value_type=VALUE_INT):
+        self.root = root
+        self.height = height
+        self.count = count
+        self.value_type = value_type
+
+
+class SecondaryIndex:
+    """
+    B+ tree secundario sobre una columna que no es la clave. Cada entrada es
+    (valor codificado, clave primaria) en bytes comparables, así los valores
+    repetidos quedan ordenados por clave y las entradas son únicas. El localizador
+    del registro es la clave primaria: las posiciones físicas de los motores cambian
+    con splits y reconstrucciones, la clave no.
+    """
+
+    def __init__(self, path: str, value_type: int = VALUE_INT, pool: BufferPool = BUFFER_POOL):
+        self.path = path
+        self.pool = pool
+        if not os.path.exists(self.path):
+            self.pool.discard(self.path)
+            self.bulk_load([], value_type)
+        self.meta = self.pool.get(self.path, 0, PAGE_SIZE, self._decode_meta, pin=True)
+
+    # ========== API Pública ==========
+
+    def entry(self, value, key: str) -> bytes:
+        return encode_value(value, self.meta.value_type) + encode_varchar(key, KEY_SIZE)
+
+    def insert(self, value, key: str):
+        entry = self.entry(value, key)
+        path = []
+        leaf_pos = self._find_leaf(entry, path)
+        leaf = self._read_node(leaf_pos)
+        i = bisect_left(leaf.keys, entry)
+        if i < len(leaf.keys) and leaf.keys[i] == entry:
+            return
+        leaf.keys.insert(i, entry)
+        self.meta.count += 1
+        self._write_meta()
+
+        if len(leaf.keys) <= IndexNode.LEAF_CAPACITY:
+            self._write_node(leaf, leaf_pos)
+            return
+
+        mid = len(leaf.keys) // 2
+        right = IndexNode(is_leaf=True, next_leaf=leaf.next_leaf)
+        right.keys = leaf.keys[mid:]
+        leaf.keys = leaf.keys[:mid]
+        right_pos = self._alloc_node()
+        leaf.next_leaf = right_pos
+        self._write_node(leaf, leaf_pos)
+        self._write_node(right, right_pos)
+        self._insert_in_parent(path, right.keys[0], right_pos)
+
+    def delete(self, value, key: str) -> bool:
+        entry = self.entry(value, key)
+        leaf_pos = self._find_leaf(entry)
+        leaf = self._read_node(leaf_pos)
+        i = bisect_left(leaf.keys, entry)
+        if i == len(leaf.keys) or leaf.keys[i] != entry:
+            return False
+        del leaf.keys[i]
+        self._write_node(leaf, leaf_pos)
+        self.meta.count -= 1
+        self._write_meta()
+        return True
+
+    def range(self, low, high, after: tuple | None = None):
+        """
+        Claves primarias con valor en [low, high], en orden de (valor, clave); None deja el
+        extremo abierto. Con after=(valor, clave) sigue desde la entrada posterior a esa.
+        """
+        begin = encode_value(low, self.meta.value_type) if low is not None else b""
+        end = encode_value(high, self.meta.value_type) + b"\xff" * KEY_SIZE if high is not None else None
+        after = self.entry(*after) if after is not None else None
+        if after is not None and after > begin:
+            begin = after
+
+        pos = self._find_leaf(begin)
+        while pos >= 0:
+            node = self._read_node(pos)
+            for entry in node.keys[bisect_left(node.keys, begin):]:
+                if end is not None and entry > end:
+                    return
+                if entry != after:
+                    yield decode_varchar(entry[VALUE_SIZE:])
+            pos = node.next_leaf
+
+    def stats(self) -> dict:
+        return {"entries": self.meta.count, "height": self.meta.height}
+
+    # ========== Carga Masiva ==========
+
+    def bulk_load(self, entries, value_type: int = None):
+        """
+        Reconstruye el árbol de abajo hacia arriba a partir de pares (valor, clave).
+        Reemplaza el contenido actual.
+        """
+        if value_type is None:
+            value_type = self.meta.value_type
+        encoded = sorted({
+            encode_value(value, value_type) + encode_varchar(key, KEY_SIZE)
+            for value, key in entries
+        })
+
+        leaf_fill = max(1, int(IndexNode.LEAF_CAPACITY * FILL_FACTOR))
+        node_fill = max(2, int(IndexNode.INTERNAL_CAPACITY * FILL_FACTOR))
+        if getattr(self, "meta", None) is not None:
+            self.pool.unpin(self.path, 0)
+        self.pool.discard(self.path)
+
+        with open(self.path, "wb") as f:
+            f.write(bytes(PAGE_SIZE))
+            level = []
+            chunks = [encoded[i:i + leaf_fill] for i in range(0, len(encoded), leaf_fill)] or [[]]
+            for n, chunk in enumerate(chunks):
+                node = IndexNode(is_leaf=True, next_leaf=n + 2 if n + 1 < len(chunks) else -1)
+                node.keys = chunk
+                f.write(self._encode_node(node))
+                level.append((chunk[0] if chunk else b"", n + 1))
+
+            next_pos = len(chunks) + 1
+            height = 1
+            while len(level) > 1:
+                n_groups = -(-len(level) // node_fill)
+                parents = []
+                for g in range(n_groups):
+                    # Reparto parejo para que ningún nodo quede con un solo hijo
+                    group = level[g * len(level) // n_groups:(g + 1) * len(level) // n_groups]
+                    node = IndexNode(is_leaf=False)
+                    node.keys = [k for k, _ in group[1:]]
+                    node.children = [c for _, c in group]
+                    f.write(self._encode_node(node))
+                    parents.append((group[0][0], next_pos))
+                    next_pos += 1
+                level = parents
+                height += 1
+
+            meta = IndexMeta(root=level[0][1], height=height, count=len(encoded), value_type=value_type)
+            f.seek(0)
+            f.write(self._encode_meta(meta))
+        self.meta = self.pool.get(self.path, 0, PAGE_SIZE, self._decode_meta, pin=True)
+
+    # ========== Métodos Internos ==========
+
+    def _find_leaf(self, entry: bytes, path=None):
+        pos = self.meta.root
+        node = self._read_node(pos)
+        while not node.is_leaf:
+            i = bisect_right(node.keys, entry)
+            if path is not None:
+                path.append((pos, i))
+            pos = node.children[i]
+            node = self._read_node(pos)
+        return pos
+
+    def _insert_in_parent(self, path, sep: bytes, right_pos: int):
+        """Sube el separador por el camino de descenso, dividiendo nodos internos llenos."""
+        while path:
+            node_pos, child_i = path.pop()
+            node = self._read_node(node_pos)
+            node.keys.insert(child_i, sep)
+            node.children.insert(child_i + 1, right_pos)
+            if len(node.keys) <= IndexNode.INTERNAL_CAPACITY:
+                self._write_node(node, node_pos)
+                return
+
+            mid = len(node.keys) // 2
+            right = IndexNode(is_leaf=False)
+            right.keys = node.keys[mid + 1:]
+            right.children = node.children[mid + 1:]
+            sep = node.keys[mid]
+            node.keys = node.keys[:mid]
+            node.children = node.children[:mid + 1]
+            right_pos = self._alloc_node()
+            self._write_node(node, node_pos)
+            self._write_node(right, right_pos)
+
+        # Se dividió la raíz
+        root = IndexNode(is_leaf=False)
+        root.keys = [sep]
+        root.children = [self.meta.root, right_pos]
+        root_pos = self._alloc_node()
+        self._write_node(root, root_pos)
+        self.meta.root = root_pos
+        self.meta.height += 1
+        self._write_meta()
+
+    # ========== I/O ==========
+
+    def flush(self):
+        self.pool.flush(self.path)
+
+    def close(self):
+        self.pool.unpin(self.path, 0)
+        self.flush()
+
+    def _read_node(self, pos: int):
+        return self.pool.get(self.path, pos, PAGE_SIZE, self._decode_node)
+
+    def _write_node(self, node: IndexNode, pos: int):
+        self.pool.put(self.path, pos, PAGE_SIZE, node, self._encode_node)
+
+    def _alloc_node(self):
+        return self.pool.file_size(self.path) // PAGE_SIZE
+
+    def _decode_node(self, data: bytes):
+        is_leaf, count, next_leaf = struct.unpack(IndexNode.HEADER_FMT, data[:IndexNode.HEADER_SIZE])
+        node = IndexNode(is_leaf, next_leaf)
+        start = IndexNode.HEADER_SIZE
+        node.keys = [bytes(data[start + i * ENTRY_SIZE:start + (i + 1) * ENTRY_SIZE]) for i in range(count)]
+        if not is_leaf:
+            start += count * ENTRY_SIZE
+            node.children = list(struct.unpack_from(f"<{count + 1}i", data, start))
+        return node
+
+    def _encode_node(self, node: IndexNode):
+        data = struct.pack(IndexNode.HEADER_FMT, node.is_leaf, len(node.keys), node.next_leaf) + b"".join(node.keys)
+        if not node.is_leaf:
+            data += struct.pack(f"<{len(node.children)}i", *node.children)
+        return data.ljust(PAGE_SIZE, b"\x00")
+
+    def _write_meta(self):
+        self.pool.put(self.path, 0, PAGE_SIZE, self.meta, self._encode_meta)
+
+    def _decode_meta(self, data: bytes):
+        magic, root, height, count, value_type = struct.unpack_from(IndexMeta.FMT, data)
+        if magic != IndexMeta.MAGIC:
+            raise ValueError(f"{self.path} no es un índice secundario")
+        return IndexMeta(root, height, count, value_type)
+
+    def _encode_meta(self, meta: IndexMeta):
+        return struct.pack(IndexMeta.FMT, IndexMeta.MAGIC, meta.root, meta.height, meta.count,
+                           meta.value_type).ljust(PAGE_SIZE, b"\x00")
+
+
+class IndexedTable:
+    """
+    Motor primario con índices secundarios. Delega todo en el motor y mantiene
+    los índices al día en add/add_many/remove/bulk_load: antes de escribir busca
+    la versión anterior del registro para retirar sus entradas.
+    """
+
+    def __init__(self, engine, indexes: dict):
+        self.engine = engine
+        self.indexes = indexes
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    # ========== API Pública ==========
+
+    def add(self, record):
+        # Los índices se tocan después del motor: si el registro no se puede escribir no cambian
+        old = self.engine.search(getattr(record, record.KEY))
+        self.engine.add(record)
+        self._unindex(old)
+        self._index(record)
+
+    def add_many(self, records):
+        batch = list({getattr(r, r.KEY): r for r in records if r}.values())
+        # Un registro inválido tiene que fallar antes de escribir parte del lote
+        for record in batch:
+            record.pack()
+        olds = [self.engine.search(getattr(record, record.KEY)) for record in batch]
+        self.engine.add_many(batch)
+        for old, record in zip(olds, batch):
+            self._unindex(old)
+            self._index(record)
+
+    def remove(self, key: str):
+        old = self.engine.search(key)
+        removed = self.engine.remove(key)
+        if removed:
+            self._unindex(old)
+        return removed
+
+    def bulk_load(self, records):
+        self.engine.bulk_load(records)
+        for column, index in self.indexes.items():
+            self.build_index(column, index)
+
+    def build_index(self, column: str, index: SecondaryIndex):
+        """Llena el índice con un recorrido completo del motor."""
+        index.bulk_load((getattr(r, column), getattr(r, r.KEY)) for r in self.engine.scan())
+        self.indexes[column] = index
+
+    def index_range(self, column: str, low, high, after: tuple | None = None):
+        """Registros con low <= column <= high vía el índice secundario, en orden de (valor, clave)."""
+        for key in self.indexes[column].range(low, high, after):
+            record = self.engine.search(key)
+            if record is not None:
+                yield record
+
+    def stats(self) -> dict:
+        stats = self.engine.stats() if hasattr(self.engine, "stats") else {}
+        return dict(stats, secondary={column: index.stats() for column, index in self.indexes.items()})
+
+    def flush(self):
+        if hasattr(self.engine, "flush"):
+            self.engine.flush()
+        for index in self.indexes.values():
+            index.flush()
+
+    def close(self):
+        if hasattr(self.engine, "close"):
+            self.engine.close()
+        for index in self.indexes.values():
+            index.close()
+
+    # ========== Métodos Internos ==========
+
+    def _index(self, record):
+        for column, index in self.indexes.items():
+            index.insert(getattr(record, column), getattr(record, record.KEY))
+
+    def _unindex(self, record):
+        if record is None:
+            return
+        for column, index in self.indexes.items():
+            index.delete(getattr(record, column), getattr(record, record.KEY))
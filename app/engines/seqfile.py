@@ -1,15 +1,48 @@
 import struct
 import os
 import math
-from app.data.records.song import Song 
+import mmap
+import functools
+import threading
+from bisect import bisect_left, bisect_right
+from app.data.records.song import Song
+from app.engines.keycodec import encode_key 
+
+# Registros leídos por llamada al recorrer el principal durante la reconstrucción
+MERGE_CHUNK = 1024
+# Bytes de la clave (track_id) al inicio de cada registro empaquetado
+KEY_SIZE = 30
+# Registros por lote al recorrer la tabla con scan()
+SCAN_BATCH = 256
+
+
+def _synchronized(method):
+    """Serializa el método con el lock de la instancia (la reconstrucción puede correr en otro hilo)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class SequentialFile:
     # Tamaño de un registro en el main se aumenta 1 byte para el boleano de borrado lógico
     MAIN_RECORD_SIZE = Song.RECORD_SIZE + 1
+    # El auxiliar es un log append-only con el mismo formato (registro + flag de borrado)
+    AUX_RECORD_SIZE = Song.RECORD_SIZE + 1
+    # Un fence cada FENCE_STEP registros: el bloque entre dos fences cabe en ~una página del SO
+    FENCE_STEP = max(1, mmap.PAGESIZE // MAIN_RECORD_SIZE)
 
-    def __init__(self, main_path: str, aux_path: str):
+    def __init__(self, main_path: str, aux_path: str, background_reconstruct: bool = False):
         self.main_path = main_path
         self.aux_path = aux_path
+        self.lock = threading.RLock()
+
+        # Reconstrucción en segundo plano: add() no espera la fusión completa
+        self.background_reconstruct = background_reconstruct
+        self._rebuild_thread = None
+        # Claves borradas mientras corre una reconstrucción (None si no hay ninguna)
+        self._rebuild_deletes = None
 
         if not os.path.exists(self.main_path):
             open(self.main_path, 'w').close()
@@ -19,11 +52,30 @@ class SequentialFile:
         self.main_file_handle = open(self.main_path, "r+b")
         self.aux_file_handle = open(self.aux_path, "r+b")
 
+        # Lecturas del principal vía mmap + fences (cada FENCE_STEP-ésima clave en crudo)
+        self.main_mmap = None
+        self.main_count = 0
+        self.fence_keys = []
+        self._refresh_main_index()
+
+        # Índice en memoria del auxiliar: claves codificadas (bytes) ordenadas y su posición en el log
+        self.aux_keys = []
+        self.aux_offsets = []
+        self.aux_log_size = 0
+        self._load_aux_index()
+
         # Umbral 'k' para la reconstrucción
         self.k_threshold = 10 # Inicio por defecto.
+        self._update_threshold(self._get_record_count_main())
 
     def close(self):
         """Cierra de forma segura los manejadores de archivo para liberar recursos."""
+        thread = getattr(self, '_rebuild_thread', None)
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join()
+        if getattr(self, 'main_mmap', None) is not None:
+            self.main_mmap.close()
+            self.main_mmap = None
         if hasattr(self, 'main_file_handle') and self.main_file_handle and not self.main_file_handle.closed:
             self.main_file_handle.close()
         if hasattr(self, 'aux_file_handle') and self.aux_file_handle and not self.aux_file_handle.closed:
@@ -35,70 +87,130 @@ class SequentialFile:
 
     # ========== API Pública =================
 
+    @_synchronized
     def add(self, song: Song):
-        """Agrega una nueva canción al archivo auxiliar manteniendo el orden """
-        aux_records = list(self._read_all_records_aux())
-        aux_records.append(song)
-        aux_records.sort(key=lambda s: s.track_id)
-        
-        self.aux_file_handle.seek(0)
-        self.aux_file_handle.truncate()
-        for s in aux_records:
-            self.aux_file_handle.write(s.pack())
+        """Agrega una nueva canción al final del log auxiliar y la registra en el índice en memoria."""
+        pos = self.aux_log_size
+        self.aux_file_handle.seek(pos * self.AUX_RECORD_SIZE)
+        self.aux_file_handle.write(song.pack() + struct.pack('?', False))
         self.aux_file_handle.flush()
+        self.aux_log_size += 1
+        self._index_aux(song.key_bytes(), pos)
+
+        self._check_threshold()
+
+    @_synchronized
+    def add_many(self, songs):
+        """Agrega un lote al log auxiliar con una sola escritura y revisa el umbral una vez."""
+        songs = [s for s in songs if s and s.track_id]
+        if not songs:
+            return
+        start = self.aux_log_size
+        self.aux_file_handle.seek(start * self.AUX_RECORD_SIZE)
+        self.aux_file_handle.write(b"".join(s.pack() + struct.pack('?', False) for s in songs))
+        self.aux_file_handle.flush()
+        self.aux_log_size += len(songs)
+        for i, song in enumerate(songs):
+            self._index_aux(song.key_bytes(), start + i)
 
-        if len(aux_records) > self.k_threshold:
-            print(f"--- Umbral k={self.k_threshold} superado. Reconstruyendo... ---")
-            self._reconstruct()
+        self._check_threshold()
 
+    @_synchronized
     def search(self, key: str):
-        """Busca una canción por su key usando búsqueda binaria en ambos archivos."""
+        """
+        Busca una canción por su key usando búsqueda binaria en ambos archivos.
+        El auxiliar tiene la versión más reciente, así que se consulta primero.
+        """
+        aux_song = self._binary_search_aux(self._key_bytes(key))
+        if aux_song:
+            return aux_song
+
         song, is_deleted = self._binary_search_main(key)
         if song:
             return song if not is_deleted else None
 
-        aux_song = self._binary_search_aux(key)
-        if aux_song:
-            return aux_song
-        
         return None
 
+    @_synchronized
     def rangeSearch(self, begin_key: str, end_key: str):
         """Busca todas las canciones en un rango con una fusión O(N+K)."""
         main_results = []
         start_pos = self._find_first_in_range(begin_key)
         if start_pos != -1:
-            self.main_file_handle.seek(start_pos * self.MAIN_RECORD_SIZE)
-            while data := self.main_file_handle.read(self.MAIN_RECORD_SIZE):
-                song, is_deleted = self._unpack_main_record(data)
-                if song.track_id > end_key:
+            end_kb = self._key_bytes(end_key)
+            for pos in range(start_pos, self.main_count):
+                offset = pos * self.MAIN_RECORD_SIZE
+                if self.main_mmap[offset:offset + KEY_SIZE] > end_kb:
                     break
+                song, is_deleted = self._unpack_main_record(self.main_mmap[offset:offset + self.MAIN_RECORD_SIZE])
                 if not is_deleted:
                     main_results.append(song)
         
-        aux_results = [
-            song for song in self._read_all_records_aux()
-            if begin_key <= song.track_id <= end_key
-        ]
+        lo = bisect_left(self.aux_keys, self._key_bytes(begin_key))
+        hi = bisect_right(self.aux_keys, self._key_bytes(end_key))
+        aux_results = [self._read_aux_record(pos) for pos in self.aux_offsets[lo:hi]]
         
         return self._merge_lists(main_results, aux_results)
 
+    def scan(self, after: str = None):
+        """
+        Recorre la tabla en orden de clave; con after, desde la primera clave > after.
+        Avanza en lotes por clave, así no retiene el lock entre lotes.
+        """
+        while batch := self._scan_batch(after, SCAN_BATCH):
+            yield from batch
+            after = batch[-1].track_id
+
+    @_synchronized
+    def _scan_batch(self, after, limit: int):
+        """Hasta `limit` registros vivos con clave > after, fusionando principal y auxiliar."""
+        main_start = 0
+        aux_start = 0
+        if after is not None:
+            after_kb = self._key_bytes(after)
+            main_start = self._lower_bound(after_kb)
+            if main_start < self.main_count and self._key_at(main_start) == after_kb:
+                main_start += 1
+            aux_start = bisect_right(self.aux_keys, after_kb)
+
+        def main_stream():
+            for pos in range(main_start, self.main_count):
+                offset = pos * self.MAIN_RECORD_SIZE
+                song, is_deleted = self._unpack_main_record(self.main_mmap[offset:offset + self.MAIN_RECORD_SIZE])
+                if not is_deleted:
+                    yield song
+
+        aux_stream = (self._read_aux_record(pos) for pos in self.aux_offsets[aux_start:aux_start + limit])
+        batch = []
+        for song in self._merge_streams(main_stream(), aux_stream):
+            batch.append(song)
+            if len(batch) == limit:
+                break
+        return batch
+
+    @_synchronized
     def remove(self, key: str):
         """
         - Borrado físico en el archivo auxiliar.
         - Borrado lógico en el archivo principal.
         """
-        aux_records = list(self._read_all_records_aux())
-        new_aux_records = [r for r in aux_records if r.track_id != key]
-
-        if len(new_aux_records) < len(aux_records):
-            self.aux_file_handle.seek(0)
-            self.aux_file_handle.truncate()
-            for record in new_aux_records:
-                self.aux_file_handle.write(record.pack())
-            self.aux_file_handle.flush()
-            return True
-
+        if self._rebuild_deletes is not None:
+            self._rebuild_deletes.add(key)
+
+        removed_aux = False
+        kb = self._key_bytes(key)
+        i = bisect_left(self.aux_keys, kb)
+        if i < len(self.aux_keys) and self.aux_keys[i] == kb:
+            self._mark_aux_deleted(self.aux_offsets[i])
+            del self.aux_keys[i]
+            del self.aux_offsets[i]
+            removed_aux = True
+
+        # Una versión anterior puede seguir viva en el principal
+        return self._remove_main(key) or removed_aux
+
+    def _remove_main(self, key: str):
+        """Borrado lógico en el archivo principal."""
         record_pos = self._find_record_pos(key)
         if record_pos != -1:
             self.main_file_handle.seek(record_pos * self.MAIN_RECORD_SIZE)
@@ -121,13 +233,16 @@ class SequentialFile:
 
     # ========== Métodos de Carga y Reconstrucción ==========
 
+    @_synchronized
     def bulk_load(self, songs: list[Song]):
         """
         Carga masiva inicial. Ordena los datos y los escribe 
         en el archivo principal.
         """
-        songs.sort(key=lambda s: s.track_id)
-        
+        songs.sort(key=lambda s: s.key_bytes())
+
+        # Truncar un archivo mapeado invalida el mapeo
+        self._close_main_mmap()
         self.main_file_handle.seek(0)
         self.main_file_handle.truncate()
         for song in songs:
@@ -137,51 +252,141 @@ class SequentialFile:
         self.aux_file_handle.seek(0)
         self.aux_file_handle.truncate()
         self.aux_file_handle.flush()
+        self.aux_keys, self.aux_offsets, self.aux_log_size = [], [], 0
+        self._refresh_main_index()
 
         n = len(songs)
-        if n > 0:
-            self.k_threshold = max(10, math.floor(math.log2(n)))
+        self._update_threshold(n)
         print(f"Carga masiva completa. {n} registros cargados. Umbral k = {self.k_threshold}")
 
+    def _check_threshold(self):
+        if len(self.aux_keys) > self.k_threshold:
+            if self.background_reconstruct:
+                self._start_background_reconstruct()
+            else:
+                print(f"--- Umbral k={self.k_threshold} superado. Reconstruyendo... ---")
+                self._reconstruct()
+
+    def _start_background_reconstruct(self):
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+        print(f"--- Umbral k={self.k_threshold} superado. Reconstruyendo en segundo plano... ---")
+        self._rebuild_thread = threading.Thread(target=self._reconstruct, daemon=True)
+        self._rebuild_thread.start()
+
     def _reconstruct(self):
         """
-        Fusiona el archivo principal y el auxiliar en un nuevo archivo principal ordenado.
-        Complejidad O(N+K).
+        Fusiona en streaming el principal y el auxiliar en un archivo nuevo y lo
+        reemplaza atómicamente con un rename. Complejidad O(N+K), memoria acotada.
+        Las operaciones que llegan durante la fusión se conservan en el auxiliar.
         """
-        main_records = [
-            song for song, is_deleted in self._read_all_records_main() if not is_deleted
-        ]
-        
-        aux_records = list(self._read_all_records_aux())
-        
-        all_records = self._merge_lists(main_records, aux_records)
-
-        self.bulk_load(all_records)
+        with self.lock:
+            self.main_file_handle.flush()
+            self.aux_file_handle.flush()
+            snapshot = list(self.aux_offsets)
+            snapshot_size = self.aux_log_size
+            self._rebuild_deletes = set()
+
+        tmp_path = self.main_path + ".tmp"
+        n = 0
+        try:
+            with open(self.main_path, "rb") as main_in, open(self.aux_path, "rb") as aux_in, \
+                    open(tmp_path, "wb") as out:
+                merged = self._merge_streams(self._stream_main(main_in), self._stream_aux(aux_in, snapshot))
+                for song in merged:
+                    out.write(song.pack() + struct.pack('?', False))
+                    n += 1
+                out.flush()
+                os.fsync(out.fileno())
+        except BaseException:
+            with self.lock:
+                self._rebuild_deletes = None
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.lock:
+            self.main_file_handle.close()
+            self._close_main_mmap()
+            os.replace(tmp_path, self.main_path)
+            self.main_file_handle = open(self.main_path, "r+b")
+            self._refresh_main_index()
+
+            self._compact_aux(snapshot_size)
+            deletes, self._rebuild_deletes = self._rebuild_deletes, None
+            for key in deletes:
+                self._remove_main(key)
+            self._update_threshold(n)
         print("Reconstrucción completa.")
 
+    def _stream_main(self, f):
+        """Generador de registros vivos del principal, leyendo en bloques secuenciales."""
+        while data := f.read(MERGE_CHUNK * self.MAIN_RECORD_SIZE):
+            for i in range(0, len(data) - self.MAIN_RECORD_SIZE + 1, self.MAIN_RECORD_SIZE):
+                song, is_deleted = self._unpack_main_record(data[i:i + self.MAIN_RECORD_SIZE])
+                if not is_deleted:
+                    yield song
+
+    def _stream_aux(self, f, offsets: list[int]):
+        """Generador de registros del auxiliar en orden de clave según el índice."""
+        for pos in offsets:
+            f.seek(pos * self.AUX_RECORD_SIZE)
+            yield Song.lazy(f.read(Song.RECORD_SIZE))
+
+    def _compact_aux(self, snapshot_size: int):
+        """
+        Deja en el auxiliar solo lo agregado después del snapshot (ya fusionado lo demás),
+        escribiéndolo en un log nuevo que reemplaza al anterior.
+        """
+        live = [(k, pos) for k, pos in zip(self.aux_keys, self.aux_offsets) if pos >= snapshot_size]
+        tmp_path = self.aux_path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            for _, pos in live:
+                self.aux_file_handle.seek(pos * self.AUX_RECORD_SIZE)
+                out.write(self.aux_file_handle.read(self.AUX_RECORD_SIZE))
+        self.aux_file_handle.close()
+        os.replace(tmp_path, self.aux_path)
+        self.aux_file_handle = open(self.aux_path, "r+b")
+
+        self.aux_keys = [k for k, _ in live]
+        self.aux_offsets = list(range(len(live)))
+        self.aux_log_size = len(live)
+
     # ========== Métodos Internos de Ayuda ==========
     
     def _merge_lists(self, listA: list[Song], listB: list[Song]) -> list[Song]:
         """Algoritmo de fusión para combinar dos listas ya ordenadas."""
-        merged_list = []
-        ptrA, ptrB = 0, 0
-        while ptrA < len(listA) and ptrB < len(listB):
-            if listA[ptrA].track_id < listB[ptrB].track_id:
-                merged_list.append(listA[ptrA])
-                ptrA += 1
+        return list(self._merge_streams(iter(listA), iter(listB)))
+
+    def _merge_streams(self, itA, itB):
+        """
+        Fusión de dos secuencias ordenadas sin materializarlas.
+        Con claves iguales gana B (el auxiliar, más reciente).
+        """
+        a = next(itA, None)
+        b = next(itB, None)
+        while a is not None and b is not None:
+            ka, kb = a.key_bytes(), b.key_bytes()
+            if ka < kb:
+                yield a
+                a = next(itA, None)
             else:
-                merged_list.append(listB[ptrB])
-                ptrB += 1
-        merged_list.extend(listA[ptrA:])
-        merged_list.extend(listB[ptrB:])
-        return merged_list
+                if ka == kb:
+                    a = next(itA, None)
+                yield b
+                b = next(itB, None)
+        while a is not None:
+            yield a
+            a = next(itA, None)
+        while b is not None:
+            yield b
+            b = next(itB, None)
 
     def _unpack_main_record(self, data: bytes):
-        """Desempaqueta un registro del archivo principal en (Song, is_deleted)."""
-        song_data = data[:Song.RECORD_SIZE]
-        flag_data = data[Song.RECORD_SIZE:]
-        song = Song.unpack(song_data)
-        is_deleted = struct.unpack('?', flag_data)[0]
+        """Desempaqueta un registro del archivo principal en (Song, is_deleted); la canción es perezosa."""
+        data = memoryview(data)
+        song = Song.lazy(data[:Song.RECORD_SIZE])
+        is_deleted = bool(data[Song.RECORD_SIZE])
         return song, is_deleted
 
     def _read_all_records_main(self):
@@ -191,10 +396,47 @@ class SequentialFile:
             yield self._unpack_main_record(data)
 
     def _read_all_records_aux(self):
-        """Generador que lee todos los registros del archivo auxiliar."""
+        """Generador que lee los registros vivos del auxiliar en orden de clave."""
+        for pos in list(self.aux_offsets):
+            yield self._read_aux_record(pos)
+
+    def _read_aux_record(self, pos: int):
+        self.aux_file_handle.seek(pos * self.AUX_RECORD_SIZE)
+        return Song.lazy(self.aux_file_handle.read(Song.RECORD_SIZE))
+
+    def _mark_aux_deleted(self, pos: int):
+        self.aux_file_handle.seek(pos * self.AUX_RECORD_SIZE + Song.RECORD_SIZE)
+        self.aux_file_handle.write(struct.pack('?', True))
+        self.aux_file_handle.flush()
+
+    def _index_aux(self, key: bytes, pos: int):
+        """Registra key -> pos; si la clave ya estaba, la versión anterior queda borrada en el log."""
+        i = bisect_left(self.aux_keys, key)
+        if i < len(self.aux_keys) and self.aux_keys[i] == key:
+            self._mark_aux_deleted(self.aux_offsets[i])
+            self.aux_offsets[i] = pos
+        else:
+            self.aux_keys.insert(i, key)
+            self.aux_offsets.insert(i, pos)
+
+    def _load_aux_index(self):
+        """Reconstruye el índice en memoria recorriendo el log auxiliar una sola vez."""
+        latest = {}
         self.aux_file_handle.seek(0)
-        while data := self.aux_file_handle.read(Song.RECORD_SIZE):
-            yield Song.unpack(data)
+        pos = 0
+        while len(data := self.aux_file_handle.read(self.AUX_RECORD_SIZE)) == self.AUX_RECORD_SIZE:
+            if not struct.unpack('?', data[-1:])[0]:
+                latest[Song.lazy(data[:Song.RECORD_SIZE]).key_bytes()] = pos
+            pos += 1
+        self.aux_log_size = pos
+        self.aux_keys = sorted(latest)
+        self.aux_offsets = [latest[k] for k in self.aux_keys]
+
+    def _update_threshold(self, n: int):
+        # Con inserciones O(1) en el log, k puede crecer como sqrt(N): la reconstrucción O(N+k)
+        # se amortiza entre más inserciones
+        if n > 0:
+            self.k_threshold = max(10, math.isqrt(n))
 
     def _get_record_count_main(self):
         """Devuelve el número de registros en el archivo principal."""
@@ -202,74 +444,77 @@ class SequentialFile:
         return self.main_file_handle.tell() // self.MAIN_RECORD_SIZE
 
     def _get_record_count_aux(self):
-        """Devuelve el número de registros en el archivo auxiliar."""
-        self.aux_file_handle.seek(0, 2)
-        return self.aux_file_handle.tell() // Song.RECORD_SIZE
+        """Devuelve el número de registros vivos en el archivo auxiliar."""
+        return len(self.aux_keys)
 
     def _binary_search_main(self, key: str):
-        """Búsqueda binaria en el archivo principal."""
-        low, high = 0, self._get_record_count_main() - 1
-        while low <= high:
-            mid = (low + high) // 2
-            self.main_file_handle.seek(mid * self.MAIN_RECORD_SIZE)
-            data = self.main_file_handle.read(self.MAIN_RECORD_SIZE)
-            if not data: continue
-            song, is_deleted = self._unpack_main_record(data)
-            
-            if song.track_id == key:
-                return song, is_deleted
-            elif song.track_id < key:
-                low = mid + 1
-            else:
-                high = mid - 1
-        return None, None
-
-    def _binary_search_aux(self, key: str):
-        """Búsqueda binaria en el archivo auxiliar."""
-        records = list(self._read_all_records_aux())
-        low, high = 0, len(records) - 1
-        while low <= high:
-            mid = (low + high) // 2
-            if records[mid].track_id == key:
-                return records[mid]
-            elif records[mid].track_id < key:
-                low = mid + 1
-            else:
-                high = mid - 1
+        """Búsqueda en el principal: fences en memoria y luego un solo bloque del mmap."""
+        pos = self._find_record_pos(key)
+        if pos == -1:
+            return None, None
+        offset = pos * self.MAIN_RECORD_SIZE
+        return self._unpack_main_record(self.main_mmap[offset:offset + self.MAIN_RECORD_SIZE])
+
+    def _binary_search_aux(self, key: bytes):
+        """Búsqueda binaria en el índice en memoria del auxiliar; una sola lectura a disco."""
+        i = bisect_left(self.aux_keys, key)
+        if i < len(self.aux_keys) and self.aux_keys[i] == key:
+            return self._read_aux_record(self.aux_offsets[i])
         return None
 
     def _find_record_pos(self, key: str):
         """Encuentra la posición de un registro en el archivo principal."""
-        low, high = 0, self._get_record_count_main() - 1
-        while low <= high:
-            mid = (low + high) // 2
-            self.main_file_handle.seek(mid * self.MAIN_RECORD_SIZE)
-            data = self.main_file_handle.read(self.MAIN_RECORD_SIZE)
-            if not data: continue
-            song, _ = self._unpack_main_record(data)
-
-            if song.track_id == key:
-                return mid
-            elif song.track_id < key:
-                low = mid + 1
-            else:
-                high = mid - 1
-        return -1 
+        kb = self._key_bytes(key)
+        pos = self._lower_bound(kb)
+        if pos < self.main_count and self._key_at(pos) == kb:
+            return pos
+        return -1
 
     def _find_first_in_range(self, begin_key: str):
         """Encuentra la posición del primer registro cuyo ID es >= begin_key."""
-        low, high = 0, self._get_record_count_main() - 1
-        start_pos = -1
-        while low <= high:
+        pos = self._lower_bound(self._key_bytes(begin_key))
+        return pos if pos < self.main_count else -1
+
+    def _lower_bound(self, kb: bytes):
+        """
+        Primera posición con clave >= kb. Los fences acotan la búsqueda a un bloque
+        de FENCE_STEP registros y dentro del bloque se comparan bytes crudos del mmap,
+        sin construir objetos Song.
+        """
+        block = bisect_left(self.fence_keys, kb)
+        if block == 0:
+            return 0
+        low = (block - 1) * self.FENCE_STEP
+        high = min(block * self.FENCE_STEP, self.main_count)
+        while low < high:
             mid = (low + high) // 2
-            self.main_file_handle.seek(mid * self.MAIN_RECORD_SIZE)
-            data = self.main_file_handle.read(self.MAIN_RECORD_SIZE)
-            if not data: continue
-            song, _ = self._unpack_main_record(data)
-            
-            if song.track_id >= begin_key:
-                start_pos = mid
-                high = mid - 1
-            else:
+            if self._key_at(mid) < kb:
                 low = mid + 1
-        return start_pos
+            else:
+                high = mid
+        return low
+
+    def _key_at(self, pos: int):
+        offset = pos * self.MAIN_RECORD_SIZE
+        return self.main_mmap[offset:offset + KEY_SIZE]
+
+    def _key_bytes(self, key: str):
+        """Clave con el mismo relleno que Song.pack, comparable byte a byte con el archivo."""
+        return encode_key(key, Song.KEY_TYPE)
+
+    def _refresh_main_index(self):
+        """(Re)mapea el principal y reconstruye los fences; se llama cada vez que cambia el archivo."""
+        self._close_main_mmap()
+        self.main_file_handle.flush()
+        size = os.path.getsize(self.main_path)
+        self.main_count = size // self.MAIN_RECORD_SIZE
+        if self.main_count == 0:
+            self.fence_keys = []
+            return
+        self.main_mmap = mmap.mmap(self.main_file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.fence_keys = [self._key_at(pos) for pos in range(0, self.main_count, self.FENCE_STEP)]
+
+    def _close_main_mmap(self):
+        if self.main_mmap is not None:
+            self.main_mmap.close()
+            self.main_mmap = None
@@ -1,12 +1,27 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routes import parser_sql, database
+from app.engines.factory import ENGINES
+from app.engines.bufferpool import BUFFER_POOL
+from app.engines.executor import ENGINE_EXECUTOR
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Los motores se abren bajo demanda y viven lo que dure el proceso
+    yield
+    ENGINE_EXECUTOR.shutdown()
+    ENGINES.close_all()
+    BUFFER_POOL.close()
 
 app = FastAPI(
     title="Mini Database Manager",
     version="1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
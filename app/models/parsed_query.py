@@ -5,8 +5,10 @@ class ParsedQuery(BaseModel):
     op: int
     idx: Optional[str] = None
     table: Optional[str] = None
-    columns: Optional[List[str]] = None
+    columns: Optional[List[Any]] = None
     where: Optional[Dict[str, Any]] = None
     file: Optional[str] = None
     index: Optional[Dict[str, Any]] = None
     values: Optional[List[List[Any]]] = None
+    limit: Optional[int] = None
+    after: Optional[str] = None
@@ -1,16 +1,26 @@
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pathlib import Path
 import re
-import csv, inspect
+import csv, inspect, json, base64, math
+from itertools import islice
 
 from app.models.parsed_query import ParsedQuery
-from app.engines.factory import ENGINE_BUILDERS
-from app.settings import DATA_ROOT, BPLUSTREE_DIR
+from app.engines.factory import ENGINES, PAGED_ENGINES, page_size_of
+from app.engines.bufferpool import BUFFER_POOL
+from app.engines.executor import ENGINE_EXECUTOR
+from app.settings import DATA_ROOT, BPLUSTREE_DIR, GENERATED_RECORDS_DIR
 from app.data.records.song import Song
+from app.data.records.airbnb import Airbnb, parse_coordinates
+from app.engines.secondary import VALUE_INT, VALUE_FLOAT, value_type_for
 
 router = APIRouter()
 
+# Filas por lote al transmitir una tabla completa
+STREAM_BATCH = 500
+# Filas por lote de add_many al importar sobre una tabla con datos
+IMPORT_BATCH = 1000
+
 
 def generate_record(schema: dict) -> str:
     table = schema["table"]
@@ -112,17 +122,33 @@ def generate_record(schema: dict) -> str:
             ctor_kwargs.append(f"{name}={name}")
 
     fmt_str = '"' + "".join(fmt_parts) + '"'
+    key_col = next((c for c in cols if c.get("key") and c["type"].lower() != "array(float)"), None)
+    key_lines = ""
+    key_method = ""
+    if key_col:
+        key_lines = (
+            f"    KEY = {key_col['name']!r}\n"
+            f"    KEY_TYPE = {key_col['type'].lower()!r}\n"
+        )
+        key_method = (
+            "    def key_bytes(self) -> bytes:\n"
+            f"        return encode_key(self.{key_col['name']}, self.KEY_TYPE)\n\n"
+        )
     init_sig = ", ".join([f"{n}: {t}" for n, t in zip(init_names, init_types)])
     tuple_vars_str = ", ".join(unpack_tuple_vars)
     ctor_kwargs_str = ",\n                ".join(ctor_kwargs)
 
     source = (
-            "import struct\n\n\n"
+            "import struct\n\n" +
+            ("from app.engines.keycodec import encode_key\n\n" if key_col else "") +
+            "\n"
             f"class {class_name}:\n"
             f"    FMT = {fmt_str}\n"
-            f"    RECORD_SIZE = struct.calcsize(FMT)\n\n"
+            f"    RECORD_SIZE = struct.calcsize(FMT)\n" +
+            key_lines + "\n" +
             f"    def __init__(self, {init_sig}):\n" +
             "".join([f"        self.{n} = {n}\n" for n in init_names]) + "\n" +
+            key_method +
             "    def pack(self):\n" +
             "".join([f"        {line}\n" for line in prepack_lines]) +
             "        record = struct.pack(\n"
@@ -162,15 +188,11 @@ def _csv_path_for_song(q_file: str | None) -> Path:
     return datasets / "spotify_songs.csv"
 
 
-def _import_songs_from_csv(csv_path: Path, index: str) -> dict:
-    table = "song"
-    engine = ENGINE_BUILDERS[index](table)
-
+def _iter_songs_from_csv(csv_path: Path, counters: dict):
     record_cls = Song
     params = [p.name for p in inspect.signature(record_cls.__init__).parameters.values() if p.name != "self"]
     pset = {p.lower(): p for p in params}
 
-    inserted = skipped = 0
     int_fields = {"track_popularity", "duration_ms"}
     float_fields = {"acousticness", "instrumentalness"}
 
@@ -205,102 +227,325 @@ def _import_songs_from_csv(csv_path: Path, index: str) -> dict:
                     raise ValueError("fila sin track_id")
 
                 rec = record_cls(**kwargs)
-                engine.add(rec)
-                inserted += 1
+                # Una fila que no entra en el formato binario se omite acá, antes de llegar
+                # a bulk_load / add_many (un número que no se pudo convertir queda como texto)
+                rec.pack()
+            except Exception:
+                counters["skipped"] += 1
+                continue
+            counters["inserted"] += 1
+            yield rec
+
+
+def _iter_airbnbs_from_csv(csv_path: Path, counters: dict):
+    with csv_path.open("r", encoding="utf-8", errors="ignore", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                rec = Airbnb.from_csv_row(row)
+                if not rec.id:
+                    raise ValueError("fila sin id")
+                rec.pack()  # p. ej. un precio fuera del rango de int32
             except Exception:
-                skipped += 1
+                counters["skipped"] += 1
+                continue
+            counters["inserted"] += 1
+            yield rec
+
+
+def _import_songs_from_csv(csv_path: Path, index: str, table: str = "song", page_size: int | None = None) -> dict:
+    engine = ENGINES.open(table, index, page_size)
+
+    counters = {"inserted": 0, "skipped": 0}
+    if _record_cls(index) is Airbnb:
+        songs = _iter_airbnbs_from_csv(csv_path, counters)
+    else:
+        songs = _iter_songs_from_csv(csv_path, counters)
+
+    # Tabla vacía: construcción de abajo hacia arriba en vez de un add() por fila
+    if hasattr(engine, "bulk_load") and hasattr(engine, "is_empty") and engine.is_empty():
+        engine.bulk_load(songs)
+    elif hasattr(engine, "add_many"):
+        # Los iteradores ya descartaron las filas que no se pueden empaquetar: un error acá es de E/S
+        while batch := list(islice(songs, IMPORT_BATCH)):
+            engine.add_many(batch)
+    else:
+        for rec in songs:
+            engine.add(rec)
 
     return {
         "table": table,
         "engine": index,
-        "inserted": inserted,
-        "skipped": skipped,
-        "datafile": (BPLUSTREE_DIR / "song.dat").as_posix(),
-        "indexfile": (BPLUSTREE_DIR / "song.idx").as_posix(),
+        "inserted": counters["inserted"],
+        "skipped": counters["skipped"],
+        "page_size": page_size_of(engine) if index in PAGED_ENGINES else None,
+        "datafile": getattr(engine, "datafile", (BPLUSTREE_DIR / "song.dat").as_posix()),
+        "indexfile": getattr(engine, "indexfile", (BPLUSTREE_DIR / "song.idx").as_posix()),
     }
 
 
 def _get_engine_for_table(table: str, engine_type: str = "bplustree"):
-    return ENGINE_BUILDERS[engine_type](table)
+    return ENGINES.open(table, engine_type)
 
 
-def _song_to_dict(song: Song) -> dict:
-    return {
-        "track_id": song.track_id,
-        "track_name": song.track_name,
-        "track_artist": song.track_artist,
-        "track_popularity": song.track_popularity,
-        "track_album_id": song.track_album_id,
-        "track_album_name": song.track_album_name,
-        "track_album_release_date": song.track_album_release_date,
-        "acousticness": song.acousticness,
-        "instrumentalness": song.instrumentalness,
-        "duration_ms": song.duration_ms
-    }
+def _record_cls(engine_type: str | None):
+    """Tipo de registro que guarda cada motor: el R-tree indexa Airbnb, el resto Song."""
+    return Airbnb if engine_type == "rtree" else Song
+
+
+def _song_to_dict(song: Song, columns: list[str] | None = None) -> dict:
+    # Solo se leen las columnas pedidas: con registros perezosos el resto nunca se decodifica
+    return {name: getattr(song, name) for name in (columns or song.FIELDS)}
+
 
+def _projection(columns: list[str] | None, record_cls=Song) -> list[str] | None:
+    """Columnas del SELECT normalizadas a los campos del registro; None equivale a '*'."""
+    if not columns or "*" in columns:
+        return None
+    fields = {f.lower(): f for f in record_cls.FIELDS}
+    unknown = [c for c in columns if c.lower() not in fields]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+    return [fields[c.lower()] for c in columns]
 
-def _return_all_songs(table: str = "song", engine_type: str = "bplustree") -> list[dict]:
+
+def _return_all_songs(table: str = "song", engine_type: str = "bplustree", columns: list[str] | None = None) -> list[dict]:
     engine = _get_engine_for_table(table, engine_type)
     results = []
 
-    if hasattr(engine, '_read_page'):
-        page_idx = 0
-        visited = set()
-        while page_idx >= 0 and page_idx not in visited:
-            visited.add(page_idx)
-            page = engine._read_page(page_idx)
-            for song in page.records[:page.count]:
-                results.append(_song_to_dict(song))
-            page_idx = page.next_page
-    elif hasattr(engine, 'scan'):
-        results = [_song_to_dict(s) for s in engine.scan()]
+    if hasattr(engine, 'scan'):
+        results = [_song_to_dict(s, columns) for s in engine.scan()]
     elif hasattr(engine, 'getAll'):
-        results = [_song_to_dict(s) for s in engine.getAll()]
+        results = [_song_to_dict(s, columns) for s in engine.getAll()]
 
     return results
 
 
-def _return_song(key: str, table: str = "song", engine_type: str = "bplustree") -> dict | None:
+def _encode_cursor(key: str) -> str:
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str | None) -> str | None:
+    if not cursor:
+        return None
+    return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+
+
+def _scan_page(after: str | None, limit: int, table: str = "song", engine_type: str = "bplustree",
+               columns: list[str] | None = None) -> tuple[list[dict], str | None]:
+    """Hasta `limit` filas con clave posterior a `after` (paginación por clave) y la última clave leída."""
+    engine = _get_engine_for_table(table, engine_type)
+    songs = list(islice(engine.scan(after), limit))
+    last_key = getattr(songs[-1], songs[-1].KEY) if songs else None
+    return [_song_to_dict(s, columns) for s in songs], last_key
+
+
+async def _stream_songs(table: str, engine_type: str, after: str | None, limit: int | None,
+                        columns: list[str] | None = None):
+    """NDJSON: una fila por línea, leyendo la tabla por lotes sin retener el lock entre lotes."""
+    sent = 0
+    while limit is None or sent < limit:
+        size = STREAM_BATCH if limit is None else min(STREAM_BATCH, limit - sent)
+        rows, after = await ENGINE_EXECUTOR.read(table, _scan_page, after, size, table, engine_type, columns)
+        if not rows:
+            break
+        yield "".join(json.dumps(row) + "\n" for row in rows)
+        sent += len(rows)
+
+
+def _spatial_predicate(where: dict) -> dict:
+    """Valida k (entero >= 0) o el radio (metros, finito y >= 0) antes de mandar la consulta al executor."""
+    if where["type"] == "knn":
+        k = int(where["k"])
+        if k < 0 or k != float(where["k"]):
+            raise ValueError(f"k inválido: {where['k']}")
+        return dict(where, k=k)
+    radius = float(where["radius"])
+    if not math.isfinite(radius) or radius < 0:
+        raise ValueError(f"radio inválido: {where['radius']}")
+    return dict(where, radius=radius)
+
+
+def _decode_spatial_cursor(cursor: str) -> tuple[float, int]:
+    """Cursor (distancia, rid) de una página espacial."""
+    dist, rid = json.loads(_decode_cursor(cursor))
+    if (isinstance(dist, bool) or not isinstance(dist, (int, float))
+            or isinstance(rid, bool) or not isinstance(rid, int)):
+        raise ValueError("cursor espacial inválido")
+    return float(dist), rid
+
+
+def _spatial_page(point: tuple, where: dict, after: tuple | None, limit: int | None, table: str,
+                  engine_type: str, columns: list[str] | None = None) -> tuple[list[dict], tuple | None]:
+    """
+    Filas del predicado espacial en orden de distancia (hasta `limit`), cada una con su
+    distance_m, y la posición (distancia, rid) de la última para continuar.
+    """
+    engine = _get_engine_for_table(table, engine_type)
+    if where["type"] == "knn":
+        hits = (h for h in islice(engine.nearest(point), where["k"])
+                if after is None or (h[0], h[1]) > after)
+    else:
+        hits = engine.nearest(point, where["radius"], after)
+
+    rows, last = [], None
+    for dist, rid, record in islice(hits, limit):
+        rows.append(dict(_song_to_dict(record, columns), distance_m=dist))
+        last = (dist, rid)
+    return rows, last
+
+
+async def _stream_spatial(point: tuple, where: dict, table: str, engine_type: str, after: tuple | None,
+                          limit: int | None, columns: list[str] | None = None):
+    """NDJSON en orden de distancia, por lotes; cada lote retoma la búsqueda desde (distancia, rid)."""
+    sent = 0
+    while limit is None or sent < limit:
+        size = STREAM_BATCH if limit is None else min(STREAM_BATCH, limit - sent)
+        rows, after = await ENGINE_EXECUTOR.read(
+            table, _spatial_page, point, where, after, size, table, engine_type, columns
+        )
+        if not rows:
+            break
+        yield "".join(json.dumps(row) + "\n" for row in rows)
+        sent += len(rows)
+        if len(rows) < size:
+            break
+
+
+def _return_song(key: str, table: str = "song", engine_type: str = "bplustree",
+                 columns: list[str] | None = None) -> dict | None:
     engine = _get_engine_for_table(table, engine_type)
     song = engine.search(key)
-    return _song_to_dict(song) if song else None
+    return _song_to_dict(song, columns) if song else None
 
 
-def _return_range_search(begin: str, end: str, table: str = "song", engine_type: str = "bplustree") -> list[dict]:
+def _return_range_search(begin: str, end: str, table: str = "song", engine_type: str = "bplustree",
+                         columns: list[str] | None = None) -> list[dict]:
     engine = _get_engine_for_table(table, engine_type)
 
     if hasattr(engine, 'rangeSearch'):
         songs = engine.rangeSearch(begin, end)
-        return [_song_to_dict(s) for s in songs]
     else:
-        all_songs = _return_all_songs(table, engine_type)
-        return [s for s in all_songs if begin <= s["track_id"] <= end]
+        songs = [s for s in engine.scan() if begin <= getattr(s, s.KEY) <= end]
+    return [_song_to_dict(s, columns) for s in songs]
+
+
+def _column_value_type(record_cls, column: str):
+    """Tipo de valor de una columna escalar numérica; None si no admite índice secundario."""
+    # Un campo final con más formatos que nombres (coordinates en Airbnb) no es escalar
+    if len(record_cls.FIELD_FMTS) > len(record_cls.FIELDS) and column == record_cls.FIELDS[-1]:
+        return None
+    return value_type_for(dict(zip(record_cls.FIELDS, record_cls.FIELD_FMTS)).get(column))
+
+
+def _coerce(value, value_type):
+    if value_type == VALUE_INT:
+        return int(value)
+    if value_type == VALUE_FLOAT:
+        return float(value)
+    return str(value)
+
+
+def _return_by_column(column: str, low, high, table: str = "song", engine_type: str = "bplustree",
+                      columns: list[str] | None = None, after: tuple | None = None,
+                      limit: int | None = None) -> tuple[list[dict], str, list | None]:
+    """
+    Filas con low <= column <= high sobre una columna que no es la clave: por el índice
+    secundario si existe, si no con un recorrido completo. Lee hasta `limit` filas
+    posteriores a after=(valor, clave) y devuelve también el plan usado y esa posición
+    para la última fila.
+    """
+    engine = _get_engine_for_table(table, engine_type)
+    if column in getattr(engine, "indexes", {}):
+        # Orden (valor, clave): se continúa desde la entrada del índice
+        records, plan = engine.index_range(column, low, high, after), "index_scan"
+    else:
+        # Orden de clave: alcanza con la clave del cursor
+        records = (r for r in engine.scan(after[1] if after else None) if low <= getattr(r, column) <= high)
+        plan = "full_scan"
+    records = list(islice(records, limit))
+    last = [getattr(records[-1], column), getattr(records[-1], records[-1].KEY)] if records else None
+    return [_song_to_dict(r, columns) for r in records], plan, last
+
+
+def _checkpoint(table: str, engine_type: str):
+    """
+    Baja a disco las páginas sucias de esta tabla y de sus índices secundarios. Corre bajo
+    el lock de escritura de la tabla: las de otras tablas pueden estar a mitad de un cambio.
+    """
+    engine = _get_engine_for_table(table, engine_type)
+    paths = [getattr(engine, "datafile", None), getattr(engine, "indexfile", None)]
+    paths += [index.path for index in getattr(engine, "indexes", {}).values()]
+    for path in paths:
+        if path:
+            BUFFER_POOL.flush(path)
+
+
+def _create_index(column: str, value_type: int, table: str, engine_type: str) -> dict:
+    engine = ENGINES.create_index(table, engine_type, column, value_type)
+    _checkpoint(table, engine_type)
+    return engine.indexes[column].stats()
 
 
 def _insert_song(values: list, table: str = "song", engine_type: str = "bplustree") -> bool:
     engine = _get_engine_for_table(table, engine_type)
-    song = Song(*values)
+    song = _record_cls(engine_type)(*values)
     engine.add(song)
     return True
 
 
+def _insert_songs(rows: list, table: str = "song", engine_type: str = "bplustree") -> int:
+    engine = _get_engine_for_table(table, engine_type)
+    inserted = 0
+    if hasattr(engine, "add_many"):
+        songs = [_record_cls(engine_type)(*row) for row in rows]
+        engine.add_many(songs)
+        inserted = len(songs)
+    else:
+        for row in rows:
+            if _insert_song(row, table, engine_type):
+                inserted += 1
+    _checkpoint(table, engine_type)
+    return inserted
+
+
 def _delete_song(key: str, table: str = "song", engine_type: str = "bplustree") -> bool:
     engine = _get_engine_for_table(table, engine_type)
-    return engine.remove(key)
+    deleted = engine.remove(key)
+    _checkpoint(table, engine_type)
+    return deleted
+
+
+def _import_and_flush(csv_path: Path, index: str, table: str = "song", page_size: int | None = None) -> dict:
+    stats = _import_songs_from_csv(csv_path, index, table, page_size)
+    _checkpoint(table, index)
+    return stats
+
+
+@router.get("/stats", response_class=JSONResponse)
+async def stats():
+    return JSONResponse(status_code=200, content={
+        "buffer_pool": BUFFER_POOL.stats(),
+        "executor": ENGINE_EXECUTOR.stats(),
+        "engines": ENGINES.stats(),
+    })
 
 
 @router.post("/", response_class=JSONResponse)
-async def run_query(query: ParsedQuery):
+async def run_query(query: ParsedQuery, stream: bool = False):
     op = query.op
     q = dict(query)
 
     if op == 0:  # CREATE TABLE
         schema = dict(query)
+        page_size = (q.get("index") or {}).get("page_size")
+        if page_size:
+            try:
+                ENGINES.set_page_size(str(schema["table"]), page_size)
+            except ValueError as e:
+                return JSONResponse(status_code=400, content={"message": str(e)})
         record = generate_record(schema)
         filename = str(schema["table"]).lower() + ".py"
-        base_dir = Path(__file__).resolve().parents[2]
-        out_dir = base_dir / "data" / "records"
-        out_path = out_dir / filename
+        out_path = GENERATED_RECORDS_DIR / filename
         out_path.write_text(record, encoding="utf-8")
 
         return JSONResponse(status_code=200, content={"message": f'Created record: {schema["table"]}'})
@@ -308,11 +553,54 @@ async def run_query(query: ParsedQuery):
     elif op == 1:  # SELECT
         table = query.table or "song"
         engine_type = query.idx
+        try:
+            columns = _projection(query.columns, _record_cls(engine_type))
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
+
+        where = q.get("where") or {}
+        record_cls = _record_cls(engine_type)
+        field = where.get("field")
+        if where.get("type") in ("eq", "between") and field and field.lower() != record_cls.KEY.lower():
+            # Predicado sobre una columna que no es la clave: índice secundario o recorrido completo
+            fields = {f.lower(): f for f in record_cls.FIELDS}
+            column = fields.get(field.lower())
+            if column is None:
+                return JSONResponse(status_code=400, content={"message": f"Unknown column: {field}"})
+            value_type = _column_value_type(record_cls, column)
+            try:
+                if where["type"] == "eq":
+                    low = high = _coerce(where["value"], value_type)
+                else:
+                    low, high = _coerce(where["from"], value_type), _coerce(where["to"], value_type)
+            except (ValueError, TypeError):
+                return JSONResponse(status_code=400, content={"message": f"Invalid value for {column}"})
+            try:
+                after = json.loads(_decode_cursor(query.after)) if query.after else None
+                if after is not None:
+                    value, key = after
+                    if not isinstance(key, str):
+                        raise TypeError(key)
+                    after = (_coerce(value, value_type), key)
+            except (ValueError, TypeError):
+                return JSONResponse(status_code=400, content={"message": "Invalid cursor"})
+
+            rows, plan, last = await ENGINE_EXECUTOR.read(
+                table, _return_by_column, column, low, high, table, engine_type, columns, after, query.limit
+            )
+            has_more = query.limit is not None and len(rows) == query.limit and query.limit > 0
+            return JSONResponse(status_code=200, content={
+                "result": rows,
+                "count": len(rows),
+                "engine": engine_type,
+                "plan": plan,
+                "next_cursor": _encode_cursor(json.dumps(last)) if has_more else None
+            })
 
         if q.get("where"):
             if q["where"]["type"] == "eq":
                 key = str(q["where"]["value"])
-                song = _return_song(key, table, engine_type)
+                song = await ENGINE_EXECUTOR.read(table, _return_song, key, table, engine_type, columns)
 
                 if song:
                     return JSONResponse(status_code=200, content={
@@ -331,15 +619,75 @@ async def run_query(query: ParsedQuery):
             elif q["where"]["type"] == "between":
                 begin = str(q["where"]["from"])
                 end = str(q["where"]["to"])
-                songs = _return_range_search(begin, end, table, engine_type)
+                songs = await ENGINE_EXECUTOR.read(
+                    table, _return_range_search, begin, end, table, engine_type, columns
+                )
 
                 return JSONResponse(status_code=200, content={
                     "result": songs,
                     "count": len(songs),
                     "engine": engine_type
                 })
+
+            elif q["where"]["type"] in ("in_circle", "knn"):
+                where = q["where"]
+                if _record_cls(engine_type) is not Airbnb:
+                    return JSONResponse(status_code=400, content={
+                        "message": "Spatial predicates require the rtree index"
+                    })
+                try:
+                    point = parse_coordinates(where["point"])
+                    where = _spatial_predicate(where)
+                    after = _decode_spatial_cursor(query.after) if query.after else None
+                except (ValueError, TypeError, KeyError):
+                    return JSONResponse(status_code=400, content={"message": "Invalid point, radius, k or cursor"})
+
+                if stream:
+                    return StreamingResponse(
+                        _stream_spatial(point, where, table, engine_type, after, query.limit, columns),
+                        media_type="application/x-ndjson"
+                    )
+
+                rows, last = await ENGINE_EXECUTOR.read(
+                    table, _spatial_page, point, where, after, query.limit, table, engine_type, columns
+                )
+                has_more = query.limit is not None and len(rows) == query.limit and query.limit > 0
+                return JSONResponse(status_code=200, content={
+                    "result": rows,
+                    "count": len(rows),
+                    "engine": engine_type,
+                    "next_cursor": _encode_cursor(json.dumps(last)) if has_more else None
+                })
+
+            else:
+                return JSONResponse(status_code=400, content={
+                    "message": f"Unsupported WHERE: {q['where']['type']}"
+                })
         else:
-            songs = _return_all_songs(table, engine_type)
+            try:
+                after = _decode_cursor(query.after)
+            except ValueError:
+                return JSONResponse(status_code=400, content={"message": "Invalid cursor"})
+
+            if stream:
+                return StreamingResponse(
+                    _stream_songs(table, engine_type, after, query.limit, columns),
+                    media_type="application/x-ndjson"
+                )
+
+            if query.limit is not None:
+                songs, last_key = await ENGINE_EXECUTOR.read(
+                    table, _scan_page, after, query.limit, table, engine_type, columns
+                )
+                has_more = len(songs) == query.limit and query.limit > 0
+                return JSONResponse(status_code=200, content={
+                    "result": songs,
+                    "count": len(songs),
+                    "engine": engine_type,
+                    "next_cursor": _encode_cursor(last_key) if has_more else None
+                })
+
+            songs = await ENGINE_EXECUTOR.read(table, _return_all_songs, table, engine_type, columns)
             return JSONResponse(status_code=200, content={
                 "result": songs,
                 "count": len(songs),
@@ -351,10 +699,7 @@ async def run_query(query: ParsedQuery):
         engine_type = query.idx
         values = q.get("values", [])
 
-        inserted = 0
-        for row in values:
-            if _insert_song(row, table, engine_type):
-                inserted += 1
+        inserted = await ENGINE_EXECUTOR.write(table, _insert_songs, values, table, engine_type)
 
         return JSONResponse(status_code=200, content={
             "message": f"Inserted {inserted} record(s)",
@@ -364,9 +709,21 @@ async def run_query(query: ParsedQuery):
         })
 
     elif op == 3:  # IMPORT
-        index = q.get("index", {})
+        table = (query.table or "song").lower()
+        index = q.get("index") or {}
+        engine_type = str(index.get("type", "bplustree"))
+        page_size = index.get("page_size")
+        if page_size and engine_type not in PAGED_ENGINES:
+            return JSONResponse(status_code=400, content={
+                "message": f"PAGE_SIZE is only supported by {', '.join(sorted(PAGED_ENGINES))}"
+            })
         csv_path = _csv_path_for_song(q.get("file"))
-        stats = _import_songs_from_csv(csv_path, str(index.get("type", "bplustree")))
+        try:
+            stats = await ENGINE_EXECUTOR.write(
+                table, _import_and_flush, csv_path, engine_type, table, page_size
+            )
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
 
         return JSONResponse(status_code=200, content=stats)
 
@@ -381,7 +738,7 @@ async def run_query(query: ParsedQuery):
             })
 
         key = str(where_dict["value"])
-        success = _delete_song(key, table, engine_type)
+        success = await ENGINE_EXECUTOR.write(table, _delete_song, key, table, engine_type)
         status = 200 if success else 404
 
         return JSONResponse(status_code=status, content={
@@ -390,6 +747,36 @@ async def run_query(query: ParsedQuery):
             "engine": engine_type
         })
 
+    elif op == 5:  # CREATE INDEX
+        table = (query.table or "song").lower()
+        engine_type = query.idx or "bplustree"
+        index = q.get("index") or {}
+        if index.get("type", "bplustree") != "bplustree":
+            return JSONResponse(status_code=400, content={
+                "message": "Secondary indexes are B+ trees: use USING bplustree"
+            })
+
+        record_cls = _record_cls(engine_type)
+        column = {f.lower(): f for f in record_cls.FIELDS}.get(str(index.get("column", "")).lower())
+        value_type = _column_value_type(record_cls, column) if column else None
+        if column is None or column == record_cls.KEY or value_type is None:
+            return JSONResponse(status_code=400, content={
+                "message": f"Column {index.get('column')} cannot have a secondary index"
+            })
+
+        try:
+            stats = await ENGINE_EXECUTOR.write(table, _create_index, column, value_type, table, engine_type)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"message": str(e)})
+
+        return JSONResponse(status_code=200, content={
+            "message": f"Created index on {table}({column})",
+            "table": table,
+            "column": column,
+            "engine": engine_type,
+            **stats
+        })
+
     else:
         return JSONResponse(status_code=400, content={
             "message": f"Unknown operation: {op}"
@@ -101,9 +101,9 @@ def _parse_point_tuple(s: str):
     return s  # si no es "(a,b)", devuélvelo crudo
 
 def parse_create(sql: str) -> Dict[str, Any]:
-    # CREATE TABLE <tabla> (<cols>)
+    # CREATE TABLE <tabla> (<cols>) [WITH PAGE_SIZE <bytes>]
     m = re.match(
-        r"^\s*CREATE\s+TABLE\s+([A-Za-z_][A-Za-z0-9_]*)\s*\((.*)\)\s*$",
+        r"^\s*CREATE\s+TABLE\s+([A-Za-z_][A-Za-z0-9_]*)\s*\((.*)\)(?:\s+WITH\s+PAGE_SIZE\s*=?\s*(\d+))?\s*$",
         sql, flags=re.IGNORECASE | re.DOTALL
     )
     if not m:
@@ -120,22 +120,50 @@ def parse_create(sql: str) -> Dict[str, Any]:
             continue
         name = tokens[0]
         col_type = tokens[1]
-        columns.append({
+        column = {
             "name": name.lower(),
             "type": normalize_type(col_type.lower()),
-        })
+        }
+        # <col> <tipo> KEY marca la clave primaria
+        if any(t.upper() == "KEY" for t in tokens[2:]):
+            column["key"] = True
+        columns.append(column)
 
-    return {
+    out: Dict[str, Any] = {
         "op": 0,
         "table": table_name,
         "columns": columns,
     }
+    if m.group(3):
+        out["index"] = {"page_size": int(m.group(3))}
+    return out
+
+def parse_create_index(sql: str) -> Dict[str, Any]:
+    # CREATE INDEX [nombre] ON <tabla> [USING <tipo>] (<columna>)
+    m = re.match(
+        r"^\s*CREATE\s+INDEX\s+(?:([A-Za-z_][A-Za-z0-9_]*)\s+)?ON\s+([A-Za-z_][A-Za-z0-9_]*)"
+        r"(?:\s+USING\s+([A-Za-z_][A-Za-z0-9_]*))?\s*\(\s*([A-Za-z_][A-Za-z0-9_]*)\s*\)\s*$",
+        sql, flags=re.IGNORECASE | re.DOTALL
+    )
+    if not m:
+        raise ValueError("CREATE INDEX inválido")
+
+    name, table, idx_type, column = m.group(1), m.group(2), m.group(3), m.group(4)
+    index: Dict[str, Any] = {"type": (idx_type or "bplustree").lower(), "column": column}
+    if name:
+        index["name"] = name
+    return {
+        "op": 5,
+        "table": table,
+        "index": index,
+    }
 
 def parse_select(sql: str) -> Dict[str, Any]:
-    # SELECT cols FROM table [WHERE cond]
+    # SELECT cols FROM table [WHERE cond] [LIMIT n [AFTER cursor]]
     m = re.match(
         r"^\s*SELECT\s+(?P<cols>.+?)\s+FROM\s+(?P<table>[A-Za-z_][A-Za-z0-9_]*)"
-        r"(?:\s+WHERE\s+(?P<cond>.+))?$",
+        r"(?:\s+WHERE\s+(?P<cond>.+?))?"
+        r"(?:\s+LIMIT\s+(?P<limit>\d+)(?:\s+AFTER\s+(?P<after>\S+))?)?\s*$",
         sql, flags=re.IGNORECASE | re.DOTALL
     )
     if not m:
@@ -151,6 +179,10 @@ def parse_select(sql: str) -> Dict[str, Any]:
         "columns": columns,
         "table": table,
     }
+    if m.group("limit"):
+        parsed["limit"] = int(m.group("limit"))
+    if m.group("after"):
+        parsed["after"] = m.group("after")
 
     if not cond:
         return parsed
@@ -190,12 +222,17 @@ def parse_select(sql: str) -> Dict[str, Any]:
             point_raw = parts[0].strip()
             radius_raw = parts[1].strip()
             point = _parse_point_tuple(point_raw)
+            # IN (punto, k NEAREST): los k más cercanos
+            m_knn = re.fullmatch(r"(\d+)\s+NEAREST", radius_raw, flags=re.IGNORECASE)
+            if m_knn:
+                parsed["where"] = {"type": "knn", "field": field, "point": point, "k": int(m_knn.group(1))}
+                return parsed
             radius = _parse_literal(radius_raw)
             parsed["where"] = {
                 "type": "in_circle",
                 "field": field,
                 "point": point,  # p.ej. (-12.05, -77.04)
-                "radius": radius  # p.ej. 3.5
+                "radius": radius  # en metros, p.ej. 500
             }
             return parsed
 
@@ -271,14 +308,16 @@ def parse_insert(sql: str) -> Dict[str, Any]:
     }
 
 def parse_import(sql: str) -> Dict[str, Any]:
+    # IMPORT INTO <tabla> FROM FILE '<csv>' [USING INDEX <tipo>(<col>)] [WITH PAGE_SIZE <bytes>]
     m = re.match(
-        r'^\s*IMPORT\s+INTO\s+([A-Za-z_][A-Za-z0-9_]*)\s+FROM\s+FILE\s+["\'](.+?)["\'](?:\s+USING\s+INDEX\s+([A-Za-z_][A-Za-z0-9_]*)\s*\(\s*([A-Za-z_][A-Za-z0-9_]*)\s*\))?\s*$',
+        r'^\s*IMPORT\s+INTO\s+([A-Za-z_][A-Za-z0-9_]*)\s+FROM\s+FILE\s+["\'](.+?)["\'](?:\s+USING\s+INDEX\s+([A-Za-z_][A-Za-z0-9_]*)\s*\(\s*([A-Za-z_][A-Za-z0-9_]*)\s*\))?'
+        r'(?:\s+WITH\s+PAGE_SIZE\s*=?\s*(\d+))?\s*$',
         sql, flags=re.IGNORECASE | re.DOTALL
     )
     if not m:
         raise ValueError("IMPORT inválido")
 
-    table, filepath, idx_type, idx_col = m.group(1), m.group(2), m.group(3), m.group(4)
+    table, filepath, idx_type, idx_col, page_size = m.group(1), m.group(2), m.group(3), m.group(4), m.group(5)
     out: Dict[str, Any] = {
         "op": 3,
         "table": table,
@@ -286,6 +325,8 @@ def parse_import(sql: str) -> Dict[str, Any]:
     }
     if idx_type and idx_col:
         out["index"] = {"type": idx_type, "column": idx_col}
+    if page_size:
+        out.setdefault("index", {})["page_size"] = int(page_size)
     return out
 
 def parse_delete(sql: str) -> Dict[str, Any]:
@@ -322,7 +363,9 @@ async def parse_sql_endpoint(query: Query):
     try:
         head = sql.split(None, 1)[0].lower()
 
-        if head == "create":
+        if head == "create" and re.match(r"^\s*CREATE\s+INDEX\b", sql, flags=re.IGNORECASE):
+            result = parse_create_index(sql)
+        elif head == "create":
             result = parse_create(sql)
         elif head == "select":
             result = parse_select(sql)
@@ -13,6 +13,19 @@ ISAM_DIR      = TABLES_ROOT / "isam"
 RTREE_DIR     = TABLES_ROOT / "rtree"
 EXTHASH_DIR   = TABLES_ROOT / "exthashing"
 SEQFILE_DIR = TABLES_ROOT / "seqfile"
+SECONDARY_DIR = TABLES_ROOT / "secondary"
 
-for p in (BPLUSTREE_DIR, ISAM_DIR, RTREE_DIR, EXTHASH_DIR, SEQFILE_DIR):
+# Módulos de registro que genera CREATE TABLE (aparte de los escritos a mano en app/data/records)
+GENERATED_RECORDS_DIR = DATA_ROOT / "generated_records"
+
+for p in (BPLUSTREE_DIR, ISAM_DIR, RTREE_DIR, EXTHASH_DIR, SEQFILE_DIR, SECONDARY_DIR, GENERATED_RECORDS_DIR):
     p.mkdir(parents=True, exist_ok=True)
+
+# Presupuesto en bytes del buffer pool compartido por los motores
+BUFFER_POOL_BYTES = int(os.getenv("BUFFER_POOL_BYTES", 64 * 1024 * 1024))
+
+# Hilos que ejecutan las operaciones de los motores fuera del event loop
+ENGINE_WORKERS = int(os.getenv("ENGINE_WORKERS", 8))
+
+# Tasa objetivo de falsos positivos de los filtros de Bloom por cadena de buckets (hashing extensible)
+BLOOM_FP_RATE = float(os.getenv("BLOOM_FP_RATE", 0.01))
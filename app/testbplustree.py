@@ -0,0 +1,132 @@
+#Creacion de .py para pruebas de eliminación del B+ Tree
+import os
+import random
+
+from app.data.records.song import Song
+from app.engines.bplustree import BPlusTreeFile, MIN_FILL, ROOT
+
+# --- Constantes ---
+DATA_FILE = 'songs_bplustree_test.dat'
+INDEX_FILE = 'songs_bplustree_test.idx'
+# Nodos chicos para que el árbol llegue a altura 3 con pocos miles de registros
+NODE_SIZE = 160
+TOTAL_SONGS = 4000
+DELETED_SONGS = 3600
+CHECK_EVERY = 400
+
+class SmallNodeTree(BPlusTreeFile):
+    """B+ Tree con nodos de NODE_SIZE bytes que cuenta las rotaciones entre nodos no raíz."""
+
+    def __init__(self, *args, **kwargs):
+        self.rotations = 0
+        super().__init__(*args, **kwargs)
+
+    def _new_meta(self, page_size):
+        meta = super()._new_meta(page_size)
+        meta.node_size = NODE_SIZE
+        return meta
+
+    def _rebalance_node(self, path, node_pos, node):
+        underfull = node_pos != ROOT and node.encoded_size() < int(self.node_size * MIN_FILL)
+        if underfull:
+            parent_pos, child_idx = path[-1]
+            parent = self._read_node(parent_pos)
+            sep_idx = child_idx - 1 if child_idx > 0 else 0
+            siblings = parent.children[sep_idx:sep_idx + 2]
+        super()._rebalance_node(path, node_pos, node)
+        # La fusión saca al hermano derecho del padre; la rotación deja a los dos hermanos en su lugar
+        if underfull and parent.count > 0:
+            after = self._read_node(parent_pos).children
+            if any(after[i:i + 2] == siblings for i in range(len(after) - 1)):
+                self.rotations += 1
+
+def make_song(i):
+    return Song(f"track{i:06d}", f"Song {i}", 'Artist', random.randint(0, 100), 'album', 'Album',
+                '2020-01-01', random.random(), random.random(), random.randint(60_000, 400_000))
+
+def check_scan(tree, live):
+    found = [s.track_id for s in tree.scan()]
+    assert found == sorted(live), "Error: scan() no devuelve las claves vivas en orden."
+
+# --- Funciones de Prueba ---
+
+def test_delete_rebalances():
+    """Borrados aleatorios en un árbol de altura >= 3: scan() ordenado, búsquedas y rotaciones no raíz."""
+    print("\n--- INICIANDO PRUEBA: Eliminación con Rebalanceo ---")
+
+    tree = SmallNodeTree(DATA_FILE, INDEX_FILE)
+    songs = [make_song(i) for i in range(TOTAL_SONGS)]
+    random.shuffle(songs)
+    tree.add_many(songs)
+    live = {s.track_id for s in songs}
+    height = tree.stats()["height"]
+    assert height >= 3, f"Error: El árbol quedó con altura {height}, se esperaba al menos 3."
+    check_scan(tree, live)
+    print(f"Árbol construido: {TOTAL_SONGS} canciones, altura {height}.")
+
+    order = sorted(live)
+    random.shuffle(order)
+    for i, key in enumerate(order[:DELETED_SONGS], 1):
+        assert tree.remove(key), f"Error: remove() no encontró {key}."
+        live.discard(key)
+        if i % CHECK_EVERY == 0:
+            check_scan(tree, live)
+    assert not tree.remove(order[0]), "Error: Se eliminó dos veces la misma clave."
+
+    for key in random.sample(sorted(live), 100):
+        assert tree.search(key).track_id == key, f"Error: No se encontró {key} después de los borrados."
+    for key in order[:100]:
+        assert tree.search(key) is None, f"Error: La clave borrada {key} sigue en el árbol."
+    assert tree.rotations > 0, "Error: Ningún borrado rotó entradas entre nodos no raíz."
+
+    stats = tree.stats()
+    assert stats["free_pages"] > 0 and stats["free_nodes"] > 0, "Error: Los borrados no liberaron páginas ni nodos."
+    print(f"Éxito: {DELETED_SONGS} borrados, {tree.rotations} rotaciones, altura final {stats['height']}, "
+          f"{stats['free_pages']} páginas y {stats['free_nodes']} nodos libres.")
+    tree.close()
+    print("--- PRUEBA COMPLETADA ---")
+
+def test_free_lists_reused():
+    """Al reabrir, las listas libres persisten y las inserciones reusan páginas y nodos sin crecer los archivos."""
+    print("\n--- INICIANDO PRUEBA: Reuso de Listas Libres ---")
+
+    tree = SmallNodeTree(DATA_FILE, INDEX_FILE)
+    live = {s.track_id for s in tree.scan()}
+    before = tree.stats()
+    assert before["free_pages"] > 0 and before["free_nodes"] > 0, "Error: Las listas libres no persistieron."
+    data_size, index_size = os.path.getsize(DATA_FILE), os.path.getsize(INDEX_FILE)
+
+    songs = [make_song(i) for i in range(TOTAL_SONGS) if f"track{i:06d}" not in live][:1000]
+    for song in songs[:500]:
+        tree.add(song)
+    tree.add_many(songs[500:])
+    live |= {s.track_id for s in songs}
+    check_scan(tree, live)
+
+    after = tree.stats()
+    tree.flush()
+    assert after["free_pages"] < before["free_pages"], "Error: Las inserciones no reusaron páginas libres."
+    assert after["free_nodes"] < before["free_nodes"], "Error: Las inserciones no reusaron nodos libres."
+    assert os.path.getsize(DATA_FILE) == data_size, "Error: El archivo de datos creció teniendo páginas libres."
+    assert os.path.getsize(INDEX_FILE) == index_size, "Error: El índice creció teniendo nodos libres."
+    print(f"Éxito: {len(songs)} reinserciones; páginas libres {before['free_pages']} -> {after['free_pages']}, "
+          f"nodos libres {before['free_nodes']} -> {after['free_nodes']}.")
+    tree.close()
+    print("--- PRUEBA COMPLETADA ---")
+
+
+# --- Ejecución Principal ---
+
+if __name__ == "__main__":
+    files_to_clean = [DATA_FILE, INDEX_FILE]
+    for f in files_to_clean:
+        if os.path.exists(f):
+            os.remove(f)
+
+    test_delete_rebalances()
+    test_free_lists_reused()
+
+    print("\nLimpiando archivos de prueba...")
+    for f in files_to_clean:
+        if os.path.exists(f):
+            os.remove(f)
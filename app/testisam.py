@@ -0,0 +1,107 @@
+#Creacion de .py para pruebas del ISAM
+import os
+import csv
+import random
+
+from app.data.records.song import Song
+from app.engines.isam import ISAMFile
+from app.engines.bufferpool import BUFFER_POOL
+
+# --- Constantes ---
+CSV_FILE = 'app/data/datasets/spotify_songs.csv'
+DATA_FILE = 'songs_isam_test.dat'
+INDEX_FILE = 'songs_isam_test.idx'
+
+# --- Función Auxiliar para Cargar Datos ---
+
+def load_songs_from_csv(filename, limit=None):
+    songs = []
+    print(f"Cargando hasta {limit or 'todos los'} registros desde {filename}...")
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if limit and len(songs) >= limit:
+                    break
+                try:
+                    songs.append(Song(
+                        track_id=row['track_id'], track_name=row.get('track_name', ''),
+                        track_artist=row.get('track_artist', ''), track_popularity=int(row.get('track_popularity', 0)),
+                        track_album_id=row.get('track_album_id', ''), track_album_name=row.get('track_album_name', ''),
+                        track_album_release_date=row.get('track_album_release_date', ''),
+                        acousticness=float(row.get('acousticness', 0.0)),
+                        instrumentalness=float(row.get('instrumentalness', 0.0)),
+                        duration_ms=int(row.get('duration_ms', 0))
+                    ))
+                except (ValueError, KeyError, TypeError):
+                    pass
+    except FileNotFoundError:
+        print(f"Error: El archivo '{filename}' no fue encontrado.")
+        return None
+    print(f"Carga completa. {len(songs)} registros cargados.")
+    return songs
+
+# --- Funciones de Prueba ---
+
+def test_bulk_load_search_and_range():
+    """Construcción del índice estático y comparación de búsquedas contra fuerza bruta."""
+    print("\n--- INICIANDO PRUEBA: Carga Masiva, Búsqueda y Rango ---")
+
+    songs = load_songs_from_csv(CSV_FILE)
+    if not songs: return
+
+    isam = ISAMFile(DATA_FILE, INDEX_FILE)
+    isam.bulk_load(songs)
+    keys = sorted({s.track_id for s in songs})
+    print(f"Estadísticas tras la carga: {isam.stats()}")
+
+    for key in random.sample(keys, min(100, len(keys))):
+        assert isam.search(key) is not None, f"Error: No se encontró la clave '{key}'."
+
+    begin, end = sorted(random.sample(keys, 2))
+    found = [s.track_id for s in isam.rangeSearch(begin, end)]
+    assert found == [k for k in keys if begin <= k <= end], "Error: La búsqueda por rango no coincide con la fuerza bruta."
+    print(f"Éxito: {len(found)} canciones en el rango ['{begin}', '{end}'].")
+    isam.close()
+    print("--- PRUEBA COMPLETADA ---")
+
+def test_overflow_remove_and_reopen():
+    """Inserciones que desbordan una página primaria, eliminación y reapertura."""
+    print("\n--- INICIANDO PRUEBA: Overflow, Eliminación y Reapertura ---")
+
+    isam = ISAMFile(DATA_FILE, INDEX_FILE)
+    before = isam.stats()["overflow_pages"]
+    nuevos = [Song(f"zzzz{i:04d}", 'Song', 'Artist', 50, 'album', 'Album', '2020-01-01', 0.1, 0.2, 1000)
+              for i in range(2 * isam.m)]
+    for song in nuevos:
+        isam.add(song)
+    assert isam.stats()["overflow_pages"] > before, "Error: Las inserciones no generaron páginas de overflow."
+    isam.close()
+
+    BUFFER_POOL.discard(DATA_FILE)
+    reopened = ISAMFile(DATA_FILE, INDEX_FILE)
+    found = [s.track_id for s in reopened.rangeSearch('zzzz0000', 'zzzz9999')]
+    assert found == [s.track_id for s in nuevos], "Error: Las cadenas de overflow no sobrevivieron a la reapertura."
+
+    for song in nuevos:
+        assert reopened.remove(song.track_id), "Error: El método remove() devolvió False."
+    assert reopened.search(nuevos[0].track_id) is None, "Error: El registro fue encontrado después de ser eliminado."
+    reopened.close()
+    print("Éxito: Las cadenas de overflow se recorren, persisten y se vacían correctamente.")
+    print("--- PRUEBA COMPLETADA ---")
+
+
+# --- Ejecución Principal ---
+
+if __name__ == "__main__":
+    files_to_clean = [DATA_FILE, INDEX_FILE]
+    for f in files_to_clean:
+        if os.path.exists(f):
+            os.remove(f)
+
+    test_bulk_load_search_and_range()
+    test_overflow_remove_and_reopen()
+
+    print("\nLimpiando archivos de prueba...")
+    for f in files_to_clean:
+        if os.path.exists(f):
+            os.remove(f)
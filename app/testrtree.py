@@ -0,0 +1,98 @@
+#Creacion de .py para pruebas del R-tree en disco
+import os
+import csv
+
+from app.data.records.airbnb import Airbnb
+from app.engines.rtreefile import RTreeFile
+from app.engines.bufferpool import BUFFER_POOL
+
+# --- Constantes ---
+CSV_FILE = 'app/data/datasets/AB_NYC_2019.csv'
+DATA_FILE = 'airbnb_rtree_test.dat'
+INDEX_FILE = 'airbnb_rtree_test.idx'
+
+# --- Función Auxiliar para Cargar Datos ---
+
+def load_airbnbs_from_csv(filename, limit=None):
+    records = []
+    print(f"Cargando hasta {limit or 'todos los'} registros desde {filename}...")
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if limit and len(records) >= limit:
+                    break
+                try:
+                    records.append(Airbnb.from_csv_row(row))
+                except (ValueError, KeyError, TypeError):
+                    pass
+    except FileNotFoundError:
+        print(f"Error: El archivo '{filename}' no fue encontrado.")
+        return None
+    print(f"Carga completa. {len(records)} registros cargados.")
+    return records
+
+def in_box(record, box):
+    lat, lon = record.coordinates
+    return box[0] <= lat <= box[2] and box[1] <= lon <= box[3]
+
+# --- Funciones de Prueba ---
+
+def test_bulk_load_and_box_search():
+    """Carga masiva STR y comparación de búsquedas por caja contra fuerza bruta."""
+    print("\n--- INICIANDO PRUEBA: Carga Masiva STR y Búsqueda por Caja ---")
+
+    records = load_airbnbs_from_csv(CSV_FILE)
+    if not records: return
+
+    tree = RTreeFile(DATA_FILE, INDEX_FILE)
+    tree.bulk_load(records)
+    print(f"Se cargaron {tree.meta.count} registros; altura del árbol: {tree.meta.height}.")
+
+    williamsburg = (40.705, -73.965, 40.725, -73.945)
+    found = sorted(r.id for r in tree.box_search(*williamsburg))
+    expected = sorted({r.id for r in records if in_box(r, williamsburg)})
+    assert found == expected, "Error: La búsqueda por caja no coincide con la fuerza bruta."
+    print(f"Éxito: {len(found)} listings en la caja de Williamsburg.")
+    print("--- PRUEBA COMPLETADA ---")
+
+def test_insert_remove_and_reopen():
+    """Inserción y eliminación dinámicas, y reapertura sin volver a leer el CSV."""
+    print("\n--- INICIANDO PRUEBA: Inserción, Eliminación y Reapertura ---")
+
+    tree = RTreeFile(DATA_FILE, INDEX_FILE)
+    nuevo = Airbnb('99999999', 'Apartment', 'Midtown', 150, (40.7549, -73.9840))
+    tree.add(nuevo)
+    near_times_square = (40.754, -73.985, 40.756, -73.983)
+    assert '99999999' in [r.id for r in tree.box_search(*near_times_square)], "Error: El registro insertado no aparece en la caja."
+    tree.close()
+
+    BUFFER_POOL.discard(DATA_FILE)
+    BUFFER_POOL.discard(INDEX_FILE)
+    reopened = RTreeFile(DATA_FILE, INDEX_FILE)
+    found = reopened.search('99999999')
+    assert found is not None and found.name == 'Apartment', "Error: El registro no sobrevivió a la reapertura."
+    print(f"Éxito: Registro encontrado tras reabrir: {found}")
+
+    assert reopened.remove('99999999'), "Error: El método remove() devolvió False."
+    assert reopened.search('99999999') is None, "Error: El registro fue encontrado después de ser eliminado."
+    assert '99999999' not in [r.id for r in reopened.box_search(*near_times_square)], "Error: El registro eliminado sigue en el índice."
+    reopened.close()
+    print("Éxito: El registro fue eliminado del índice y de las páginas de datos.")
+    print("--- PRUEBA COMPLETADA ---")
+
+
+# --- Ejecución Principal ---
+
+if __name__ == "__main__":
+    files_to_clean = [DATA_FILE, INDEX_FILE]
+    for f in files_to_clean:
+        if os.path.exists(f):
+            os.remove(f)
+
+    test_bulk_load_and_box_search()
+    test_insert_remove_and_reopen()
+
+    print("\nLimpiando archivos de prueba...")
+    for f in files_to_clean:
+        if os.path.exists(f):
+            os.remove(f)
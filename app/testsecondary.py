@@ -0,0 +1,67 @@
+#Creacion de .py para pruebas de los índices secundarios
+import os
+import random
+
+from app.data.records.song import Song
+from app.engines.bplustree import BPlusTreeFile
+from app.engines.secondary import SecondaryIndex, IndexedTable, VALUE_INT
+
+# --- Constantes ---
+DATA_FILE = 'songs_secondary_test.dat'
+INDEX_FILE = 'songs_secondary_test.idx'
+POPULARITY_FILE = 'songs_popularity_test.idx'
+
+def make_song(i):
+    return Song(f"track{i:06d}", f"Song {i}", 'Artist', random.randint(0, 100), 'album', 'Album',
+                '2020-01-01', random.random(), random.random(), random.randint(60_000, 400_000))
+
+# --- Funciones de Prueba ---
+
+def test_range_by_popularity():
+    """Rango sobre track_popularity por el índice secundario, comparado contra fuerza bruta."""
+    print("\n--- INICIANDO PRUEBA: Rango por Índice Secundario ---")
+
+    table = IndexedTable(BPlusTreeFile(DATA_FILE, INDEX_FILE), {})
+    songs = [make_song(i) for i in range(2000)]
+    table.bulk_load(songs)
+    table.build_index("track_popularity", SecondaryIndex(POPULARITY_FILE, VALUE_INT))
+
+    found = sorted(s.track_id for s in table.index_range("track_popularity", 60, 80))
+    expected = sorted(s.track_id for s in songs if 60 <= s.track_popularity <= 80)
+    assert found == expected, "Error: El rango por índice secundario no coincide con la fuerza bruta."
+    print(f"Éxito: {len(found)} canciones con popularidad entre 60 y 80.")
+    table.close()
+    print("--- PRUEBA COMPLETADA ---")
+
+def test_index_follows_add_and_remove():
+    """add() reemplaza la entrada vieja del índice y remove() la retira."""
+    print("\n--- INICIANDO PRUEBA: Sincronización con add/remove ---")
+
+    table = IndexedTable(BPlusTreeFile(DATA_FILE, INDEX_FILE), {"track_popularity": SecondaryIndex(POPULARITY_FILE)})
+    song = Song("track000001", 'Song', 'Artist', 101, 'album', 'Album', '2020-01-01', 0.1, 0.2, 1000)
+    table.add(song)
+    assert [s.track_id for s in table.index_range("track_popularity", 101, 101)] == ["track000001"], \
+        "Error: El índice no refleja la nueva popularidad."
+
+    assert table.remove("track000001"), "Error: El método remove() devolvió False."
+    assert list(table.index_range("track_popularity", 101, 101)) == [], "Error: La entrada eliminada sigue en el índice."
+    table.close()
+    print("Éxito: El índice secundario sigue a las inserciones y eliminaciones.")
+    print("--- PRUEBA COMPLETADA ---")
+
+
+# --- Ejecución Principal ---
+
+if __name__ == "__main__":
+    files_to_clean = [DATA_FILE, INDEX_FILE, POPULARITY_FILE]
+    for f in files_to_clean:
+        if os.path.exists(f):
+            os.remove(f)
+
+    test_range_by_popularity()
+    test_index_follows_add_and_remove()
+
+    print("\nLimpiando archivos de prueba...")
+    for f in files_to_clean:
+        if os.path.exists(f):
+            os.remove(f)